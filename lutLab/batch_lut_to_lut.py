@@ -0,0 +1,413 @@
+#!/usr/bin/python
+
+""" Convert a batch of LUTs into other formats
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.4"
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from utils import debug_helper
+import utils.lut_presets as presets
+from utils.export_tool_helper import (LAZY_MODULES,
+                                      add_export_lut_options,
+                                      add_version_option,
+                                      add_inverse_option,
+                                      add_silent_option,
+                                      add_trace_option,
+                                      add_outlutfile_option)
+from utils.color_log_helper import (print_error_message,
+                                    print_success_message,
+                                    print_warning_message)
+from lutLab.lut_to_lut import lut_to_lut, get_outlutfiles
+
+
+class BatchLutToLutException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Job attributes, they match lut_to_lut arguments
+INLUTFILES = 'inlutfiles'
+JOB_ATTRS = [INLUTFILES, 'out_type', 'out_format', 'outlutfile',
+             'input_range', 'output_range', 'out_bit_depth', 'inverse',
+             'out_cube_size', 'smooth_size', 'preset', 'overwrite_preset',
+             'shaper', 'prelutfiles', 'postlutfiles']
+# Job attributes output LUT paths depend on (see lut_to_lut.get_outlutfiles)
+OUTPUT_ATTRS = ['out_type', 'out_format', 'outlutfile', 'input_range',
+                'output_range', 'out_bit_depth', 'out_cube_size', 'preset',
+                'overwrite_preset']
+# Chains of LUTs
+LUT_LIST_ATTRS = [INLUTFILES, 'prelutfiles', 'postlutfiles']
+RANGE_ATTRS = ['input_range', 'output_range']
+INT_ATTRS = ['out_bit_depth', 'out_cube_size', 'smooth_size']
+BOOL_ATTRS = ['inverse', 'overwrite_preset']
+# Input LUTs separator in CSV manifests (a chain of LUTs in one cell)
+CSV_LUT_SEPARATOR = ';'
+
+
+def _convert_csv_value(attr, value):
+    """ Convert a CSV cell into a job value
+
+    Args:
+        attr (str): job attribute. See JOB_ATTRS
+
+        value (str): cell value
+
+    Returns:
+        .job value or None if cell is empty
+
+    """
+    value = value.strip()
+    if value == '':
+        return None
+    if attr in LUT_LIST_ATTRS:
+        return [path.strip() for path in value.split(CSV_LUT_SEPARATOR)]
+    if attr in RANGE_ATTRS:
+        return presets.convert_string_range(value.split())
+    if attr in INT_ATTRS:
+        return int(value)
+    if attr in BOOL_ATTRS:
+        return value.lower() in ['1', 'true', 'yes']
+    return value
+
+
+def read_manifest(manifest_path):
+    """ Read a JSON or CSV manifest.
+    JSON manifest is a list of jobs: {"inlutfiles": ..., "out_format": ...}.
+    CSV manifest has a header line with job attributes as column names,
+    input LUT chains are separated by ';' and ranges by spaces.
+    See JOB_ATTRS for available attributes.
+
+    Args:
+        manifest_path (str): path to a .json or .csv manifest
+
+    Returns:
+        .[dict]
+
+    """
+    ext = os.path.splitext(manifest_path)[1].lower()
+    if ext == '.json':
+        with open(manifest_path) as manifest:
+            jobs = json.load(manifest)
+        if not isinstance(jobs, list):
+            raise BatchLutToLutException(("JSON manifest must be a list of "
+                                          "jobs: {0}").format(manifest_path))
+    elif ext == '.csv':
+        with open(manifest_path, 'rb') as manifest:
+            jobs = [dict((attr, _convert_csv_value(attr, value))
+                         for attr, value in row.items() if attr)
+                    for row in csv.DictReader(manifest)]
+    else:
+        raise BatchLutToLutException(("Unsupported manifest format: {0}."
+                                      " Expected .json or .csv"
+                                      ).format(manifest_path))
+    for job in jobs:
+        unknown_attrs = set(job.keys()) - set(JOB_ATTRS)
+        if unknown_attrs:
+            raise BatchLutToLutException(("Unknown job attributes {0} in "
+                                          "{1}").format(sorted(unknown_attrs),
+                                                        manifest_path))
+        if not job.get(INLUTFILES):
+            raise BatchLutToLutException(("Every job must define "
+                                          "'{0}'").format(INLUTFILES))
+    return jobs
+
+
+def get_glob_jobs(patterns):
+    """ Get one job per LUT matching patterns
+
+    Args:
+        patterns ([str]): glob patterns. Ex: ["shots/*/*.3dl"]
+
+    Returns:
+        .[dict]
+
+    """
+    jobs = []
+    for pattern in patterns:
+        for lutfile in sorted(glob.glob(pattern)):
+            jobs.append({INLUTFILES: lutfile})
+    return jobs
+
+
+def complete_jobs(jobs, defaults):
+    """ Fill unset job attributes with default values.
+    Preset names are replaced by the corresponding loaded presets.
+
+    Args:
+        jobs ([dict]): jobs
+
+        defaults (dict): default values. Ex: command line options
+
+    Returns:
+        .[dict]
+
+    """
+    loaded_presets = None
+    completed_jobs = []
+    for job in jobs:
+        completed_job = dict(defaults)
+        completed_job.update((attr, value) for attr, value in job.items()
+                             if value is not None)
+        preset_list = completed_job.get('preset')
+        if preset_list is not None:
+            if not isinstance(preset_list, list):
+                preset_list = [preset_list]
+            if [preset for preset in preset_list
+                    if isinstance(preset, basestring)]:
+                if loaded_presets is None:
+                    loaded_presets = presets.get_presets_from_env()
+                # unknown preset is reported as a job failure
+                preset_list = [loaded_presets.get(preset, preset)
+                               if isinstance(preset, basestring) else preset
+                               for preset in preset_list]
+            completed_job['preset'] = preset_list
+        completed_jobs.append(completed_job)
+    return completed_jobs
+
+
+def get_output_collisions(jobs):
+    """ Return output LUTs that several jobs would write.
+    Jobs whose outputs can't be resolved (unknown preset, invalid
+    settings...) are skipped: their conversion reports the error.
+
+    Args:
+        jobs ([dict]): completed jobs. See complete_jobs
+
+    Returns:
+        .[(str, [str or [str]])] output LUT path and input LUTs of the jobs
+        writing it
+
+    """
+    writers = {}
+    for job in jobs:
+        kwargs = dict((attr, job[attr]) for attr in OUTPUT_ATTRS
+                      if job.get(attr) is not None)
+        try:
+            outlutfiles = get_outlutfiles(job[INLUTFILES], **kwargs)
+        except Exception:
+            continue
+        for outlutfile in set(os.path.abspath(path) for path in outlutfiles):
+            writers.setdefault(outlutfile, []).append(job[INLUTFILES])
+    return [(outlutfile, writers[outlutfile]) for outlutfile in sorted(writers)
+            if len(writers[outlutfile]) > 1]
+
+
+def check_output_collisions(jobs):
+    """ Raise if several jobs would write the same output LUT: they would
+    overwrite each other in the pool
+
+    Args:
+        jobs ([dict]): completed jobs. See complete_jobs
+
+    """
+    lines = ["{0} <- {1}".format(outlutfile,
+                                 ", ".join(str(inlutfiles)
+                                           for inlutfiles in writers))
+             for outlutfile, writers in get_output_collisions(jobs)]
+    if lines:
+        raise BatchLutToLutException(("Several jobs would write the same "
+                                      "LUT:\n{0}").format("\n".join(lines)))
+
+
+def _run_job(indexed_job):
+    """ Run a conversion job. Executed by pool workers.
+
+    Args:
+        indexed_job ((int, dict)): job index and job
+
+    Returns:
+        .dict with index, inlutfiles, outlutfile, duration and error message
+        (None if conversion succeeded)
+
+    """
+    index, job = indexed_job
+    kwargs = dict((attr, value) for attr, value in job.items()
+                  if attr in JOB_ATTRS)
+    result = {'index': index,
+              INLUTFILES: kwargs.pop(INLUTFILES),
+              'outlutfile': kwargs.get('outlutfile'),
+              'error': None,
+              'trace': None}
+    start = time.time()
+    try:
+        if kwargs.get('preset') is not None:
+            for preset in kwargs['preset']:
+                if isinstance(preset, basestring):
+                    raise BatchLutToLutException(("Unknown preset: "
+                                                  "{0}").format(preset))
+            # presets are updated by lut_to_lut
+            kwargs['preset'] = [dict(preset) for preset in kwargs['preset']]
+        result['outlutfile'] = lut_to_lut(result[INLUTFILES], **kwargs)
+    except Exception as error:
+        result['error'] = str(error)
+        result['trace'] = traceback.format_exc()
+    result['duration'] = time.time() - start
+    return result
+
+
+def batch_lut_to_lut(jobs, processes=None, verbose=False, trace=False):
+    """ Run conversion jobs in a pool of processes.
+    A failed job doesn't stop the batch. Jobs writing the same output LUT
+    are rejected before the batch starts.
+
+    Args:
+        jobs ([dict]): conversion jobs. Attributes match lut_to_lut arguments.
+        See JOB_ATTRS
+
+    Kwargs:
+        processes (int): number of worker processes. Default is cpu count
+
+        verbose (bool): print a log line per job and a summary
+
+        trace (bool): print stack trace of failed jobs
+
+    Returns:
+        .[dict] job results in jobs order. See _run_job
+
+    """
+    start = time.time()
+    results = []
+    nb_jobs = len(jobs)
+    if nb_jobs == 0:
+        if verbose:
+            print_warning_message("Nothing to convert")
+        return results
+    check_output_collisions(jobs)
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_run_job, enumerate(jobs)):
+            results.append(result)
+            if verbose:
+                message = "[{0}/{1}] {2} -> {3} ({4:.2f}s)".format(
+                    len(results), nb_jobs, result[INLUTFILES],
+                    result['outlutfile'], result['duration'])
+                if result['error'] is None:
+                    print_success_message(message)
+                else:
+                    print_error_message("{0}: {1}".format(message,
+                                                          result['error']))
+                    if trace:
+                        print result['trace']
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    results.sort(key=lambda result: result['index'])
+    if verbose:
+        nb_failed = len([result for result in results
+                         if result['error'] is not None])
+        print "{0} job(s), {1} failed, in {2:.2f}s".format(
+            nb_jobs, nb_failed, time.time() - start)
+    return results
+
+
+def __get_options():
+    """ Return batch_lut_to_lut option parser
+
+    Returns:
+        .argparse.ArgumentParser.args
+
+    """
+    # Define parser
+    description = 'Convert a batch of LUTs into other formats'
+    parser = argparse.ArgumentParser(description=description)
+    # jobs
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-m", "--manifest", help=(
+        "JSON or CSV manifest of conversion jobs. "
+        "Job attributes: {0}").format(", ".join(JOB_ATTRS)), type=str)
+    group.add_argument("-g", "--glob", help=(
+        "Convert every LUT matching these patterns. Ex: \"shots/*.3dl\""),
+        type=str, nargs='+')
+    # default job options
+    add_outlutfile_option(parser)
+    # type, format, ranges,  out bit depth, out cube size
+    add_export_lut_options(parser, multiple=True)
+    # inverse (1d arg)
+    add_inverse_option(parser)
+    # Smooth size
+    parser.add_argument("-sms", "--smooth-size", help=(
+        "Smooth sub-sampling size (1D only). Ex : 17"
+    ), default=None, type=int)
+    # pre / post LUTs
+    parser.add_argument("--prelut", help=(
+        "LUTs applied before input LUTs of every job"
+    ), default=None, type=str, nargs='+')
+    parser.add_argument("--postlut", help=(
+        "LUTs applied after input LUTs of every job"
+    ), default=None, type=str, nargs='+')
+    # Shaper
+    parser.add_argument("--shaper", help=(
+        "Shaper curve (3D csp, 3dl and spi only): 'log2' or a colorspace "
+        "name"
+    ), default=None, type=str)
+    # pool
+    parser.add_argument("-j", "--processes", help=(
+        "Number of worker processes. Default is cpu count"
+    ), default=None, type=int)
+    # version
+    full_version = debug_helper.get_lazy_modules_versions(globals(),
+                                                          LAZY_MODULES)
+    add_version_option(parser, description, __version__, full_version)
+    # verbose
+    add_silent_option(parser)
+    # trace
+    add_trace_option(parser)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = __get_options()
+    if ARGS.input_range is not None:
+        ARGS.input_range = presets.convert_string_range(ARGS.input_range)
+    if ARGS.output_range is not None:
+        ARGS.output_range = presets.convert_string_range(ARGS.output_range)
+    DEFAULTS = {'out_type': ARGS.out_type,
+                'out_format': ARGS.out_format,
+                'outlutfile': ARGS.outlutfile,
+                'input_range': ARGS.input_range,
+                'output_range': ARGS.output_range,
+                'out_bit_depth': ARGS.out_bit_depth,
+                'inverse': ARGS.inverse,
+                'out_cube_size': ARGS.out_cube_size,
+                'smooth_size': ARGS.smooth_size,
+                'preset': getattr(ARGS, 'preset', None),
+                'overwrite_preset': getattr(ARGS, 'overwrite_preset', False),
+                'shaper': ARGS.shaper,
+                'prelutfiles': ARGS.prelut,
+                'postlutfiles': ARGS.postlut}
+    try:
+        if ARGS.manifest:
+            JOBS = read_manifest(ARGS.manifest)
+        else:
+            JOBS = get_glob_jobs(ARGS.glob)
+        RESULTS = batch_lut_to_lut(complete_jobs(JOBS, DEFAULTS),
+                                   ARGS.processes,
+                                   not ARGS.silent,
+                                   ARGS.trace)
+    except Exception as error:
+        if ARGS.trace:
+            print_error_message(error)
+            raise
+        MSG = "{0}.\nUse --trace option to get details".format(error)
+        print_error_message(MSG)
+        sys.exit(1)
+    if [result for result in RESULTS if result['error'] is not None]:
+        sys.exit(1)
@@ -4,26 +4,38 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.5"
+__version__ = "0.9"
 import os
 import sys
 
 import argparse
+import inspect
 
 from utils import debug_helper
 from utils.colors_helper import lin_to_gamma, gamma_to_lin
-from utils.colorspaces import COLORSPACES
+from utils import colorspaces
+from utils.colorspaces import (COLORSPACES, ColorspaceException,
+                               is_compiled_gradation_enabled)
+from utils.cache_helper import get_file_digest
 # To prevent a warning in argparse
-from utils.export_tool_helper import (add_export_lut_options,
+from utils.export_tool_helper import (LAZY_MODULES,
+                                      add_export_lut_options,
                                       add_version_option,
                                       add_silent_option,
                                       get_preset_and_write_function,
                                       add_outlutfile_option,
                                       add_trace_option,
-                                      get_write_function)
+                                      add_cache_option,
+                                      add_profile_option,
+                                      get_write_function,
+                                      resolve_path_options,
+                                      get_export_key, fetch_export,
+                                      store_export)
 import utils.lut_presets as presets
-from utils.lut_utils import check_extension, LUTException, get_input_range
+from utils.lut_utils import (check_extension, LUTException, get_input_range,
+                             array_capable)
 from utils.private_colorspaces import PRIVATE_COLORSPACES
+from utils.profile_helper import PROFILER, profile_run
 from utils.color_log_helper import (print_warning_message,
                                     print_error_message,
                                     print_success_message)
@@ -47,11 +59,53 @@ class Direction(object):
     DECODE = "decode"
 
 
+def _get_colorspace_key_items(colorspace_obj):
+    """Return items identifying a colorspace gradation in an export key.
+    Private colorspaces are only known by their name, so their class, their
+    parameters and the source file defining them are part of the key
+
+    Args:
+        colorspace_obj (AbstractColorspace): colorspace
+
+    Returns:
+        .list
+
+    """
+    source_file = inspect.getsourcefile(colorspace_obj.__class__)
+    return [colorspace_obj.__class__.__name__,
+            colorspace_obj.get_gradation_params(),
+            get_file_digest(source_file)]
+
+
+def _compile_gradation(colorspace_obj, direction):
+    """Return compiled gradation of a colorspace, or its analytic function
+    if the table isn't accurate enough
+
+    Args:
+        colorspace_obj (AbstractColorspace): colorspace
+
+        direction (Direction): encode or decode
+
+    Returns:
+        .func
+
+    """
+    try:
+        return colorspace_obj.compile_gradation(direction)
+    except ColorspaceException as error:
+        print_warning_message(("{0}. Analytic function is used."
+                               ).format(error))
+    if direction == Direction.DECODE:
+        return colorspace_obj.decode_gradation
+    return colorspace_obj.encode_gradation
+
+
 def curve_to_lut(colorspace, gamma, outlutfile, out_type=None, out_format=None,
                  input_range=None, output_range=None, out_bit_depth=None,
                  out_cube_size=None, verbose=False, direction=Direction.ENCODE,
                  preset=None, overwrite_preset=False,
-                 process_input_range=False):
+                 process_input_range=False, use_cache=True,
+                 compiled_gradation=False):
     """Export a LUT from a colorspace gradation function
 
     Args:
@@ -88,6 +142,14 @@ def curve_to_lut(colorspace, gamma, outlutfile, out_type=None, out_format=None,
         process_input_range (bool): If true, input range will be computed from
         colorspace gradation functions. Colorspace only"
 
+        use_cache (bool): reuse LUT of the output cache if it was written
+        before with the same settings (see utils.cache_helper)
+
+        compiled_gradation (bool): sample colorspace gradation in a dense
+        table once and interpolate it (see
+        utils.colorspaces.AbstractColorspace.compile_gradation). Default is
+        COLORPIPE_COMPILED_GRADATION environment variable
+
     """
     # get colorspace function
     if colorspace is None and gamma is None:
@@ -96,11 +158,14 @@ def curve_to_lut(colorspace, gamma, outlutfile, out_type=None, out_format=None,
         raise AttributeError("Choose between a colorspace or a gamma")
     elif gamma is not None:
         # gamma mode
+        key_items = []
         if direction == Direction.DECODE:
-            gradation = lambda value: gamma_to_lin(value, gamma)
+            gradation = array_capable(lambda value: gamma_to_lin(value,
+                                                                 gamma))
             title = "Gamma{0}_to_lin".format(gamma)
         else:
-            gradation = lambda value: lin_to_gamma(value, gamma)
+            gradation = array_capable(lambda value: lin_to_gamma(value,
+                                                                 gamma))
             title = "Lin_to_gamma{0}".format(gamma)
     else:
         # colorspace mode
@@ -110,12 +175,18 @@ def curve_to_lut(colorspace, gamma, outlutfile, out_type=None, out_format=None,
         except KeyError:
             raise CurveToLUTException(("Unsupported {0} "
                                        "Colorspace!").format(colorspace))
+        compiled_gradation = (compiled_gradation or
+                              is_compiled_gradation_enabled())
+        key_items = (_get_colorspace_key_items(colorspace_obj) +
+                     [compiled_gradation])
         if direction == Direction.DECODE:
             gradation = colorspace_obj.decode_gradation
             title = "{0}_to_lin".format(colorspace)
         else:
             gradation = colorspace_obj.encode_gradation
             title = "Lin_to_{0}".format(colorspace)
+        if compiled_gradation:
+            gradation = _compile_gradation(colorspace_obj, direction)
     # get preset and write function
     if preset:
         write_function = get_write_function(preset, overwrite_preset,
@@ -162,15 +233,27 @@ def curve_to_lut(colorspace, gamma, outlutfile, out_type=None, out_format=None,
     if verbose:
         print "{0} will be written in {1}.".format(title, outlutfile)
         print "Final setting:\n{0}".format(presets.string_preset(preset))
+    # LUT already written with the same curve and settings
+    key = get_export_key(['curve_to_lut', __version__,
+                          colorspaces.__version__, colorspace, gamma,
+                          direction] + key_items, write_function, outlutfile,
+                         preset, use_cache)
+    if fetch_export(key, write_function, outlutfile, preset, verbose):
+        return
     # write
-    message = write_function(gradation, outlutfile, preset)
+    with PROFILER.stage('export', presets.get_samples_count(preset)):
+        message = write_function(gradation, outlutfile, preset)
+    store_export(key, write_function, outlutfile, preset)
     if verbose:
         print_success_message(message)
 
 
-def __get_options():
+def __get_options(argv=None):
     """Return curve_to_lut option parser
 
+    Kwargs:
+        argv ([str]): command line arguments. Default is sys.argv
+
     Returns:
         .argparse.ArgumentParser.args
 
@@ -201,44 +284,81 @@ def __get_options():
                         help=("If true, input range will be computed from "
                               " colorspace gradation functions."
                               "(Colorspace only))"))
+    parser.add_argument("--compiled-gradation", action="store_true",
+                        help=("Interpolate colorspace gradation in a dense "
+                              "table computed once. Default is "
+                              "COLORPIPE_COMPILED_GRADATION environment "
+                              "variable (Colorspace only)"))
     # version
-    full_version = debug_helper.get_imported_modules_versions(sys.modules,
-                                                              globals())
+    full_version = debug_helper.get_lazy_modules_versions(globals(),
+                                                          LAZY_MODULES)
     add_version_option(parser, description, __version__, full_version)
     # verbose
     add_silent_option(parser)
     # trace
     add_trace_option(parser)
-    return parser.parse_args()
+    # output cache
+    add_cache_option(parser)
+    # profile
+    add_profile_option(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None, cwd=None):
+    """ Run curve_to_lut command line
+
+    Kwargs:
+        argv ([str]): command line arguments. Default is sys.argv
+
+        cwd (str): directory of relative paths. Default is current directory
+
+    Returns:
+        .int exit status
+
+    """
+    args = __get_options(argv)
+    resolve_path_options(args, ['outlutfile', 'profile_trace'], cwd)
+    # --preset is only defined if presets exist
+    args.preset = getattr(args, 'preset', None)
+    args.overwrite_preset = getattr(args, 'overwrite_preset', False)
+    with profile_run(args.profile or args.profile_trace is not None,
+                     args.profile_trace, tool='curve_to_lut',
+                     argv=sys.argv[1:] if argv is None else list(argv)):
+        try:
+            if args.input_range is not None:
+                args.input_range = presets.convert_string_range(
+                    args.input_range)
+            if args.output_range is not None:
+                args.output_range = presets.convert_string_range(
+                    args.output_range)
+            if args.preset is not None:
+                args.preset = presets.get_preset(args.preset)
+            curve_to_lut(args.colorspace,
+                         args.gamma,
+                         args.outlutfile,
+                         args.out_type,
+                         args.out_format,
+                         args.input_range,
+                         args.output_range,
+                         args.out_bit_depth,
+                         args.out_cube_size,
+                         not args.silent,
+                         args.direction,
+                         args.preset,
+                         args.overwrite_preset,
+                         args.process_input_range,
+                         not args.no_cache,
+                         args.compiled_gradation
+                         )
+        except Exception as error:
+            if args.trace:
+                print_error_message(error)
+                raise
+            msg = "{0}.\nUse --trace option to get details".format(error)
+            print_error_message(msg)
+            return 1
+    return 0
 
 
 if __name__ == '__main__':
-    ARGS = __get_options()
-    try:
-        if ARGS.input_range is not None:
-            ARGS.input_range = presets.convert_string_range(ARGS.input_range)
-        if ARGS.output_range is not None:
-            ARGS.output_range = presets.convert_string_range(ARGS.output_range)
-        if ARGS.preset is not None:
-            ARGS.preset = presets.get_presets_from_env()[ARGS.preset]
-        curve_to_lut(ARGS.colorspace,
-                     ARGS.gamma,
-                     ARGS.outlutfile,
-                     ARGS.out_type,
-                     ARGS.out_format,
-                     ARGS.input_range,
-                     ARGS.output_range,
-                     ARGS.out_bit_depth,
-                     ARGS.out_cube_size,
-                     not ARGS.silent,
-                     ARGS.direction,
-                     ARGS.preset,
-                     ARGS.overwrite_preset,
-                     ARGS.process_input_range
-                     )
-    except Exception as error:
-        if ARGS.trace:
-            print_error_message(error)
-            raise
-        MSG = "{0}.\nUse --trace option to get details".format(error)
-        print_error_message(MSG)
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+""" Run a LUT tool on a lut_server.
+Arguments after the tool name are the tool ones:
+
+    lut_client.py lut_to_lut in.3dl --out_type 3D --out_format csp
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.3"
+import argparse
+import httplib
+import os
+import socket
+import sys
+import xmlrpclib
+from lutLab.lut_server import (TOOLS, SOCKET_ENV, get_default_socket,
+                               get_client_environment)
+from utils.color_log_helper import print_error_message
+
+
+class LutClientException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+class _UnixHTTPConnection(httplib.HTTPConnection):
+    """ HTTP connection through a Unix socket
+
+    """
+    def __init__(self, socket_path):
+        httplib.HTTPConnection.__init__(self, 'localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class _UnixTransport(xmlrpclib.Transport):
+    """ XML-RPC transport through a Unix socket
+
+    """
+    def __init__(self, socket_path):
+        xmlrpclib.Transport.__init__(self)
+        self.socket_path = socket_path
+
+    def make_connection(self, host):
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        self._connection = host, _UnixHTTPConnection(self.socket_path)
+        return self._connection[1]
+
+
+def run(tool, argv, socket_path=None):
+    """ Run a tool command line on a lut_server, from the current directory
+    and with the current tool environment variables (see
+    lut_server.CLIENT_ENVIRONMENT)
+
+    Args:
+        tool (str): tool name. See lut_server.TOOLS
+
+        argv ([str]): tool command line arguments
+
+    Kwargs:
+        socket_path (str): server socket. Default is
+        lut_server.get_default_socket
+
+    Returns:
+        .int exit status, str output
+
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise LutClientException("lut_client needs Unix sockets")
+    socket_path = socket_path or get_default_socket()
+    # a socket of another user may be a fake server
+    try:
+        owner = os.stat(socket_path).st_uid
+    except OSError as error:
+        raise LutClientException(("Can't reach lut_server on {0}: {1}"
+                                  ).format(socket_path, error))
+    if owner != os.getuid():
+        raise LutClientException(("lut_server socket {0} belongs to "
+                                  "another user").format(socket_path))
+    proxy = xmlrpclib.ServerProxy("http://localhost/RPC2",
+                                  transport=_UnixTransport(socket_path),
+                                  allow_none=True)
+    try:
+        status, output = proxy.run(tool, list(argv), os.getcwd(),
+                                   get_client_environment())
+    except socket.error as error:
+        raise LutClientException(("Can't reach lut_server on {0}: {1}"
+                                  ).format(socket_path, error))
+    except xmlrpclib.Fault as error:
+        raise LutClientException(error.faultString)
+    return status, output
+
+
+def __get_options():
+    """ Return lut_client option parser
+
+    Returns:
+        .argparse.ArgumentParser.args
+
+    """
+    # Define parser
+    description = 'Run a LUT tool on a lut_server'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("-s", "--socket", help=(
+        "Server Unix socket. Default is {0} environment variable or "
+        "a per user socket in temp directory").format(SOCKET_ENV),
+        default=None, type=str)
+    parser.add_argument("tool", help="Tool to run",
+                        choices=sorted(TOOLS))
+    parser.add_argument("args", help="Tool arguments",
+                        nargs=argparse.REMAINDER)
+    # version
+    parser.add_argument('-v', "--version", action='version',
+                        version='{0} - version {1}'.format(description,
+                                                           __version__))
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = __get_options()
+    try:
+        STATUS, OUTPUT = run(ARGS.tool, ARGS.args, ARGS.socket)
+    except LutClientException as error:
+        print_error_message(error)
+        sys.exit(1)
+    sys.stdout.write(OUTPUT)
+    sys.exit(STATUS)
@@ -0,0 +1,337 @@
+#!/usr/bin/python
+
+""" Serve LUT tools to local clients, so that farm jobs don't pay Python,
+numpy and OpenColorIO startup for every conversion.
+
+Requests are run by a pool of worker processes. Workers stay alive between
+requests: imported modules, OpenColorIO processors, presets and read LUTs
+are kept warm. See lut_client.
+
+Server listens on a Unix socket only its user can connect to (0600): other
+users can't make it write files as its user.
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.3"
+import argparse
+import importlib
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import traceback
+from cStringIO import StringIO
+from SimpleXMLRPCServer import (SimpleXMLRPCDispatcher,
+                                SimpleXMLRPCRequestHandler)
+from SocketServer import ThreadingMixIn, UnixStreamServer
+
+
+class LutServerException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Tools served and their module. Each module has a main(argv, cwd) function
+TOOLS = {'lut_to_lut': 'lutLab.lut_to_lut',
+         'curve_to_lut': 'lutLab.curve_to_lut',
+         'rgb_to_rgb_matrix': 'lutLab.rgb_to_rgb_matrix'}
+# Server socket path. Default is a per user socket in temp directory
+SOCKET_ENV = 'COLORPIPE_LUT_SERVER_SOCKET'
+# Number of read LUTs kept by each worker (see utils.lut_model.LUT_CACHE)
+DEFAULT_LUT_CACHE_CAPACITY = 64
+# Environment variables read by the tools. Clients send their values with
+# each request, workers use them while running the request
+CLIENT_ENVIRONMENT = ['LUT_PRESETS', 'COLORPIPE_CACHE_DIR',
+                      'COLORPIPE_OUTPUT_CACHE_DIR',
+                      'COLORPIPE_OUTPUT_CACHE_SIZE',
+                      'COLORPIPE_COMPILED_GRADATION', 'OCIO']
+
+
+def get_default_socket():
+    """ Return default server socket path
+
+    Returns:
+        .str COLORPIPE_LUT_SERVER_SOCKET environment variable or
+        TMPDIR/lut_server-UID.sock
+
+    """
+    socket_path = os.environ.get(SOCKET_ENV)
+    if socket_path:
+        return socket_path
+    return os.path.join(tempfile.gettempdir(),
+                        "lut_server-{0}.sock".format(os.getuid()))
+
+
+def get_client_environment():
+    """ Return values of the tool environment variables of the current
+    process
+
+    Returns:
+        .dict {str: str or None} None if a variable isn't set
+
+    """
+    return dict((name, os.environ.get(name)) for name in CLIENT_ENVIRONMENT)
+
+
+def _set_environment(environment):
+    """ Set tool environment variables. Other variables are ignored
+
+    Args:
+        environment (dict): {str: str or None} None unsets a variable
+
+    Returns:
+        .dict previous values of the modified variables
+
+    """
+    previous_environment = {}
+    for name, value in environment.items():
+        if name not in CLIENT_ENVIRONMENT:
+            continue
+        previous_environment[name] = os.environ.get(name)
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    return previous_environment
+
+
+def _init_worker(lut_cache_capacity):
+    """ Worker process initializer: import tools and enable LUT cache
+
+    Args:
+        lut_cache_capacity (int): number of read LUTs kept by the worker
+
+    """
+    from utils.lut_model import LUT_CACHE
+    LUT_CACHE.set_capacity(lut_cache_capacity)
+    for module_name in TOOLS.values():
+        importlib.import_module(module_name)
+
+
+def run_tool(tool, argv, cwd=None, environment=None):
+    """ Run a tool command line in the current process, as if it was called
+    from cwd with the client environment, and return its output.
+    Worker directory isn't changed: relative imports and package paths stay
+    valid. Relative path arguments are resolved against cwd by the tool.
+
+    Args:
+        tool (str): tool name. See TOOLS
+
+        argv ([str]): command line arguments
+
+    Kwargs:
+        cwd (str): working directory of the client
+
+        environment (dict): client tool environment variables. See
+        get_client_environment. Default is the current environment
+
+    Returns:
+        .[int, str] exit status and output
+
+    """
+    if tool not in TOOLS:
+        return [2, "Unknown tool: {0}. Expected one of: {1}\n".format(
+            tool, ", ".join(sorted(TOOLS)))]
+    module = importlib.import_module(TOOLS[tool])
+    previous_argv = sys.argv
+    previous_outputs = sys.stdout, sys.stderr
+    output = StringIO()
+    # usage messages show the tool name
+    sys.argv = ["{0}.py".format(tool)] + list(argv)
+    sys.stdout = sys.stderr = output
+    previous_environment = _set_environment(environment or {})
+    try:
+        status = module.main(list(argv), cwd)
+    except SystemExit as error:
+        # argparse help, version and errors
+        status = error.code
+    except Exception:
+        traceback.print_exc(file=output)
+        status = 1
+    finally:
+        _set_environment(previous_environment)
+        sys.argv = previous_argv
+        sys.stdout, sys.stderr = previous_outputs
+    if status is None:
+        status = 0
+    elif not isinstance(status, int):
+        output.write("{0}\n".format(status))
+        status = 1
+    return [status, output.getvalue()]
+
+
+def _run_tool(request):
+    """ Pool wrapper of run_tool
+
+    Args:
+        request ((str, [str], str, dict)): tool, argv, cwd, environment
+
+    Returns:
+        .[int, str]
+
+    """
+    return run_tool(*request)
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    """ XML-RPC request handler of a Unix socket: clients have no address
+    and no TCP options
+
+    """
+    disable_nagle_algorithm = False
+
+    def address_string(self):
+        return 'local'
+
+
+class LutServer(ThreadingMixIn, UnixStreamServer, SimpleXMLRPCDispatcher):
+    """ XML-RPC server dispatching tool requests to a pool of worker
+    processes. Each request is handled in its own thread, so that requests
+    are run concurrently by the pool.
+    Server listens on a Unix socket readable and writable by its user only.
+
+    """
+    daemon_threads = True
+    logRequests = False
+
+    def __init__(self, socket_path=None, processes=None,
+                 lut_cache_capacity=DEFAULT_LUT_CACHE_CAPACITY):
+        """ Ctor
+
+        Kwargs:
+            socket_path (str): server socket. Default is get_default_socket
+
+            processes (int): number of worker processes. Default is cpu
+            count
+
+            lut_cache_capacity (int): number of read LUTs kept by each
+            worker
+
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise LutServerException("lut_server needs Unix sockets")
+        socket_path = os.path.abspath(socket_path or get_default_socket())
+        _remove_stale_socket(socket_path)
+        SimpleXMLRPCDispatcher.__init__(self, allow_none=True,
+                                        encoding=None)
+        # socket is created with 0600 permissions: no window where other
+        # users could connect
+        previous_umask = os.umask(0177)
+        try:
+            UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+        finally:
+            os.umask(previous_umask)
+        self.pool = multiprocessing.Pool(processes, _init_worker,
+                                         (lut_cache_capacity, ))
+        self.register_function(self.run, 'run')
+        self.register_function(self.get_tools, 'get_tools')
+
+    def run(self, tool, argv, cwd=None, environment=None):
+        """ Run a tool command line on a worker. See run_tool.
+        Workers run one request at a time, so the client environment
+        doesn't leak into other requests
+
+        Returns:
+            .[int, str] exit status and output
+
+        """
+        return self.pool.apply(_run_tool, ((tool, argv, cwd, environment), ))
+
+    @staticmethod
+    def get_tools():
+        """ Return served tool names
+
+        Returns:
+            .[str]
+
+        """
+        return sorted(TOOLS)
+
+    def server_close(self):
+        """ Stop workers, close and remove socket
+
+        """
+        UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.pool.terminate()
+        self.pool.join()
+
+
+def _remove_stale_socket(socket_path):
+    """ Remove socket left by a server that didn't stop properly
+
+    Args:
+        socket_path (str): server socket
+
+    """
+    if not os.path.exists(socket_path):
+        return
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except socket.error:
+        # nobody listens anymore
+        os.remove(socket_path)
+        return
+    finally:
+        client.close()
+    raise LutServerException(("A server already listens on {0}"
+                              ).format(socket_path))
+
+
+def __get_options():
+    """ Return lut_server option parser
+
+    Returns:
+        .argparse.ArgumentParser.args
+
+    """
+    # lut_client imports this module: tool dependencies are imported by
+    # the server only
+    from utils import debug_helper
+    from utils.export_tool_helper import LAZY_MODULES, add_version_option
+    # Define parser
+    description = 'Serve LUT tools to local clients (see lut_client)'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("-s", "--socket", help=(
+        "Listening Unix socket. Default is {0} environment variable or "
+        "a per user socket in temp directory").format(SOCKET_ENV),
+        default=None, type=str)
+    parser.add_argument("-j", "--processes", help=(
+        "Number of worker processes. Default is cpu count"
+    ), default=None, type=int)
+    parser.add_argument("--lut-cache", help=(
+        "Number of read LUTs kept by each worker. Default is {0}"
+    ).format(DEFAULT_LUT_CACHE_CAPACITY),
+        default=DEFAULT_LUT_CACHE_CAPACITY, type=int)
+    # version
+    full_version = debug_helper.get_lazy_modules_versions(globals(),
+                                                          LAZY_MODULES)
+    add_version_option(parser, description, __version__, full_version)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = __get_options()
+    try:
+        SERVER = LutServer(ARGS.socket, ARGS.processes, ARGS.lut_cache)
+    except (LutServerException, socket.error) as error:
+        from utils.color_log_helper import print_error_message
+        print_error_message("Can't start lut_server: {0}".format(error))
+        sys.exit(1)
+    print "Serving {0} on {1}".format(", ".join(SERVER.get_tools()),
+                                      SERVER.server_address)
+    try:
+        SERVER.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        SERVER.server_close()
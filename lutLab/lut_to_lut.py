@@ -5,27 +5,40 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.2"
+__version__ = "0.10"
 import argparse
 import os
 import ntpath
-from PyOpenColorIO.Constants import INTERP_LINEAR, INTERP_TETRAHEDRAL
 from utils import debug_helper
 import sys
 import utils.lut_presets as presets
 from utils.lut_utils import get_default_out_path, check_extension
-from utils.ocio_helper import (create_ocio_processor,
-                               is_3d_lut)
-from utils.export_tool_helper import (add_export_lut_options,
+from utils.export_tool_helper import (LAZY_MODULES,
+                                      add_export_lut_options,
                                       add_version_option,
                                       add_inverse_option,
                                       add_silent_option,
                                       add_inlutfile_option,
                                       add_trace_option,
-                                      get_preset_and_write_function,
                                       add_outlutfile_option,
-                                      get_write_function)
-from utils.color_log_helper import print_error_message, print_success_message
+                                      add_cache_option,
+                                      add_profile_option,
+                                      get_presets_and_write_functions,
+                                      resolve_path_options,
+                                      get_export_key, fetch_export,
+                                      store_export)
+from utils.cache_helper import OUTPUT_CACHE, get_file_digest
+from utils.abstract_lut_helper import SharedProcessFunction
+from utils import bake_helper, lut_model
+from utils.lut_model import (is_readable, read_lut, samples_match,
+                             LatticeFunction)
+from utils.bake_helper import get_chain_function, is_bakeable, ChainFunction
+from utils.shaper_helper import get_accuracy_report
+from utils.profile_helper import PROFILER, profile_run
+from utils.color_log_helper import (print_error_message,
+                                    print_success_message,
+                                    print_warning_message)
+import numpy
 
 
 class LutToLutException(Exception):
@@ -38,22 +51,268 @@ class LutToLutException(Exception):
     pass
 
 
+def _get_outlutfile(inlutfiles, outlutfile, ext):
+    """ Return output LUT path
+
+    Args:
+        inlutfiles ([str]): list of input LUT paths
+
+        outlutfile (str): path to output LUT, output directory or None
+
+        ext (str): output LUT extension
+
+    Returns:
+        .str
+
+    """
+    if not outlutfile:
+        return get_default_out_path(inlutfiles, ext)
+    elif os.path.isdir(outlutfile):
+        filename = os.path.splitext(ntpath.basename(inlutfiles[0]))[0] + ext
+        return os.path.join(outlutfile, filename)
+    check_extension(outlutfile, ext)
+    return outlutfile
+
+
+def _get_outlutfiles(inlutfiles, exports, outlutfile):
+    """ Return output LUT paths of exports
+
+    Args:
+        inlutfiles ([str]): list of input LUT paths
+
+        exports ([(dict, func)]): presets and write functions
+
+        outlutfile (str): path to output LUT, output directory or None
+
+    Returns:
+        .[str]
+
+    """
+    if (len(exports) > 1 and outlutfile
+            and not os.path.isdir(outlutfile)):
+        raise LutToLutException(("Several LUTs are exported, output must be "
+                                 "a directory: {0}").format(outlutfile))
+    outlutfiles = [_get_outlutfile(inlutfiles, outlutfile,
+                                   a_preset[presets.EXT])
+                   for a_preset, _ in exports]
+    if len(set(outlutfiles)) != len(outlutfiles):
+        raise LutToLutException(("Several exports would write the same "
+                                 "file: {0}").format(outlutfiles))
+    return outlutfiles
+
+
+def get_outlutfiles(inlutfiles, out_type=None, out_format=None,
+                    outlutfile=None, input_range=None, output_range=None,
+                    out_bit_depth=None, out_cube_size=None, preset=None,
+                    overwrite_preset=False):
+    """ Return output LUT paths of a conversion, without converting.
+    See lut_to_lut
+
+    Args:
+        lutfiles (str or [str]): path to a LUT or list of LUT paths
+
+    Kwargs:
+        out_type (str): 1D, 2D or 3D
+
+        out_format (str or [str]): '3dl', 'csp', 'cube', 'lut', 'spi',
+        'clcc', 'json'...
+
+        outlutfile (str): path to output LUT or output directory
+
+        input_range ([int/float, int/float]): input range
+
+        output_range ([int/float, int/float]): output range
+
+        out_bit_depth (int): output lut bit precision (1D only)
+
+        out_cube_size (int): output cube size (3D only)
+
+        preset (dict or [dict]): lut generic and sampling informations
+
+        overwrite_preset (bool): export options overwrite preset values
+
+    Returns:
+        .[str]
+
+    """
+    if not preset and (out_type is None or not out_format):
+        raise LutToLutException("Specify out_type/out_format or a preset.")
+    if preset is not None:
+        # presets are completed by write function getters
+        if isinstance(preset, (list, tuple)):
+            preset = [dict(a_preset) for a_preset in preset]
+        else:
+            preset = dict(preset)
+    exports = get_presets_and_write_functions(out_type, out_format,
+                                              input_range, output_range,
+                                              out_bit_depth, out_cube_size,
+                                              preset, overwrite_preset)
+    if not isinstance(inlutfiles, (list, tuple)):
+        inlutfiles = [inlutfiles]
+    return _get_outlutfiles(inlutfiles, exports, outlutfile)
+
+
+def _read_source_lut(inlutfiles, inverse=False, verbose=False,
+                     prelutfiles=None, postlutfiles=None):
+    """ Read input LUT natively, so that it can be exported without being
+    resampled (see utils.lut_model.samples_match)
+
+    Args:
+        inlutfiles ([str]): list of input LUT paths
+
+    Kwargs:
+        inverse (bool): inverse input LUT
+
+        verbose (bool): print log if true
+
+        prelutfiles ([str]): LUTs applied before input LUTs
+
+        postlutfiles ([str]): LUTs applied after input LUTs
+
+    Returns:
+        .utils.lut_model.Lut1D or Lut3D, None if LUT can only be processed
+        through OpenColorIO (LUT chain, inverse, unsupported format...)
+
+    """
+    if (inverse or prelutfiles or postlutfiles or len(inlutfiles) != 1
+            or not is_readable(inlutfiles[0])):
+        return None
+    try:
+        return read_lut(inlutfiles[0], dtype=numpy.float64)
+    except Exception as error:
+        # a format variant OpenColorIO may still read
+        if verbose:
+            print_warning_message(("{0} can't be read natively: {1}"
+                                   ).format(inlutfiles[0], error))
+        return None
+
+
+def _get_chain_function(inlutfiles, inverse=False, verbose=False,
+                        prelutfiles=None, postlutfiles=None):
+    """ Return a native process function of a LUT chain
+    (see utils.bake_helper)
+
+    Args:
+        inlutfiles ([str]): list of input LUT paths
+
+    Kwargs:
+        inverse (bool): inverse input LUT
+
+        verbose (bool): print log if true
+
+        prelutfiles ([str]): LUTs applied before input LUTs
+
+        postlutfiles ([str]): LUTs applied after input LUTs
+
+    Returns:
+        .utils.bake_helper.ChainFunction, None if chain can only be
+        processed through OpenColorIO (single LUT, inverse, unsupported
+        format...)
+
+    """
+    if not _is_chain_bakeable(inlutfiles, inverse, prelutfiles,
+                              postlutfiles):
+        return None
+    try:
+        # same 3D interpolation as the OpenColorIO processor of the chain
+        return get_chain_function(inlutfiles, prelutfiles, postlutfiles,
+                                  interpolation=None)
+    except Exception as error:
+        # a format variant OpenColorIO may still read
+        if verbose:
+            print_warning_message(("LUT chain can't be baked natively: "
+                                   "{0}").format(error))
+        return None
+
+
+def _is_chain_bakeable(inlutfiles, inverse=False, prelutfiles=None,
+                       postlutfiles=None):
+    """ Return True if a LUT chain may be baked natively
+    (see utils.bake_helper), else it's processed through OpenColorIO
+
+    Args:
+        inlutfiles ([str]): list of input LUT paths
+
+    Kwargs:
+        inverse (bool): inverse input LUT
+
+        prelutfiles ([str]): LUTs applied before input LUTs
+
+        postlutfiles ([str]): LUTs applied after input LUTs
+
+    Returns:
+        .bool
+
+    """
+    lutfiles = (list(prelutfiles or []) + list(inlutfiles)
+                + list(postlutfiles or []))
+    return (not inverse and len(lutfiles) > 1
+            and all(is_bakeable(lutfile) for lutfile in lutfiles))
+
+
+def _get_key_items(inlutfiles, inverse, prelutfiles=None, postlutfiles=None):
+    """ Return what every export of input LUTs depends on, but the preset
+    and the writer. See utils.export_tool_helper.get_export_key
+
+    Args:
+        inlutfiles ([str]): list of input LUT paths, in chain order
+
+        inverse (bool): inverse input LUT
+
+    Kwargs:
+        prelutfiles ([str]): LUTs applied before input LUTs
+
+        postlutfiles ([str]): LUTs applied after input LUTs
+
+    Returns:
+        .list or None if an input LUT can't be read
+
+    """
+    try:
+        # extension chooses the parser. Pre / post LUTs are never inverted:
+        # they are keyed apart from input LUTs
+        inputs = [[[os.path.splitext(lutfile)[1].lower(),
+                    get_file_digest(lutfile)] for lutfile in lutfiles or []]
+                  for lutfiles in [prelutfiles, inlutfiles, postlutfiles]]
+    except IOError:
+        return None
+    # native reading / baking and OpenColorIO don't interpolate the same way
+    if _is_chain_bakeable(inlutfiles, inverse, prelutfiles, postlutfiles):
+        backend = ['native', lut_model.__version__, bake_helper.__version__]
+    else:
+        backend = ['ocio', lut_model.__version__]
+    return ['lut_to_lut', __version__, backend, inputs, inverse]
+
+
 def lut_to_lut(inlutfiles, out_type=None, out_format=None, outlutfile=None,
                input_range=None, output_range=None, out_bit_depth=None,
                inverse=False, out_cube_size=None, verbose=False,
-               smooth_size=None, preset=None, overwrite_preset=False):
+               smooth_size=None, preset=None, overwrite_preset=False,
+               shaper=None, use_cache=True, prelutfiles=None,
+               postlutfiles=None, shaper_report=False):
     """ Concert a LUT in another LUT
-    Arguments testing are delegated to LUT helpers
+    Arguments testing are delegated to LUT helpers.
+    Several formats or presets can be exported at once: input LUT is
+    sampled once and shared by every export.
+    When a single LUT is exported with its own size and domain, its samples
+    are copied without being resampled through OpenColorIO. Only axis order
+    and output range may differ.
+    A chain of LUTs and matrices is baked natively when every stage can be
+    read (see utils.bake_helper).
+    If an output cache directory is set, exports already written from the
+    same input LUTs and settings are reused (see utils.cache_helper).
 
     Args:
         lutfiles (str or [str]): path to a LUT or list of LUT paths
 
         out_type (str): 1D, 2D or 3D
 
-        out_format (str): '3dl', 'csp', 'cube', 'lut', 'spi', 'clcc', 'json'...
+        out_format (str or [str]): '3dl', 'csp', 'cube', 'lut', 'spi', 'clcc',
+        'json'...
 
     Kwargs:
-        outlutfile (str): path to output LUT
+        outlutfile (str): path to output LUT. Must be a directory if
+        several LUTs are exported
 
         input_range ([int/float, int/float]): input range.
         Ex: [0.0, 1.0] or [0, 4095]
@@ -77,60 +336,146 @@ def lut_to_lut(inlutfiles, out_type=None, out_format=None, outlutfile=None,
         So the smaller this value is, the smoother the curve will be.
         Ex: 10, 20,...
 
-        preset (dict): lut generic and sampling informations
+        preset (dict or [dict]): lut generic and sampling informations
+
+        shaper (str): shaper curve of 3D exports (csp, 3dl, spi): 'log2' or
+        a colorspace name. Lattice is sampled in the shaped domain and the
+        shaper is written as pre-LUT. See utils.shaper_helper
+
+        use_cache (bool): reuse exports of the output cache
+
+        prelutfiles ([str]): LUTs applied before input LUTs. They are never
+        inverted
+
+        postlutfiles ([str]): LUTs applied after input LUTs. They are never
+        inverted
+
+        shaper_report (bool): print accuracy of shaped exports compared to
+        uniform cubes. Input LUTs are sampled again, so it is slow
+
+    Returns:
+        .str output LUT path, or [str] if several LUTs were exported
 
     """
-    if preset:
-        write_function = get_write_function(preset, overwrite_preset,
-                                            out_type, out_format,
-                                            input_range,
-                                            output_range,
-                                            out_bit_depth,
-                                            out_cube_size,
-                                            verbose)
-    elif out_type is None or out_format is None:
+    if not preset and (out_type is None or not out_format):
         raise LutToLutException("Specify out_type/out_format or a preset.")
-    else:
-        preset, write_function = get_preset_and_write_function(out_type,
-                                                               out_format,
-                                                               input_range,
-                                                               output_range,
-                                                               out_bit_depth,
-                                                               out_cube_size)
-    ext = preset[presets.EXT]
+    exports = get_presets_and_write_functions(out_type, out_format,
+                                              input_range, output_range,
+                                              out_bit_depth, out_cube_size,
+                                              preset, overwrite_preset,
+                                              verbose)
     if not isinstance(inlutfiles, (list, tuple)):
         inlutfiles = [inlutfiles]
-    if not outlutfile:
-        outlutfile = get_default_out_path(inlutfiles, ext)
-    elif os.path.isdir(outlutfile):
-        filename = os.path.splitext(ntpath.basename(inlutfiles[0]))[0] + ext
-        outlutfile = os.path.join(outlutfile, filename)
-    else:
-        check_extension(outlutfile, ext)
-    # smooth
-    if smooth_size:
-        preset[presets.SMOOTH] = smooth_size
-    if verbose:
-        print "{0} will be converted into {1}.".format(inlutfiles,
-                                                       outlutfile)
-        print "Final setting:\n{0}".format(presets.string_preset(preset))
-    processor = create_ocio_processor(inlutfiles,
-                                      interpolation=INTERP_LINEAR,
-                                      inverse=inverse)
-    # change interpolation if 3D LUT
-    if is_3d_lut(processor, inlutfiles[0]):
+    # outputs are named after input LUTs only
+    outlutfiles = _get_outlutfiles(inlutfiles, exports, outlutfile)
+    prelutfiles = list(prelutfiles or [])
+    postlutfiles = list(postlutfiles or [])
+    for (a_preset, _), a_outlutfile in zip(exports, outlutfiles):
+        # smooth
+        if smooth_size:
+            a_preset[presets.SMOOTH] = smooth_size
+        # shaper
+        if shaper:
+            a_preset[presets.SHAPER_CURVE] = shaper
+        if verbose:
+            print "{0} will be converted into {1}.".format(inlutfiles,
+                                                           a_outlutfile)
+            print "Final setting:\n{0}".format(
+                presets.string_preset(a_preset))
+    all_outlutfiles = outlutfiles
+    # exports already written from the same inputs and settings
+    key_items = None
+    if use_cache and OUTPUT_CACHE.is_enabled():
+        key_items = _get_key_items(inlutfiles, inverse, prelutfiles,
+                                   postlutfiles)
+    to_write = []
+    for (a_preset, write_function), a_outlutfile in zip(exports, outlutfiles):
+        key = get_export_key(key_items, write_function, a_outlutfile,
+                             a_preset, key_items is not None)
+        if not fetch_export(key, write_function, a_outlutfile, a_preset,
+                            verbose):
+            to_write.append(((a_preset, write_function), a_outlutfile, key))
+    if not to_write:
+        if len(all_outlutfiles) == 1:
+            return all_outlutfiles[0]
+        return all_outlutfiles
+    exports, outlutfiles, output_keys = zip(*to_write)
+    # exports sampling input LUT where its samples are: no resampling
+    with PROFILER.stage('read'):
+        source_lut = _read_source_lut(inlutfiles, inverse, verbose,
+                                      prelutfiles, postlutfiles)
+    process_functions = []
+    for a_preset, _ in exports:
+        if source_lut is not None and samples_match(source_lut, a_preset):
+            process_functions.append(
+                LatticeFunction(source_lut, a_preset[presets.OUT_RANGE]))
+        else:
+            process_functions.append(None)
+    nb_resampled = process_functions.count(None)
+    if nb_resampled:
+        with PROFILER.stage('bake'):
+            process_function = _get_chain_function(inlutfiles, inverse,
+                                                   verbose, prelutfiles,
+                                                   postlutfiles)
+    if nb_resampled and process_function is None:
+        # OpenColorIO is only imported for chains that can't be baked
+        from PyOpenColorIO.Constants import INTERP_LINEAR, INTERP_TETRAHEDRAL
+        from utils.ocio_helper import (create_ocio_processor, is_3d_lut,
+                                       get_process_function)
+        # only input LUTs are inverted
         processor = create_ocio_processor(inlutfiles,
-                                          interpolation=INTERP_TETRAHEDRAL,
-                                          inverse=inverse)
-    # write LUT
-    message = write_function(processor.applyRGB, outlutfile, preset)
-    if verbose:
-        print_success_message(message)
+                                          interpolation=INTERP_LINEAR,
+                                          inverse=inverse,
+                                          prelutfile=prelutfiles,
+                                          postlutfile=postlutfiles)
+        # change interpolation if 3D LUT
+        if is_3d_lut(processor, inlutfiles[0]):
+            processor = create_ocio_processor(inlutfiles,
+                                              interpolation=INTERP_TETRAHEDRAL,
+                                              inverse=inverse,
+                                              prelutfile=prelutfiles,
+                                              postlutfile=postlutfiles)
+        process_function = get_process_function(processor)
+    if nb_resampled:
+        if nb_resampled > 1:
+            # sample once, write many
+            process_function = SharedProcessFunction(process_function)
+        process_functions = [function if function is not None
+                             else process_function
+                             for function in process_functions]
+    # write LUTs
+    for (a_preset, write_function), a_outlutfile, function, key in zip(
+            exports, outlutfiles, process_functions, output_keys):
+        if verbose:
+            if isinstance(function, LatticeFunction):
+                print "{0}: lossless copy of input LUT samples.".format(
+                    a_outlutfile)
+            elif isinstance(getattr(function, 'process_function', function),
+                            ChainFunction):
+                print "{0}: input LUT chain baked natively.".format(
+                    a_outlutfile)
+            else:
+                print "{0}: input LUT resampled through OpenColorIO.".format(
+                    a_outlutfile)
+        with PROFILER.stage('export',
+                            presets.get_samples_count(a_preset)):
+            message = write_function(function, a_outlutfile, a_preset)
+        store_export(key, write_function, a_outlutfile, a_preset)
+        if verbose:
+            print_success_message(message)
+        if shaper_report and a_preset.get(presets.SHAPER_CURVE):
+            print get_accuracy_report(function, a_preset)
+    if len(all_outlutfiles) == 1:
+        return all_outlutfiles[0]
+    return all_outlutfiles
 
 
-def __get_options():
+def __get_options(argv=None):
     """ Return lut_to_lut option parser
 
+    Kwargs:
+        argv ([str]): command line arguments. Default is sys.argv
+
     Returns:
         .argparse.ArgumentParser.args
 
@@ -142,50 +487,100 @@ def __get_options():
     add_inlutfile_option(parser, is_list=True)
     add_outlutfile_option(parser)
     # type, format, ranges,  out bit depth, out cube size
-    add_export_lut_options(parser)
+    add_export_lut_options(parser, multiple=True)
     # inverse (1d arg)
     add_inverse_option(parser)
     # Smooth size
     parser.add_argument("-sms", "--smooth-size", help=(
         "Smooth sub-sampling size (1D only). Ex : 17"
     ), default=None, type=int)
+    # pre / post LUTs
+    parser.add_argument("--prelut", help=(
+        "LUTs applied before input LUTs. Output LUT is named after input LUTs"
+    ), default=None, type=str, nargs='+')
+    parser.add_argument("--postlut", help=(
+        "LUTs applied after input LUTs. Output LUT is named after input LUTs"
+    ), default=None, type=str, nargs='+')
+    # Shaper
+    parser.add_argument("--shaper", help=(
+        "Shaper curve (3D csp, 3dl and spi only): 'log2' or a colorspace "
+        "name. A smaller cube reaches the same accuracy for log or scene "
+        "linear inputs"
+    ), default=None, type=str)
+    parser.add_argument("--shaper-report", help=(
+        "Print accuracy of shaped exports compared to uniform cubes (slow)"
+    ), action="store_true")
     # version
-    full_version = debug_helper.get_imported_modules_versions(sys.modules,
-                                                              globals())
+    full_version = debug_helper.get_lazy_modules_versions(globals(),
+                                                          LAZY_MODULES)
     add_version_option(parser, description, __version__, full_version)
     # verbose
     add_silent_option(parser)
     # trace
     add_trace_option(parser)
-    return parser.parse_args()
+    # output cache
+    add_cache_option(parser)
+    # profile
+    add_profile_option(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None, cwd=None):
+    """ Run lut_to_lut command line
+
+    Kwargs:
+        argv ([str]): command line arguments. Default is sys.argv
+
+        cwd (str): directory of relative paths. Default is current directory
+
+    Returns:
+        .int exit status
+
+    """
+    args = __get_options(argv)
+    resolve_path_options(args, ['inlutfiles', 'outlutfile', 'prelut',
+                                'postlut', 'profile_trace'], cwd)
+    # --preset is only defined if presets exist
+    args.preset = getattr(args, 'preset', None)
+    args.overwrite_preset = getattr(args, 'overwrite_preset', False)
+    if args.input_range is not None:
+        args.input_range = presets.convert_string_range(args.input_range)
+    if args.output_range is not None:
+        args.output_range = presets.convert_string_range(args.output_range)
+    if args.preset is not None:
+        args.preset = [presets.get_preset(name) for name in args.preset]
+    with profile_run(args.profile or args.profile_trace is not None,
+                     args.profile_trace, tool='lut_to_lut',
+                     argv=sys.argv[1:] if argv is None else list(argv)):
+        try:
+            lut_to_lut(args.inlutfiles,
+                       args.out_type,
+                       args.out_format,
+                       args.outlutfile,
+                       args.input_range,
+                       args.output_range,
+                       args.out_bit_depth,
+                       args.inverse,
+                       args.out_cube_size,
+                       not args.silent,
+                       args.smooth_size,
+                       args.preset,
+                       args.overwrite_preset,
+                       args.shaper,
+                       not args.no_cache,
+                       args.prelut,
+                       args.postlut,
+                       args.shaper_report
+                       )
+        except Exception as error:
+            if args.trace:
+                print_error_message(error)
+                raise
+            msg = "{0}.\nUse --trace option to get details".format(error)
+            print_error_message(msg)
+            return 1
+    return 0
 
 
 if __name__ == '__main__':
-    ARGS = __get_options()
-    if ARGS.input_range is not None:
-        ARGS.input_range = presets.convert_string_range(ARGS.input_range)
-    if ARGS.output_range is not None:
-        ARGS.output_range = presets.convert_string_range(ARGS.output_range)
-    if ARGS.preset is not None:
-        ARGS.preset = presets.get_presets_from_env()[ARGS.preset]
-    try:
-        lut_to_lut(ARGS.inlutfiles,
-                   ARGS.out_type,
-                   ARGS.out_format,
-                   ARGS.outlutfile,
-                   ARGS.input_range,
-                   ARGS.output_range,
-                   ARGS.out_bit_depth,
-                   ARGS.inverse,
-                   ARGS.out_cube_size,
-                   not ARGS.silent,
-                   ARGS.smooth_size,
-                   ARGS.preset,
-                   ARGS.overwrite_preset
-                   )
-    except Exception as error:
-        if ARGS.trace:
-            print_error_message(error)
-            raise
-        MSG = "{0}.\nUse --trace option to get details".format(error)
-        print_error_message(MSG)
+    sys.exit(main())
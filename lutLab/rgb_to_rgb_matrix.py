@@ -5,7 +5,7 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.5"
+__version__ = "0.7"
 from utils.colors_helper import get_RGB_to_RGB_matrix, get_colorspace_matrix
 from utils.colorspaces import COLORSPACES
 from utils.private_colorspaces import PRIVATE_COLORSPACES
@@ -61,9 +61,12 @@ def display_matrix(in_colorspace, out_colorspace, matrix_format, primaries_only=
     print matrix_dump
 
 
-def __get_options():
+def __get_options(argv=None):
     """ Return rgb_to_xyz option parser
 
+    Kwargs:
+        argv ([str]): command line arguments. Default is sys.argv
+
     Returns:
         .argparse.ArgumentParser.args
 
@@ -98,16 +101,34 @@ def __get_options():
                         version='{0} - version {1}'.format(description,
                                                            __version__))
     # full version
-    versions = debug_helper.get_imported_modules_versions(sys.modules,
-                                                          globals())
-    versions = '{0} - version {1}\n\n{2}'.format(description,
-                                                 __version__,
-                                                 versions)
+    get_versions = debug_helper.get_lazy_modules_versions(globals())
+
+    def versions():
+        return '{0} - version {1}\n\n{2}'.format(description, __version__,
+                                                 get_versions())
     parser.add_argument('-V', "--full-versions",
                         action=debug_helper.make_full_version_action(versions))
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def main(argv=None, cwd=None):
+    """ Run rgb_to_rgb_matrix command line
+
+    Kwargs:
+        argv ([str]): command line arguments. Default is sys.argv
+
+        cwd (str): directory of relative paths. Unused: matrices are
+        printed
+
+    Returns:
+        .int exit status
+
+    """
+    args = __get_options(argv)
+    display_matrix(args.in_colorspace, args.out_colorspace, args.format,
+                   args.primaries_only)
+    return 0
 
 
 if __name__ == '__main__':
-    ARGS = __get_options()
-    display_matrix(ARGS.in_colorspace, ARGS.out_colorspace, ARGS.format, ARGS.primaries_only)
+    sys.exit(main())
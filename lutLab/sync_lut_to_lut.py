@@ -0,0 +1,489 @@
+#!/usr/bin/python
+
+""" Keep a directory of converted LUTs in sync with a source tree of LUTs
+
+Only LUTs whose content, pre / post LUTs or export settings changed since
+last sync are converted again. A watch mode syncs again whenever the source
+tree changes.
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.2"
+import argparse
+import json
+import os
+import sys
+import time
+from utils import debug_helper
+import utils.lut_presets as presets
+from utils.lut_utils import OCIO_LUTS_FORMATS
+from utils.cache_helper import get_file_digest, get_output_key
+from utils.serialization_helper import atomic_write
+from utils.export_tool_helper import (LAZY_MODULES,
+                                      add_export_lut_options,
+                                      add_version_option,
+                                      add_inverse_option,
+                                      add_silent_option,
+                                      add_trace_option)
+from utils.color_log_helper import (print_error_message,
+                                    print_success_message)
+from lutLab.lut_to_lut import __version__ as LUT_TO_LUT_VERSION
+from lutLab.batch_lut_to_lut import (batch_lut_to_lut, complete_jobs,
+                                     check_output_collisions, INLUTFILES,
+                                     JOB_ATTRS, LUT_LIST_ATTRS)
+
+
+class SyncLutToLutException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Sync manifest, written in output directory
+SYNC_MANIFEST = '.lut_sync.json'
+# Source LUT extensions: formats read by OpenColorIO
+SOURCE_EXTS = sorted(set('.' + ext.lstrip('.') for lut_format
+                         in OCIO_LUTS_FORMATS
+                         for ext in lut_format.split('/')))
+# Seconds between two syncs when polling, and to let writes settle when
+# watching with inotify
+DEFAULT_WATCH_INTERVAL = 1.0
+
+
+def get_source_luts(source_dir):
+    """ Return LUTs of a source tree. Hidden files and directories are
+    skipped
+
+    Args:
+        source_dir (str): source directory
+
+    Returns:
+        .[str] paths relative to source directory
+
+    """
+    lutfiles = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        for name in files:
+            if (not name.startswith('.')
+                    and os.path.splitext(name)[1].lower() in SOURCE_EXTS):
+                lutfiles.append(os.path.relpath(os.path.join(root, name),
+                                                source_dir))
+    return sorted(lutfiles)
+
+
+def read_sync_manifest(output_dir, source_dir):
+    """ Return entries of the sync manifest of an output directory
+
+    Args:
+        output_dir (str): output directory
+
+        source_dir (str): source directory
+
+    Returns:
+        .dict source LUT relative path: entry. Empty if output directory was
+        never synced or was synced from another source
+
+    """
+    manifest_path = os.path.join(output_dir, SYNC_MANIFEST)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, ValueError):
+        # first sync or corrupted manifest: everything is converted
+        return {}
+    if manifest.get('source_dir') != os.path.abspath(source_dir):
+        return {}
+    return manifest.get('entries', {})
+
+
+def _write_sync_manifest(output_dir, source_dir, entries):
+    """ Write sync manifest of an output directory
+
+    Args:
+        output_dir (str): output directory
+
+        source_dir (str): source directory
+
+        entries (dict): source LUT relative path: entry
+
+    """
+    with atomic_write(os.path.join(output_dir, SYNC_MANIFEST)) as manifest:
+        json.dump({'version': __version__,
+                   'source_dir': os.path.abspath(source_dir),
+                   'entries': entries}, manifest, indent=1, sort_keys=True)
+
+
+def get_settings_key(job):
+    """ Return a key of job settings: every attribute but LUT paths, and
+    lut_to_lut version
+
+    Args:
+        job (dict): completed job. See batch_lut_to_lut.complete_jobs
+
+    Returns:
+        .str
+
+    """
+    settings = dict((attr, value) for attr, value in job.items()
+                    if attr in JOB_ATTRS and attr not in LUT_LIST_ATTRS
+                    and attr != 'outlutfile')
+    return get_output_key('lut_to_lut', LUT_TO_LUT_VERSION, settings)
+
+
+class _FileStates(object):
+    """ States of the files a sync depends on. Each file is checked once
+    per sync and its content is hashed only when modification time or size
+    changed
+
+    """
+    def __init__(self):
+        self._states = {}
+
+    def get(self, file_path, previous_state=None):
+        """ Return [modification time, size, content digest] of a file
+
+        Args:
+            file_path (str): absolute path
+
+        Kwargs:
+            previous_state (list): state recorded by last sync
+
+        Returns:
+            .list
+
+        """
+        state = self._states.get(file_path)
+        if state is None:
+            stat = os.stat(file_path)
+            if previous_state and previous_state[:2] == [stat.st_mtime,
+                                                         stat.st_size]:
+                state = previous_state
+            else:
+                state = [stat.st_mtime, stat.st_size,
+                         get_file_digest(file_path)]
+            self._states[file_path] = state
+        return state
+
+
+def _get_digests(inputs):
+    """ Return content digests of entry inputs
+
+    Args:
+        inputs ([[str, list]]): paths and states of inputs, in chain order
+
+    Returns:
+        .[[str, str]] paths and digests
+
+    """
+    return [[path, state[2]] for path, state in inputs]
+
+
+def _remove_outputs(output_dir, outputs):
+    """ Remove converted LUTs
+
+    Args:
+        output_dir (str): output directory
+
+        outputs ([str]): paths relative to output directory
+
+    """
+    for output in outputs:
+        output = os.path.join(output_dir, output)
+        if os.path.isfile(output):
+            os.remove(output)
+
+
+def _remove_stale_outputs(output_dir, entries, new_entries):
+    """ Remove outputs of last sync that no entry claims anymore: outputs of
+    removed source LUTs and of previous settings
+
+    Args:
+        output_dir (str): output directory
+
+        entries (dict): entries of last sync
+
+        new_entries (dict): entries of this sync
+
+    """
+    claimed = set(output for entry in new_entries.values()
+                  for output in entry.get('outputs', []))
+    stale = set(output for entry in entries.values()
+                for output in entry.get('outputs', []))
+    _remove_outputs(output_dir, sorted(stale - claimed))
+
+
+def sync_lut_to_lut(source_dir, output_dir, defaults=None, processes=None,
+                    verbose=False, trace=False):
+    """ Convert LUTs of a source tree into an output directory with the same
+    layout. Only new LUTs, and LUTs whose content, pre / post LUTs or export
+    settings changed since last sync, are converted. Outputs of removed
+    LUTs are removed.
+    Source LUTs that would be converted into the same output LUT (ex:
+    a.3dl and a.cube) are rejected before anything is converted or removed.
+    States of the inputs are recorded in a manifest in the output
+    directory (see SYNC_MANIFEST). Failed conversions are retried by the
+    next sync.
+
+    Args:
+        source_dir (str): source directory
+
+        output_dir (str): output directory. Must be outside source directory
+
+    Kwargs:
+        defaults (dict): lut_to_lut arguments of every conversion. See
+        batch_lut_to_lut.JOB_ATTRS
+
+        processes (int): number of worker processes. Default is cpu count
+
+        verbose (bool): print log if true
+
+        trace (bool): print stack trace of failed conversions
+
+    Returns:
+        .[dict] results of the conversions run. See batch_lut_to_lut
+
+    """
+    source_dir = os.path.abspath(source_dir)
+    output_dir = os.path.abspath(output_dir)
+    if not os.path.isdir(source_dir):
+        raise SyncLutToLutException(("Source directory doesn't exist: {0}"
+                                     ).format(source_dir))
+    if (output_dir + os.sep).startswith(source_dir + os.sep):
+        raise SyncLutToLutException(("Output directory must be outside "
+                                     "source directory: {0}"
+                                     ).format(output_dir))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    defaults = dict(defaults or {})
+    for attr in ['prelutfiles', 'postlutfiles']:
+        if defaults.get(attr):
+            defaults[attr] = [os.path.abspath(lutfile)
+                              for lutfile in defaults[attr]]
+    defaults.pop('outlutfile', None)
+    entries = read_sync_manifest(output_dir, source_dir)
+    source_luts = get_source_luts(source_dir)
+    jobs = complete_jobs(
+        [{INLUTFILES: [os.path.join(source_dir, lutfile)],
+          'outlutfile': os.path.join(output_dir, os.path.dirname(lutfile))}
+         for lutfile in source_luts], defaults)
+    check_output_collisions(jobs)
+    states = _FileStates()
+    new_entries = {}
+    to_convert = []
+    for lutfile, job in zip(source_luts, jobs):
+        entry = entries.get(lutfile, {})
+        previous_inputs = dict(entry.get('inputs') or [])
+        dependencies = (job.get('prelutfiles') or []) + job[INLUTFILES] + (
+            job.get('postlutfiles') or [])
+        try:
+            # chain order matters
+            inputs = [[path, states.get(path, previous_inputs.get(path))]
+                      for path in dependencies]
+        except OSError:
+            # missing pre / post LUT: conversion reports it
+            inputs = None
+        new_entry = {'settings': get_settings_key(job), 'inputs': inputs,
+                     'outputs': entry.get('outputs', [])}
+        # touched but unchanged inputs aren't converted again
+        if (inputs is not None and entry
+                and new_entry['settings'] == entry['settings']
+                and _get_digests(inputs) == _get_digests(entry['inputs'])
+                and all(os.path.isfile(os.path.join(output_dir, output))
+                        for output in entry['outputs'])):
+            new_entries[lutfile] = new_entry
+        else:
+            to_convert.append((lutfile, job, new_entry))
+    if not to_convert:
+        # outputs of removed source LUTs
+        _remove_stale_outputs(output_dir, entries, new_entries)
+        if verbose:
+            print_success_message("{0} is up to date".format(output_dir))
+        if entries != new_entries:
+            _write_sync_manifest(output_dir, source_dir, new_entries)
+        return []
+    for _, job, _ in to_convert:
+        if not os.path.isdir(job['outlutfile']):
+            os.makedirs(job['outlutfile'])
+    results = batch_lut_to_lut([job for _, job, _ in to_convert], processes,
+                               verbose, trace)
+    for (lutfile, _, new_entry), result in zip(to_convert, results):
+        if result['error'] is not None or new_entry['inputs'] is None:
+            # converted again by next sync, previous outputs are kept
+            if lutfile in entries:
+                new_entries[lutfile] = entries[lutfile]
+            continue
+        outputs = result['outlutfile']
+        if not isinstance(outputs, list):
+            outputs = [outputs]
+        new_entry['outputs'] = sorted(os.path.relpath(output, output_dir)
+                                      for output in outputs)
+        new_entries[lutfile] = new_entry
+    # outputs of removed source LUTs and of previous settings
+    _remove_stale_outputs(output_dir, entries, new_entries)
+    _write_sync_manifest(output_dir, source_dir, new_entries)
+    return results
+
+
+def _get_change_waiter(directories, interval=DEFAULT_WATCH_INTERVAL):
+    """ Return a function blocking until directories change. Uses inotify
+    (pyinotify module) if available, else waits for interval.
+
+    Args:
+        directories ([str]): directories to watch, recursively
+
+    Kwargs:
+        interval (float): polling interval, or delay to let writes settle
+        with inotify
+
+    Returns:
+        .func
+
+    """
+    try:
+        import pyinotify
+    except ImportError:
+        return lambda: time.sleep(interval)
+    manager = pyinotify.WatchManager()
+    mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE
+            | pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM
+            | pyinotify.IN_MOVED_TO)
+    for directory in directories:
+        manager.add_watch(directory, mask, rec=True, auto_add=True)
+    notifier = pyinotify.Notifier(manager, lambda event: None)
+
+    def wait():
+        """ Block until a change, then drop the events of the burst
+
+        """
+        notifier.check_events(timeout=None)
+        notifier.read_events()
+        time.sleep(interval)
+        while notifier.check_events(timeout=0):
+            notifier.read_events()
+        notifier.process_events()
+    return wait
+
+
+def watch_lut_to_lut(source_dir, output_dir, defaults=None, processes=None,
+                     verbose=False, trace=False,
+                     interval=DEFAULT_WATCH_INTERVAL):
+    """ Sync output directory, then sync it again whenever source tree or
+    pre / post LUTs change. Runs until interrupted.
+    See sync_lut_to_lut.
+
+    Kwargs:
+        interval (float): polling interval, or delay to let writes settle
+        with inotify
+
+    """
+    sync_lut_to_lut(source_dir, output_dir, defaults, processes, verbose,
+                    trace)
+    directories = set([os.path.abspath(source_dir)])
+    for attr in ['prelutfiles', 'postlutfiles']:
+        for lutfile in (defaults or {}).get(attr) or []:
+            directories.add(os.path.dirname(os.path.abspath(lutfile)))
+    wait = _get_change_waiter(sorted(directories), interval)
+    while True:
+        wait()
+        sync_lut_to_lut(source_dir, output_dir, defaults, processes,
+                        verbose, trace)
+
+
+def __get_options():
+    """ Return sync_lut_to_lut option parser
+
+    Returns:
+        .argparse.ArgumentParser.args
+
+    """
+    # Define parser
+    description = ('Keep a directory of converted LUTs in sync with a source'
+                   ' tree of LUTs')
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("source_dir", help=(
+        "Source tree. LUT formats: {0}").format(", ".join(SOURCE_EXTS)),
+        type=str)
+    parser.add_argument("output_dir", help="Output directory", type=str)
+    # type, format, ranges,  out bit depth, out cube size
+    add_export_lut_options(parser, multiple=True)
+    # inverse (1d arg)
+    add_inverse_option(parser)
+    # pre / post LUTs
+    parser.add_argument("--prelut", help=(
+        "LUTs applied before every source LUT"
+    ), default=None, type=str, nargs='+')
+    parser.add_argument("--postlut", help=(
+        "LUTs applied after every source LUT"
+    ), default=None, type=str, nargs='+')
+    # Shaper
+    parser.add_argument("--shaper", help=(
+        "Shaper curve (3D csp, 3dl and spi only): 'log2' or a colorspace "
+        "name"
+    ), default=None, type=str)
+    # pool
+    parser.add_argument("-j", "--processes", help=(
+        "Number of worker processes. Default is cpu count"
+    ), default=None, type=int)
+    # watch
+    parser.add_argument("-w", "--watch", action="store_true", help=(
+        "Sync again whenever source tree or pre / post LUTs change "
+        "(inotify if pyinotify is installed, else polling)"))
+    parser.add_argument("--interval", help=(
+        "Watch polling interval in seconds. Default is {0}"
+    ).format(DEFAULT_WATCH_INTERVAL), default=DEFAULT_WATCH_INTERVAL,
+        type=float)
+    # version
+    full_version = debug_helper.get_lazy_modules_versions(globals(),
+                                                          LAZY_MODULES)
+    add_version_option(parser, description, __version__, full_version)
+    # verbose
+    add_silent_option(parser)
+    # trace
+    add_trace_option(parser)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = __get_options()
+    if ARGS.input_range is not None:
+        ARGS.input_range = presets.convert_string_range(ARGS.input_range)
+    if ARGS.output_range is not None:
+        ARGS.output_range = presets.convert_string_range(ARGS.output_range)
+    DEFAULTS = {'out_type': ARGS.out_type,
+                'out_format': ARGS.out_format,
+                'input_range': ARGS.input_range,
+                'output_range': ARGS.output_range,
+                'out_bit_depth': ARGS.out_bit_depth,
+                'inverse': ARGS.inverse,
+                'out_cube_size': ARGS.out_cube_size,
+                'preset': getattr(ARGS, 'preset', None),
+                'overwrite_preset': getattr(ARGS, 'overwrite_preset', False),
+                'shaper': ARGS.shaper,
+                'prelutfiles': ARGS.prelut,
+                'postlutfiles': ARGS.postlut}
+    try:
+        if ARGS.watch:
+            watch_lut_to_lut(ARGS.source_dir, ARGS.output_dir, DEFAULTS,
+                             ARGS.processes, not ARGS.silent, ARGS.trace,
+                             ARGS.interval)
+        else:
+            RESULTS = sync_lut_to_lut(ARGS.source_dir, ARGS.output_dir,
+                                      DEFAULTS, ARGS.processes,
+                                      not ARGS.silent, ARGS.trace)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    except Exception as error:
+        if ARGS.trace:
+            print_error_message(error)
+            raise
+        MSG = "{0}.\nUse --trace option to get details".format(error)
+        print_error_message(MSG)
+        sys.exit(1)
+    if [result for result in RESULTS if result['error'] is not None]:
+        sys.exit(1)
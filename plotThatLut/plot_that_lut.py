@@ -5,18 +5,12 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.1"
+__version__ = "0.2"
 import os
-# OpenColorIO
-from PyOpenColorIO.Constants import INTERP_LINEAR
-from utils.ocio_helper import (
-    OCIO_LUTS_FORMATS, create_ocio_processor, is_3d_lut
-)
-from utils.lut_utils import get_3d_list_values
-# matplotlib
-import matplotlib
+# OpenColorIO and matplotlib are imported when a LUT is plotted
+from utils.lut_utils import get_3d_list_values, OCIO_LUTS_FORMATS
 import itertools
-from utils import matplotlib_helper as mplh
+import numpy
 import ntpath
 
 
@@ -33,6 +27,10 @@ class PlotThatLutException(Exception):
 DEFAULT_SAMPLE = 256
 DEFAULT_CUBE_SIZE = 17
 
+# Modules imported only when needed, listed by --full-versions
+LAZY_MODULES = ['PyOpenColorIO', 'matplotlib', 'utils.ocio_helper',
+                'utils.matplotlib_helper']
+
 
 def show_plot(fig, filename):
     """Plot the figure depending on the backend
@@ -48,6 +46,7 @@ def show_plot(fig, filename):
             else a void string.
 
     """
+    from utils import matplotlib_helper as mplh
     if mplh.WEB_MODE:
         split_filename = os.path.splitext(filename)
         filename = '{0}{1}'.format(split_filename[0],
@@ -62,7 +61,8 @@ def show_plot(fig, filename):
         fig.savefig(abs_export_path)
         return export_path
     else:
-        matplotlib.pyplot.show()
+        from matplotlib.pyplot import show
+        show()
         return ""
 
 
@@ -93,7 +93,9 @@ def plot_curve(lutfiles, samples_count, processors, draw_red_curve=True,
     """
     # matplotlib : general plot
     from matplotlib.pyplot import (title, plot, xlabel, ylabel, grid,
-                                   figure)
+                                   figure, legend)
+    from utils import matplotlib_helper as mplh
+    from utils.ocio_helper import get_process_function
 
     # init plot
     fig = figure()
@@ -113,18 +115,11 @@ def plot_curve(lutfiles, samples_count, processors, draw_red_curve=True,
     for lutfile, processor in itertools.izip(lutfiles, processors):
         # init vars
         max_value = samples_count - 1.0
-        red_values = []
-        green_values = []
-        blue_values = []
-        input_range = []
+        input_range = numpy.arange(samples_count) / max_value
         # process color values
-        for code_value in range(0, samples_count):
-            norm_value = code_value / max_value
-            res = processor.applyRGB([norm_value, norm_value, norm_value])
-            red_values.append(res[0])
-            green_values.append(res[1])
-            blue_values.append(res[2])
-            input_range.append(norm_value)
+        res = get_process_function(processor)(
+            numpy.column_stack((input_range, input_range, input_range)))
+        red_values, green_values, blue_values = res.T
         # markers
         marker = markers_it.next()
         markersize = 0
@@ -154,7 +149,7 @@ def plot_curve(lutfiles, samples_count, processors, draw_red_curve=True,
                 label = "{0} (B)".format(labelbase)
             plot(input_range, blue_values, color=blues_it.next(), marker=marker,
                  label=label, linewidth=1, markersize=markersize)
-    matplotlib.pyplot.legend(loc=4)
+    legend(loc=4)
     return show_plot(fig, filename)
 
 
@@ -237,6 +232,9 @@ def plot_that_lut(lutfiles, plot_type=None, count=None, inverse=False,
         Exception from OpenColorIO binding
 
     """
+    from PyOpenColorIO.Constants import INTERP_LINEAR
+    from utils.ocio_helper import create_ocio_processor, is_3d_lut
+    from utils import matplotlib_helper as mplh
     if not isinstance(lutfiles, list):
         lutfiles = [lutfiles]
     mplh.set_matplotlib_backend()
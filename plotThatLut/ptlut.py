@@ -5,11 +5,10 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.1"
+__version__ = "0.2"
 import plot_that_lut
 import argparse
 from utils import debug_helper
-import sys
 
 
 def __get_options():
@@ -59,11 +58,12 @@ def __get_options():
                         version='{0} - version {1}'.format(description,
                                                            __version__))
     # full version
-    versions = debug_helper.get_imported_modules_versions(sys.modules,
-                                                          globals())
-    versions = '{0} - version {1}\n\n{2}'.format(description,
-                                                 __version__,
-                                                 versions)
+    get_versions = debug_helper.get_lazy_modules_versions(
+        globals(), plot_that_lut.LAZY_MODULES)
+
+    def versions():
+        return '{0} - version {1}\n\n{2}'.format(description, __version__,
+                                                 get_versions())
     parser.add_argument('-V', "--full-versions",
                         action=debug_helper.make_full_version_action(versions))
     # return args
@@ -17,8 +17,11 @@ from utils.spi_helper import SPI_HELPER
 from utils.ascii_helper import ASCII_HELPER, AsciiHelperException
 from utils.clcc_helper import CLCC_HELPER
 from utils.json_helper import JSON_HELPER
-from utils.ocio_helper import create_ocio_processor
-from utils.lut_utils import get_input_range
+from utils.ocio_helper import create_ocio_processor, get_process_function
+from utils.lut_utils import get_input_range, array_capable
+from utils.serialization_helper import (to_percent_format, format_rows,
+                                        SerializationHelperException)
+import numpy
 
 DISPLAY = False
 
@@ -287,6 +290,127 @@ class AbstractLUTTest(unittest.TestCase):
                                   outlutfile,
                                   cust_preset)
 
+    def test_array_capable_sampling(self):
+        """ Test array capable and scalar process functions give the same
+        3D data
+
+        """
+        def scalar_function(rgb):
+            return [rgb[0] * 0.5, rgb[1] * rgb[2], rgb[2] + 0.1]
+
+        @array_capable
+        def array_function(values):
+            return numpy.column_stack((values[:, 0] * 0.5,
+                                       values[:, 1] * values[:, 2],
+                                       values[:, 2] + 0.1))
+
+        for helper in [CUBE_HELPER, THREEDL_HELPER]:
+            preset = helper.get_default_preset()
+            for inverse_loops_order in [True, False]:
+                in_ref, ref = helper._get_3d_data(scalar_function, preset,
+                                                  inverse_loops_order)
+                in_res, res = helper._get_3d_data(array_function, preset,
+                                                  inverse_loops_order)
+                self.assertTrue(numpy.array_equal(in_ref, in_res))
+                self.assertTrue(numpy.array_equal(ref, res))
+
+    def test_batch_processor(self):
+        """ Test batch processing is equivalent to applyRGB
+
+        """
+        values = numpy.random.rand(1000, 3)
+        process_function = get_process_function(self.processor_3d,
+                                                chunk_size=64)
+        res = process_function(values)
+        self.assertEqual(res.shape, values.shape)
+        for rgb, res_rgb in zip(values.tolist(), res.tolist()):
+            self.assertEqual(self.processor_3d.applyRGB(rgb), res_rgb)
+        # flat float32 buffer
+        res = process_function(values.astype(numpy.float32).ravel())
+        self.assertEqual(res.dtype, numpy.float32)
+        self.assertEqual(res.shape, (3000,))
+
+    def test_array_capable_1d_sampling(self):
+        """ Test 1D data of array capable and scalar process functions
+
+        """
+        def scalar_function(rgb):
+            return [value * value for value in rgb]
+
+        @array_capable
+        def array_function(values):
+            return values * values
+
+        for helper in [ASCII_HELPER, CSP_HELPER]:
+            preset = helper.get_default_preset()
+            preset[presets.TYPE] = '2D'
+            ref = helper._get_1d_data(scalar_function, preset)
+            res = helper._get_1d_data(array_function, preset)
+            for ref_values, values in zip(ref, res):
+                self.assertTrue(numpy.array_equal(ref_values, values))
+
+    def test_shared_process_function(self):
+        """ Test a lattice is sampled once for several formats
+
+        """
+        calls = []
+
+        @array_capable
+        def process_function(values):
+            """ Count calls"""
+            calls.append(len(values))
+            return values ** 2
+        shared_function = alh.SharedProcessFunction(process_function)
+        for helper, ext, inverse in [(CUBE_HELPER, '.cube', False),
+                                     (THREEDL_HELPER, '.3dl', True),
+                                     (SPI_HELPER, '.spi3d', False)]:
+            preset = helper.get_default_preset()
+            preset[presets.CUBE_SIZE] = 17
+            preset[presets.IN_RANGE] = [0.0, 1.0]
+            ref = helper._get_3d_data(process_function, preset, inverse)[1]
+            res = helper._get_3d_data(shared_function, preset, inverse)[1]
+            self.assertTrue(numpy.array_equal(ref, res))
+        self.assertEqual(calls, [17 * 17 * 17] * 4)
+
+    def test_bulk_serialization(self):
+        """ Test bulk formatting matches line by line formatting
+
+        """
+        values = numpy.random.uniform(-10.0, 10.0, (100, 3))
+        int_values = (values * 100).astype(int)
+        for pattern in ["{0:.6f} {1:.6f} {2:.6f}\n", "{0},{1},{2}\n",
+                        "%{0} {1}% {2:.12f}\n"]:
+            row_format = to_percent_format(pattern)
+            for rows in [values, int_values]:
+                ref = "".join(pattern.format(*row) for row in rows.tolist())
+                self.assertEqual(format_rows(row_format, rows), ref)
+        self.failUnlessRaises(SerializationHelperException, to_percent_format,
+                              "{1} {0}")
+
+    def test_streamed_3d_data(self):
+        """ Test plane by plane sampling and atomic writing
+
+        """
+        @array_capable
+        def process_function(values):
+            """ Fail on last plane"""
+            if values[:, 2].min() == 1.0:
+                raise AssertionError("Failure")
+            return values ** 2
+        preset = CUBE_HELPER.get_default_preset()
+        preset[presets.TYPE] = '3D'
+        for inverse in [False, True]:
+            ref = CUBE_HELPER._get_3d_data(numpy.sqrt, preset, inverse)[1]
+            planes = [data for _, data in
+                      CUBE_HELPER._iter_3d_data(numpy.sqrt, preset, inverse)]
+            self.assertEqual(len(planes), preset[presets.CUBE_SIZE])
+            self.assertTrue(numpy.array_equal(numpy.concatenate(planes), ref))
+        # a failed export leaves no file
+        outlutfile = os.path.join(self.tmp_dir, 'failure.cube')
+        self.failUnlessRaises(AssertionError, CUBE_HELPER.write_3d_lut,
+                              process_function, outlutfile, preset)
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
     def tearDown(self):
         # Remove test directory
         shutil.rmtree(self.tmp_dir)
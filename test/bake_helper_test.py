@@ -0,0 +1,95 @@
+""" Testing LUT chain baking
+
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from utils import lut_presets as presets
+from utils.matrix_helper import write_spimtx
+from utils.cube_helper import CUBE_HELPER
+from utils.spi_helper import SPI_HELPER
+from utils.lut_model import read_lut
+from utils.lut_interpolation import TETRAHEDRAL, TRILINEAR
+from utils.bake_helper import (read_stages, get_chain_function, bake_chain,
+                               MatrixStage, BakeHelperException)
+from transforms import saturation, gamma
+
+
+class BakeHelperTest(unittest.TestCase):
+    """ Test LUT chain baking
+
+    """
+    def setUp(self):
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+        self.matrix = numpy.matrix([[0.9, 0.05, 0.05], [0.1, 0.8, 0.1],
+                                    [0.0, 0.1, 0.9]])
+        self.spimtx = os.path.join(self.tmp_dir, 'matrix.spimtx')
+        write_spimtx(self.matrix, self.spimtx, 655.35, 0, 0)
+        self.lut3d = os.path.join(self.tmp_dir, 'saturation.cube')
+        preset = CUBE_HELPER.get_default_preset()
+        preset[presets.TYPE] = '3D'
+        preset[presets.CUBE_SIZE] = 17
+        CUBE_HELPER.write_3d_lut(saturation, self.lut3d, preset)
+        self.lut1d = os.path.join(self.tmp_dir, 'gamma.spi1d')
+        preset = SPI_HELPER.get_default_preset()
+        preset[presets.TYPE] = '1D'
+        preset[presets.OUT_BITDEPTH] = 12
+        SPI_HELPER.write_1d_lut(gamma, self.lut1d, preset)
+
+    def test_read_stages(self):
+        """ Matrices are combined, identical stages are read once
+
+        """
+        copy = os.path.join(self.tmp_dir, 'copy.cube')
+        shutil.copy(self.lut3d, copy)
+        stages = read_stages([self.spimtx, self.spimtx, self.lut3d, copy])
+        self.assertEqual(len(stages), 3)
+        self.assertTrue(isinstance(stages[0], MatrixStage))
+        self.assertTrue(stages[1] is stages[2])
+        values = numpy.random.rand(100, 3)
+        ref = numpy.dot(values, self.matrix.A.T) + [0.01, 0, 0]
+        ref = numpy.dot(ref, self.matrix.A.T) + [0.01, 0, 0]
+        self.assertTrue(numpy.allclose(stages[0](values), ref, rtol=0,
+                                       atol=1e-9))
+
+    def test_bake_chain(self):
+        """ Bake a matrix, a 3D LUT and a 1D LUT
+
+        """
+        chain = [self.spimtx, self.lut3d]
+        chain_function = get_chain_function(chain, postlutfile=self.lut1d)
+        values = numpy.random.rand(1000, 3)
+        ref = numpy.dot(values, self.matrix.A.T) + [0.01, 0, 0]
+        ref = read_lut(self.lut1d)(read_lut(self.lut3d)(ref))
+        self.assertTrue(numpy.allclose(chain_function(values), ref, rtol=0,
+                                       atol=1e-6))
+        # one lattice
+        lut = bake_chain(chain, 9, postlutfile=self.lut1d)
+        self.assertEqual(lut.cube_size, 9)
+        ramp = numpy.linspace(0.0, 1.0, 9)
+        self.assertTrue(numpy.allclose(lut.table[2, 8, 5],
+                                       chain_function([ramp[2], ramp[8],
+                                                       ramp[5]]),
+                                       rtol=0, atol=1e-6))
+        # 1D LUT in the chain: OpenColorIO interpolates linearly
+        self.assertEqual(get_chain_function(chain, postlutfile=self.lut1d,
+                                            interpolation=None).interpolation,
+                         TRILINEAR)
+        self.assertEqual(get_chain_function(chain,
+                                            interpolation=None).interpolation,
+                         TETRAHEDRAL)
+        # OCIO only format
+        self.failUnlessRaises(BakeHelperException, get_chain_function,
+                              [self.lut3d, 'look.ccc'])
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
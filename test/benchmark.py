@@ -0,0 +1,498 @@
+""" Benchmarks of LUT sampling, writing and conversions
+
+Each benchmark is run in its own process, so that its peak memory is
+measured. Results can be saved as JSON and compared with a baseline:
+
+    python test/benchmark.py --save baseline.json
+    python test/benchmark.py --baseline baseline.json --threshold 0.2
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.2"
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+import traceback
+import numpy
+try:
+    import resource
+except ImportError:
+    # Windows: peak memory isn't measured
+    resource = None
+from transforms import saturation, gamma
+
+
+class BenchmarkException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+DEFAULT_REPEAT = 3
+# Max slowdown before a benchmark is reported as a regression
+DEFAULT_THRESHOLD = 0.2
+BITDEPTHS = [10, 12, 14, 16]
+WRITE_BITDEPTHS = [12, 16]
+CUBE_SIZES = [17, 33, 65]
+# (format, type) of 1D exports. Csp and Cube 1D LUTs are written as 2D ones
+EXPORTS_1D = [('csp', '2D'), ('cube', '2D'), ('lut', '1D'), ('spi', '1D')]
+FORMATS_3D = ['3dl', 'csp', 'cube', 'spi', 'clcc', 'json']
+TEST_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'test_files')
+LUT_FIXTURES = ['CineonToLin_1D.csp', 'saturation.3dl']
+
+
+def _get_sampling_benchmarks():
+    """ Return 1D and 3D sampling benchmarks
+
+    Returns:
+        .[(str, int, func)] name, number of samples, benchmarked function
+
+    """
+    from utils import lut_presets as presets
+    from utils.csp_helper import CSP_HELPER
+    benchmarks = []
+    for bitdepth in BITDEPTHS:
+        preset = CSP_HELPER.get_default_preset()
+        preset[presets.TYPE] = '2D'
+        preset[presets.OUT_BITDEPTH] = bitdepth
+        benchmarks.append((
+            "sampling/1d/{0}bit".format(bitdepth), 1 << bitdepth,
+            lambda preset=preset: CSP_HELPER._get_1d_data(gamma, preset)))
+    for cube_size in CUBE_SIZES:
+        preset = CSP_HELPER.get_default_preset()
+        preset[presets.TYPE] = '3D'
+        preset[presets.CUBE_SIZE] = cube_size
+        benchmarks.append((
+            "sampling/3d/{0}".format(cube_size), cube_size ** 3,
+            lambda preset=preset: CSP_HELPER._get_3d_data(saturation,
+                                                          preset)))
+    return benchmarks
+
+
+def _get_write_benchmarks(tmp_dir):
+    """ Return write_1d_lut / write_3d_lut benchmarks of every helper
+
+    Args:
+        tmp_dir (str): directory of written LUTs
+
+    Returns:
+        .[(str, int, func)] name, number of samples, benchmarked function
+
+    """
+    from utils.export_tool_helper import get_preset_and_write_function
+
+    def get_function(out_type, out_format, out_bit_depth=None,
+                     out_cube_size=None):
+        """ Return a function writing a LUT
+
+        """
+        output_range = None
+        if out_format == 'lut':
+            # Ascii LUTs are written in output bitdepth range
+            output_range = [0, (1 << out_bit_depth) - 1]
+        preset, write_function = get_preset_and_write_function(
+            out_type, out_format, output_range=output_range,
+            out_bit_depth=out_bit_depth, out_cube_size=out_cube_size)
+        process_function = gamma if out_type != '3D' else saturation
+        outlutfile = os.path.join(tmp_dir, "bench{0}".format(
+            preset['extension']))
+        return lambda: write_function(process_function, outlutfile, preset)
+    benchmarks = []
+    for out_format, out_type in EXPORTS_1D:
+        for bitdepth in WRITE_BITDEPTHS:
+            benchmarks.append((
+                "write_1d/{0}/{1}bit".format(out_format, bitdepth),
+                1 << bitdepth,
+                (out_type, out_format, bitdepth, None)))
+    for out_format in FORMATS_3D:
+        for cube_size in CUBE_SIZES:
+            benchmarks.append((
+                "write_3d/{0}/{1}".format(out_format, cube_size),
+                cube_size ** 3,
+                ('3D', out_format, None, cube_size)))
+    # write functions are built when the benchmark is run
+    return [(name, samples, lambda args=args: get_function(*args)())
+            for name, samples, args in benchmarks]
+
+
+def _clear_memory_caches():
+    """ Clear in-memory gradations and matrices, read LUTs, OpenColorIO
+    processors and OpenColorIO file cache, so that a benchmark run doesn't
+    reuse what a previous run computed. On-disk caches are kept
+
+    """
+    from utils.cache_helper import ARRAY_CACHE
+    from utils.colors_helper import MATRIX_CACHE
+    from utils.lut_model import LUT_CACHE
+    ARRAY_CACHE.clear()
+    MATRIX_CACHE.clear()
+    LUT_CACHE.clear()
+    # nothing to clear if OpenColorIO wasn't used
+    if 'utils.ocio_helper' in sys.modules:
+        from utils.ocio_helper import PROCESSOR_CACHE, ClearAllCaches
+        PROCESSOR_CACHE.clear()
+        ClearAllCaches()
+
+
+def _get_ocio_benchmarks():
+    """ Return OpenColorIO processor creation benchmarks. Processor cache
+    isn't used and OpenColorIO caches are cleared before each run.
+
+    Returns:
+        .[(str, int, func)] name, number of samples (None), benchmarked
+        function
+
+    """
+    def create_processor(lutfile):
+        """ Create a processor
+
+        """
+        from utils.ocio_helper import create_ocio_processor
+        _clear_memory_caches()
+        create_ocio_processor([lutfile], use_cache=False)
+    return [("ocio/create_processor/{0}".format(fixture), None,
+             lambda fixture=fixture: create_processor(
+                 os.path.join(TEST_FILES, fixture)))
+            for fixture in LUT_FIXTURES]
+
+
+def _get_tool_benchmarks(tmp_dir):
+    """ Return curve_to_lut and lut_to_lut benchmarks. Output cache isn't
+    used and in-memory caches are cleared before each run (see
+    _clear_memory_caches).
+
+    Args:
+        tmp_dir (str): directory of written LUTs
+
+    Returns:
+        .[(str, int, func)] name, number of samples, benchmarked function
+
+    """
+    from utils.colorspaces import COLORSPACES
+    from lutLab.curve_to_lut import curve_to_lut
+    from lutLab.lut_to_lut import lut_to_lut
+    # every run computes gradations, reads input LUTs and builds its
+    # processors again
+    def uncached(tool):
+        """ Return tool function run with empty caches
+
+        """
+        def run(*args, **kwargs):
+            """ Run tool with empty caches
+
+            """
+            _clear_memory_caches()
+            tool(*args, **kwargs)
+        return run
+    uncached_curve_to_lut = uncached(curve_to_lut)
+    uncached_lut_to_lut = uncached(lut_to_lut)
+    benchmarks = []
+    outlutfile = os.path.join(tmp_dir, "bench.spi1d")
+    for name in sorted(COLORSPACES):
+        benchmarks.append((
+            "curve_to_lut/{0}".format(name), 1 << 16,
+            lambda name=name: uncached_curve_to_lut(
+                name, None, outlutfile, '1D', 'spi', out_bit_depth=16,
+                use_cache=False)))
+    for fixture in LUT_FIXTURES:
+        inlutfile = os.path.join(TEST_FILES, fixture)
+        benchmarks.append((
+            "lut_to_lut/{0}/spi1d_16bit".format(fixture), 1 << 16,
+            lambda inlutfile=inlutfile: uncached_lut_to_lut(
+                inlutfile, '1D', 'spi', outlutfile, out_bit_depth=16,
+                use_cache=False)))
+        benchmarks.append((
+            "lut_to_lut/{0}/cube_33".format(fixture), 33 ** 3,
+            lambda inlutfile=inlutfile: uncached_lut_to_lut(
+                inlutfile, '3D', 'cube',
+                os.path.join(tmp_dir, "bench.cube"), out_cube_size=33,
+                use_cache=False)))
+    return benchmarks
+
+
+def get_benchmarks(tmp_dir):
+    """ Return every benchmark
+
+    Args:
+        tmp_dir (str): directory of written LUTs
+
+    Returns:
+        .[(str, int, func)] name, number of samples (None if not
+        relevant), benchmarked function
+
+    """
+    return (_get_sampling_benchmarks() + _get_write_benchmarks(tmp_dir)
+            + _get_ocio_benchmarks() + _get_tool_benchmarks(tmp_dir))
+
+
+def _get_peak_memory():
+    """ Return peak resident memory of the current process
+
+    Returns:
+        .float MB, None if it can't be measured
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    if sys.platform == 'darwin':
+        return peak / float(1 << 20)
+    return peak / 1024.0
+
+
+def _measure(function, repeat):
+    """ Time a function
+
+    Args:
+        function (func): benchmarked function
+
+        repeat (int): number of runs. Best duration is kept
+
+    Returns:
+        .dict with duration (s) and peak_memory (MB, increase during the
+        runs)
+
+    """
+    start_memory = _get_peak_memory()
+    durations = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        durations.append(timeit.default_timer() - start)
+    peak_memory = None
+    if start_memory is not None:
+        peak_memory = _get_peak_memory() - start_memory
+    return {'duration': min(durations), 'peak_memory': peak_memory}
+
+
+def _measure_in_process(function, repeat):
+    """ Time a function in a forked process, so that its peak memory
+    doesn't depend on previous benchmarks
+
+    Args:
+        function (func): benchmarked function
+
+        repeat (int): number of runs
+
+    Returns:
+        .dict. See _measure
+
+    """
+    if resource is None:
+        return _measure(function, repeat)
+    reader, writer = multiprocessing.Pipe(False)
+
+    def target():
+        """ Send measure or error to parent process
+
+        """
+        try:
+            writer.send(_measure(function, repeat))
+        except Exception as error:
+            writer.send({'error': "{0}\n{1}".format(error,
+                                                    traceback.format_exc())})
+    process = multiprocessing.Process(target=target)
+    process.start()
+    writer.close()
+    try:
+        result = reader.recv()
+    except EOFError:
+        result = {'error': "Benchmark process died (exit code {0})".format(
+            process.exitcode)}
+    process.join()
+    return result
+
+
+def run_benchmarks(name_filter=None, repeat=DEFAULT_REPEAT, verbose=False):
+    """ Run benchmarks
+
+    Kwargs:
+        name_filter (str): regular expression. Only benchmarks whose name
+        matches are run
+
+        repeat (int): number of runs of each benchmark. Best duration is
+        kept
+
+        verbose (bool): print results as they come
+
+    Returns:
+        .dict benchmark name: {'samples', 'duration' (s),
+        'throughput' (samples/s), 'peak_memory' (MB)} or {'error'}
+
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='benchCoPipe')
+    results = {}
+    try:
+        for name, samples, function in get_benchmarks(tmp_dir):
+            if name_filter and not re.search(name_filter, name):
+                continue
+            result = _measure_in_process(function, repeat)
+            if 'error' not in result:
+                result['samples'] = samples
+                result['throughput'] = None
+                if samples and result['duration'] > 0:
+                    result['throughput'] = samples / result['duration']
+            results[name] = result
+            if verbose:
+                print format_result(name, result)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def format_result(name, result):
+    """ Return a report line
+
+    Args:
+        name (str): benchmark name
+
+        result (dict): benchmark result. See run_benchmarks
+
+    Returns:
+        .str
+
+    """
+    if 'error' in result:
+        return "{0:<45} error: {1}".format(
+            name, result['error'].splitlines()[0])
+    line = "{0:<45} {1:>9.4f} s".format(name, result['duration'])
+    if result.get('throughput'):
+        line += " {0:>12.4g} samples/s".format(result['throughput'])
+    else:
+        line += " " * 22
+    if result.get('peak_memory') is not None:
+        line += " {0:>8.1f} MB".format(result['peak_memory'])
+    return line
+
+
+def save_results(results, file_path):
+    """ Save results as JSON, with the environment they were measured in
+
+    Args:
+        results (dict): see run_benchmarks
+
+        file_path (str): path to a .json file
+
+    """
+    with open(file_path, 'w') as results_file:
+        json.dump({'version': __version__,
+                   'python': platform.python_version(),
+                   'numpy': numpy.__version__,
+                   'platform': platform.platform(),
+                   'results': results}, results_file, indent=2,
+                  sort_keys=True)
+
+
+def load_results(file_path):
+    """ Load results saved by save_results
+
+    Args:
+        file_path (str): path to a .json file
+
+    Returns:
+        .dict. See run_benchmarks
+
+    """
+    try:
+        with open(file_path) as results_file:
+            return json.load(results_file)['results']
+    except (IOError, ValueError, KeyError) as error:
+        raise BenchmarkException(("Can't read benchmark results {0}: {1}"
+                                  ).format(file_path, error))
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """ Return benchmarks slower than their baseline, or failing whereas
+    their baseline succeeded
+
+    Args:
+        results (dict): see run_benchmarks
+
+        baseline (dict): baseline results
+
+    Kwargs:
+        threshold (float): max relative slowdown. Ex: 0.2 = 20% slower
+
+    Returns:
+        .[(str, float, float)] name, baseline and current duration of
+        regressions. Current duration is None if benchmark failed
+
+    """
+    regressions = []
+    for name in sorted(set(results) & set(baseline)):
+        duration = results[name].get('duration')
+        base_duration = baseline[name].get('duration')
+        if base_duration is None:
+            continue
+        if duration is None:
+            regressions.append((name, base_duration, None))
+        elif duration > base_duration * (1 + threshold):
+            regressions.append((name, base_duration, duration))
+    return regressions
+
+
+def __get_options():
+    """ Return benchmark option parser
+
+    Returns:
+        .argparse.ArgumentParser.args
+
+    """
+    description = 'Benchmark LUT sampling, writing and conversions'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("-k", "--filter", help=(
+        "Run benchmarks whose name matches this regular expression. "
+        "Ex: 'write_3d/.*/65'"), default=None, type=str)
+    parser.add_argument("-r", "--repeat", help=(
+        "Runs of each benchmark, best one is kept. Default is {0}"
+    ).format(DEFAULT_REPEAT), default=DEFAULT_REPEAT, type=int)
+    parser.add_argument("-s", "--save", help="Save results as JSON",
+                        default=None, type=str)
+    parser.add_argument("-b", "--baseline", help=(
+        "Compare with JSON results saved by --save"), default=None,
+        type=str)
+    parser.add_argument("-t", "--threshold", help=(
+        "Max relative slowdown compared with baseline. Default is {0}"
+    ).format(DEFAULT_THRESHOLD), default=DEFAULT_THRESHOLD, type=float)
+    parser.add_argument('-v', "--version", action='version',
+                        version='{0} - version {1}'.format(description,
+                                                           __version__))
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = __get_options()
+    BASELINE = None
+    if ARGS.baseline:
+        BASELINE = load_results(ARGS.baseline)
+    RESULTS = run_benchmarks(ARGS.filter, ARGS.repeat, verbose=True)
+    if ARGS.save:
+        save_results(RESULTS, ARGS.save)
+    if BASELINE is not None:
+        REGRESSIONS = compare_results(RESULTS, BASELINE, ARGS.threshold)
+        for NAME, BASE_DURATION, DURATION in REGRESSIONS:
+            if DURATION is None:
+                print "Failure: {0} {1:.4f} s -> error: {2}".format(
+                    NAME, BASE_DURATION,
+                    RESULTS[NAME]['error'].splitlines()[0])
+                continue
+            print "Regression: {0} {1:.4f} s -> {2:.4f} s (+{3:.0%})".format(
+                NAME, BASE_DURATION, DURATION,
+                DURATION / BASE_DURATION - 1)
+        if REGRESSIONS:
+            sys.exit(1)
+        print "No regression over {0:.0%}".format(ARGS.threshold)
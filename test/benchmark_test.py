@@ -0,0 +1,58 @@
+""" Testing benchmark suite
+
+"""
+import unittest
+import os
+import shutil
+import tempfile
+from benchmark import (run_benchmarks, save_results, load_results,
+                       compare_results, BenchmarkException)
+
+
+class BenchmarkTest(unittest.TestCase):
+    """ Test benchmark run, results and baseline comparison
+
+    """
+    def setUp(self):
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+
+    def test_run_and_compare(self):
+        """ Run a few benchmarks, save them and compare with a baseline
+
+        """
+        results = run_benchmarks('^sampling/1d/10bit$|^write_3d/cube/17$',
+                                 repeat=1)
+        self.assertEqual(sorted(results),
+                         ['sampling/1d/10bit', 'write_3d/cube/17'])
+        for result in results.values():
+            self.assertTrue(result['duration'] > 0)
+            self.assertTrue(result['throughput'] > 0)
+        self.assertEqual(results['write_3d/cube/17']['samples'], 17 ** 3)
+        results_file = os.path.join(self.tmp_dir, 'bench.json')
+        save_results(results, results_file)
+        baseline = load_results(results_file)
+        self.assertEqual(compare_results(results, baseline), [])
+        # 2x slower
+        baseline['write_3d/cube/17']['duration'] /= 2.0
+        regressions = compare_results(results, baseline, threshold=0.5)
+        self.assertEqual([name for name, _, _ in regressions],
+                         ['write_3d/cube/17'])
+        self.assertEqual(compare_results(results, baseline, threshold=1.5),
+                         [])
+        # failing benchmark that succeeded in baseline
+        results['sampling/1d/10bit'] = {'error': 'failed'}
+        self.assertEqual(compare_results(results, baseline, threshold=1.5),
+                         [('sampling/1d/10bit',
+                           baseline['sampling/1d/10bit']['duration'], None)])
+        self.assertRaises(BenchmarkException, load_results,
+                          os.path.join(self.tmp_dir, 'missing.json'))
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+""" Testing array and output caches
+
+"""
+import unittest
+import os
+import shutil
+import stat
+import tempfile
+import numpy
+from utils.cache_helper import (ArrayCache, LRUCache, OutputCache,
+                                get_output_key, get_file_digest)
+
+
+class CacheHelperTest(unittest.TestCase):
+    """ Test memory and disk caches
+
+    """
+    def setUp(self):
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+
+    def test_cache(self):
+        """ Cached arrays are read only and shared across caches on disk
+
+        """
+        key = ('test', 1, 0.5)
+        cache = ArrayCache(os.path.join(self.tmp_dir, 'cache'))
+        self.assertTrue(cache.get(key) is None)
+        array = cache.put(key, numpy.arange(10.0))
+        self.assertFalse(array.flags.writeable)
+        self.assertTrue(cache.get(key) is array)
+        # new process
+        other_cache = ArrayCache(cache.get_cache_dir())
+        self.assertEqual(other_cache.get(key).tolist(), array.tolist())
+        self.assertTrue(other_cache.get(key, use_disk=False) is not None)
+        other_cache.clear(use_disk=True)
+        self.assertEqual(len(other_cache), 0)
+        self.assertTrue(ArrayCache(cache.get_cache_dir()).get(key) is None)
+        # memory only
+        cache = ArrayCache()
+        if cache.get_cache_dir() is None:
+            cache.put(key, array)
+            self.assertEqual(len(cache), 1)
+
+    def test_lru_cache(self):
+        """ Least recently used items are dropped, matching keys discarded
+
+        """
+        cache = LRUCache(2)
+        cache.put(('a', 1), 'a1')
+        cache.put(('b', 1), 'b1')
+        self.assertEqual(cache.get(('a', 1)), 'a1')
+        cache.put(('a', 2), 'a2')
+        self.assertTrue(cache.get(('b', 1)) is None)
+        self.assertEqual(cache.discard(lambda key: key[0] == 'a'), 2)
+        self.assertEqual(cache.get_stats(), {'size': 0, 'capacity': 2,
+                                             'hits': 1, 'misses': 1})
+
+    def test_output_cache(self):
+        """ Written files are reused and least recently used ones evicted
+
+        """
+        cache = OutputCache(os.path.join(self.tmp_dir, 'outputs'),
+                            max_size=2.5 / 1024)
+        self.assertTrue(cache.is_enabled())
+        files = []
+        for index in range(4):
+            file_path = os.path.join(self.tmp_dir, 'lut{0}.txt'.format(index))
+            with open(file_path, 'w') as afile:
+                afile.write(str(index) * 1024)
+            files.append(file_path)
+        keys = [get_output_key('test', get_file_digest(file_path))
+                for file_path in files]
+        self.assertEqual(len(set(keys)), 4)
+        self.assertEqual(keys[0], get_output_key('test',
+                                                 get_file_digest(files[0])))
+        self.assertFalse(cache.fetch(keys[0], [files[0]]))
+        cache.store(keys[0], [files[0]])
+        cache.store(keys[1], [files[1]])
+        out_path = os.path.join(self.tmp_dir, 'out.txt')
+        self.assertTrue(cache.fetch(keys[0], [out_path]))
+        with open(out_path) as afile:
+            self.assertEqual(afile.read(), '0' * 1024)
+        # stored files are read-only copies
+        cached_file = os.path.join(cache.get_cache_dir(), keys[0], '0')
+        self.assertFalse(os.stat(cached_file).st_mode & stat.S_IWUSR)
+        self.assertEqual(os.stat(files[0]).st_nlink, 1)
+        self.assertEqual(os.stat(out_path).st_nlink, 1)
+        # least recently used entry is evicted
+        os.utime(os.path.join(cache.get_cache_dir(), keys[1]), (0, 0))
+        cache.store(keys[2], [files[2]])
+        self.assertEqual(cache.get_stats()['entries'], 2)
+        self.assertFalse(cache.fetch(keys[1], [out_path]))
+        self.assertTrue(cache.fetch(keys[0], [out_path]))
+        cache.clear()
+        self.assertEqual(cache.get_stats()['size'], 0)
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,18 @@
 
 """
 import unittest
+import os
 import numpy
 from utils.colorspaces import (REC709, ALEXALOGCV3, WIDEGAMUT, REC2020_12B,
+                               REC2020_10B,
                                ACESLOG_32f, sRGB, SGAMUTSLOG, SGAMUTSLOG2,
-                               SGAMUTSLOG3, ACESCC, ACESPROXY_10i
+                               SGAMUTSLOG3, ACESCC, ACESPROXY_10i,
+                               COLORSPACES, ColorspaceException,
+                               COMPILED_GRADATION_ENV
                                )
 from utils.colors_helper import apply_matrix, get_RGB_to_RGB_matrix, get_colorspace_matrix
+from utils import colors_helper
+from utils.private_colorspaces import PRIVATE_COLORSPACES
 
 
 class ColorspaceTest(unittest.TestCase):
@@ -40,6 +46,80 @@ class ColorspaceTest(unittest.TestCase):
                                                             res)
                 self.assertTrue(numpy.isclose(res, value, atol=0.00000000000001), message)
 
+    def test_array_gradation(self):
+        """ Test array gradations are equivalent to scalar ones
+
+        """
+        values = numpy.linspace(0.0, 1.0, 1001)
+        for name, space in COLORSPACES.items():
+            for function in [space.encode_gradation, space.decode_gradation]:
+                ref = numpy.array([function(float(value))
+                                   for value in values])
+                res = function(values.reshape(7, 11, 13))
+                message = ("{0} array gradation is different from scalar"
+                           " one").format(name)
+                self.assertEqual(res.shape, (7, 11, 13))
+                self.assertTrue(numpy.allclose(res.ravel(), ref,
+                                               rtol=1e-12, atol=0), message)
+
+    def test_compiled_gradation(self):
+        """ Test compiled gradations are within tolerance of analytic ones
+
+        """
+        values = numpy.linspace(-0.1, 1.1, 10001)
+        for space in [ALEXALOGCV3, SGAMUTSLOG3, ACESCC]:
+            name = space.__class__.__name__
+            ref = space.decode_gradation(values)
+            linear = space.decode_gradation(numpy.linspace(0.0, 1.0, 10001))
+            ref_encode = space.encode_gradation(linear)
+            space.set_compiled_gradation()
+            try:
+                res = space.decode_gradation(values)
+                res_encode = space.encode_gradation(linear)
+            finally:
+                space.set_compiled_gradation(False)
+            span = numpy.ptp(ref[(values >= 0) & (values <= 1)])
+            self.assertTrue(numpy.abs(res - ref).max() / span < 1e-5, name)
+            # values outside the table are processed by analytic function
+            self.assertEqual(res[0], ref[0])
+            self.assertTrue(numpy.abs(res_encode - ref_encode).max() < 1e-5,
+                            name)
+        # cached table
+        compiled = ALEXALOGCV3.compile_gradation('decode')
+        self.assertTrue(numpy.may_share_memory(
+            ALEXALOGCV3.compile_gradation('decode').table, compiled.table))
+        self.failUnlessRaises(ColorspaceException,
+                              ALEXALOGCV3.compile_gradation, 'decode', 16,
+                              1e-9)
+        # colorspaces of the same class with other parameters don't share
+        # their tables
+        self.assertNotEqual(REC2020_10B.get_gradation_params(),
+                            REC2020_12B.get_gradation_params())
+        self.assertNotEqual(REC2020_10B._get_gradation_key('encode', 4096),
+                            REC2020_12B._get_gradation_key('encode', 4096))
+
+    def test_compiled_gradation_env(self):
+        """ Compiled mode is enabled by environment until it is set
+
+        """
+        space = ALEXALOGCV3.__class__()
+        values = numpy.linspace(0.0, 1.0, 1001)
+        ref = space.decode_gradation(values)
+        compiled = space.compile_gradation('decode')(values)
+        previous_env = os.environ.get(COMPILED_GRADATION_ENV)
+        os.environ[COMPILED_GRADATION_ENV] = '1'
+        try:
+            self.assertTrue(numpy.array_equal(space.decode_gradation(values),
+                                              compiled))
+            space.set_compiled_gradation(False)
+            self.assertTrue(numpy.array_equal(space.decode_gradation(values),
+                                              ref))
+        finally:
+            if previous_env is None:
+                del os.environ[COMPILED_GRADATION_ENV]
+            else:
+                os.environ[COMPILED_GRADATION_ENV] = previous_env
+
     def test_aces_proxy(self):
         """Test ACES proxy (matrix + encoding)
 
@@ -73,6 +153,46 @@ class ColorspaceTest(unittest.TestCase):
         self.assertEqual(ACES_to_XYZ, get_colorspace_matrix("ACES").tolist())
         self.assertEqual(XYZ_to_ACES, get_colorspace_matrix("ACES", inv=True).tolist())
 
+    def test_matrix_cache(self):
+        """Test matrices are computed once, and again for new colorspaces
+
+        """
+        matrix = get_RGB_to_RGB_matrix('ACES', 'Rec709')
+        self.assertEqual(type(matrix), numpy.ndarray)
+        self.assertFalse(matrix.flags.writeable)
+        self.assertTrue(get_RGB_to_RGB_matrix('ACES', 'Rec709') is matrix)
+        # colorspace registered at runtime
+        try:
+            PRIVATE_COLORSPACES['test_D65'] = sRGB
+            self.assertTrue(get_RGB_to_RGB_matrix('ACES', 'test_D65')
+                            is matrix)
+            PRIVATE_COLORSPACES['test_D65'] = ALEXALOGCV3
+            self.assertTrue(numpy.allclose(
+                get_RGB_to_RGB_matrix('ACES', 'test_D65'),
+                get_RGB_to_RGB_matrix('ACES', 'AlexaLogCV3')))
+        finally:
+            del PRIVATE_COLORSPACES['test_D65']
+
+    def test_array_chromaticities(self):
+        """Test array conversions are equivalent to triplet ones
+
+        """
+        xy = numpy.random.RandomState(0).uniform(0.1, 0.6, (100, 2))
+        for function, args in [(colors_helper.xy_to_XYZ, []),
+                               (colors_helper.xy_to_upvp, []),
+                               (colors_helper.xy_to_RGB, [REC709]),
+                               (colors_helper.xy_to_RGB, [sRGB, True])]:
+            ref = [function(value, *args) for value in xy.tolist()]
+            res = function(xy, *args)
+            self.assertTrue(numpy.allclose(res, ref, rtol=1e-12, atol=0),
+                            function.__name__)
+        XYZ = colors_helper.xy_to_XYZ(xy, numpy.linspace(0.1, 1.0, 100))
+        self.assertTrue(numpy.allclose(colors_helper.XYZ_to_xy(XYZ), xy))
+        matrix = get_RGB_to_RGB_matrix('ACES', 'Rec709')
+        self.assertTrue(numpy.allclose(apply_matrix(matrix, XYZ),
+                                       [apply_matrix(matrix, value)
+                                        for value in XYZ.tolist()]))
+
     def test_rgb_to_rgb_matrix(self):
         """Test rgb to rgb matrix
 
@@ -5,7 +5,12 @@ import unittest
 import shutil
 import os
 import tempfile
+import numpy
 from lutLab.curve_to_lut import curve_to_lut
+from utils.cache_helper import OUTPUT_CACHE, OUTPUT_CACHE_DIR_ENV
+from utils.lut_model import read_lut
+from utils.colorspaces import REC2020_10B, REC2020_12B
+from utils.private_colorspaces import PRIVATE_COLORSPACES
 
 
 class CurveToLUTTest(unittest.TestCase):
@@ -33,6 +38,51 @@ class CurveToLUTTest(unittest.TestCase):
         curve_to_lut('AlexaLogCV3', None, self.tmp_dir, '1D', 'csp',
                      process_input_range=True)
 
+    def test_compiled_gradation(self):
+        """ Compiled gradation LUTs match analytic ones
+
+        """
+        analytic_file = os.path.join(self.tmp_dir, 'analytic.spi1d')
+        compiled_file = os.path.join(self.tmp_dir, 'compiled.spi1d')
+        curve_to_lut('AlexaLogCV3', None, analytic_file, '1D', 'spi',
+                     direction='decode', use_cache=False)
+        curve_to_lut('AlexaLogCV3', None, compiled_file, '1D', 'spi',
+                     direction='decode', use_cache=False,
+                     compiled_gradation=True)
+        analytic = read_lut(analytic_file, dtype=numpy.float64).table
+        compiled = read_lut(compiled_file, dtype=numpy.float64).table
+        span = numpy.ptp(analytic)
+        self.assertTrue(numpy.abs(compiled - analytic).max() / span < 1e-5)
+
+    def test_private_colorspace_cache(self):
+        """ Private colorspaces with the same name but other parameters
+        don't reuse cached exports
+
+        """
+        previous_cache_dir = os.environ.get(OUTPUT_CACHE_DIR_ENV)
+        os.environ[OUTPUT_CACHE_DIR_ENV] = os.path.join(self.tmp_dir, 'cache')
+        outlutfile = os.path.join(self.tmp_dir, 'private.csp')
+        try:
+            PRIVATE_COLORSPACES['Private'] = REC2020_10B
+            curve_to_lut('Private', None, outlutfile, '1D', 'csp')
+            with open(outlutfile) as lut:
+                content_10b = lut.read()
+            hits = OUTPUT_CACHE.hits
+            PRIVATE_COLORSPACES['Private'] = REC2020_12B
+            curve_to_lut('Private', None, outlutfile, '1D', 'csp')
+            self.assertEqual(OUTPUT_CACHE.hits, hits)
+            with open(outlutfile) as lut:
+                self.assertNotEqual(lut.read(), content_10b)
+            # same colorspace: export is reused
+            curve_to_lut('Private', None, outlutfile, '1D', 'csp')
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 1)
+        finally:
+            del PRIVATE_COLORSPACES['Private']
+            if previous_cache_dir is None:
+                del os.environ[OUTPUT_CACHE_DIR_ENV]
+            else:
+                os.environ[OUTPUT_CACHE_DIR_ENV] = previous_cache_dir
+
     def tearDown(self):
         # Remove test directory
         shutil.rmtree(self.tmp_dir)
@@ -0,0 +1,81 @@
+""" Testing image buffer transforms
+
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from utils import colors_helper
+from utils.colorspaces import REC709
+from utils.lut_model import Lut3D
+from utils.image_helper import (convert_image, apply_to_image,
+                                ImageHelperException)
+
+
+class ImageHelperTest(unittest.TestCase):
+    """ Test in place image conversions
+
+    """
+    def setUp(self):
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+        self.image = numpy.random.RandomState(0).uniform(
+            0.0, 1.0, (48, 64, 3)).astype(numpy.float32)
+
+    def test_convert_image(self):
+        """ Tiled and threaded conversion matches per pixel conversion
+
+        """
+        image = self.image.copy()
+        res = convert_image(image, 'ACES', 'Rec709', tile_size=500,
+                            threads=4)
+        self.assertTrue(res is image)
+        matrix = colors_helper.get_RGB_to_RGB_matrix('ACES', 'Rec709')
+        for rgb, ref_rgb in zip(image.reshape(-1, 3)[::97].tolist(),
+                                self.image.reshape(-1, 3)[::97].tolist()):
+            ref = colors_helper.apply_matrix(matrix, ref_rgb)
+            ref = [REC709.encode_gradation(value) for value in ref]
+            self.assertTrue(numpy.allclose(rgb, ref, rtol=1e-5, atol=1e-6))
+        # round trip
+        convert_image(image, 'Rec709', 'ACES', threads=1)
+        self.assertTrue(numpy.allclose(image, self.image, atol=1e-5))
+
+    def test_memmap(self):
+        """ Memory-mapped buffers are converted in the file
+
+        """
+        path = os.path.join(self.tmp_dir, 'frame.raw')
+        image = numpy.memmap(path, dtype=numpy.float32, mode='w+',
+                             shape=self.image.shape)
+        image[:] = self.image
+        convert_image(image, 'ACES', 'ACES')
+        self.assertTrue(numpy.array_equal(image, self.image))
+        # LUT applied on a frame
+        ramp = numpy.linspace(0.0, 1.0, 5)
+        identity = Lut3D(numpy.stack(numpy.meshgrid(ramp, ramp, ramp,
+                                                    indexing='ij'), axis=-1))
+        apply_to_image(identity, image, tile_size=1000, threads=2)
+        image.flush()
+        del image
+        image = numpy.memmap(path, dtype=numpy.float32, mode='r',
+                             shape=self.image.shape)
+        self.assertTrue(numpy.allclose(image, self.image, atol=1e-6))
+        # read only / non contiguous / non float buffers
+        self.failUnlessRaises(ImageHelperException, convert_image, image,
+                              'ACES', 'Rec709')
+        del image
+        self.failUnlessRaises(ImageHelperException, convert_image,
+                              self.image[:, ::2], 'ACES', 'Rec709')
+        self.failUnlessRaises(ImageHelperException, convert_image,
+                              (self.image * 255).astype(numpy.uint8),
+                              'ACES', 'Rec709')
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
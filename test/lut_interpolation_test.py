@@ -0,0 +1,112 @@
+""" Testing NumPy LUT interpolation
+
+"""
+import unittest
+import os
+import numpy
+from utils.lut_interpolation import (interpolate_3d, interpolate_1d,
+                                     TRILINEAR, TETRAHEDRAL,
+                                     LutInterpolationException)
+from utils.lut_model import read_lut, Lut3D
+
+
+def tetrahedral_reference(table, rgb):
+    """ Triplet by triplet tetrahedral interpolation, as OpenColorIO does
+
+    """
+    cube_size = table.shape[0]
+    position = numpy.clip(numpy.array(rgb) * (cube_size - 1), 0,
+                          cube_size - 1)
+    base = numpy.minimum(numpy.floor(position), cube_size - 2).astype(int)
+    fr, fg, fb = position - base
+    r, g, b = base
+
+    def corner(dr, dg, db):
+        return table[r + dr, g + dg, b + db]
+    if fr > fg:
+        if fg > fb:
+            return ((1 - fr) * corner(0, 0, 0) + (fr - fg) * corner(1, 0, 0)
+                    + (fg - fb) * corner(1, 1, 0) + fb * corner(1, 1, 1))
+        elif fr > fb:
+            return ((1 - fr) * corner(0, 0, 0) + (fr - fb) * corner(1, 0, 0)
+                    + (fb - fg) * corner(1, 0, 1) + fg * corner(1, 1, 1))
+        return ((1 - fb) * corner(0, 0, 0) + (fb - fr) * corner(0, 0, 1)
+                + (fr - fg) * corner(1, 0, 1) + fg * corner(1, 1, 1))
+    if fb > fg:
+        return ((1 - fb) * corner(0, 0, 0) + (fb - fg) * corner(0, 0, 1)
+                + (fg - fr) * corner(0, 1, 1) + fr * corner(1, 1, 1))
+    elif fb > fr:
+        return ((1 - fg) * corner(0, 0, 0) + (fg - fb) * corner(0, 1, 0)
+                + (fb - fr) * corner(0, 1, 1) + fr * corner(1, 1, 1))
+    return ((1 - fg) * corner(0, 0, 0) + (fg - fr) * corner(0, 1, 0)
+            + (fr - fb) * corner(1, 1, 0) + fb * corner(1, 1, 1))
+
+
+class LutInterpolationTest(unittest.TestCase):
+    """ Test 1D / 3D interpolation
+
+    """
+    def setUp(self):
+        self.test_dir = os.path.join(os.path.dirname(__file__), 'test_files')
+        numpy.random.seed(0)
+        self.values = numpy.random.rand(1000, 3)
+        ramp = numpy.linspace(0.0, 1.0, 9)
+        self.identity = numpy.stack(numpy.meshgrid(ramp, ramp, ramp,
+                                                   indexing='ij'), axis=-1)
+
+    def test_affine(self):
+        """ Affine transforms are interpolated exactly
+
+        """
+        matrix = numpy.array([[0.8, 0.1, 0.1], [0.2, 0.7, 0.1],
+                              [0.0, 0.3, 0.7]])
+        table = numpy.dot(self.identity, matrix.T) + 0.05
+        for interpolation in [TRILINEAR, TETRAHEDRAL]:
+            res = interpolate_3d(table, self.values, interpolation)
+            ref = numpy.dot(self.values, matrix.T) + 0.05
+            self.assertTrue(numpy.allclose(res, ref, rtol=0, atol=1e-12))
+            # clamped to domain
+            res = interpolate_3d(table, [[2.0, -1.0, 0.5]], interpolation)
+            ref = numpy.dot([1.0, 0.0, 0.5], matrix.T) + 0.05
+            self.assertTrue(numpy.allclose(res, ref, rtol=0, atol=1e-12))
+        self.failUnlessRaises(LutInterpolationException, interpolate_3d,
+                              table, self.values, 'cubic')
+
+    def test_tetrahedral(self):
+        """ Tetrahedral interpolation matches triplet by triplet algorithm
+
+        """
+        table = numpy.random.rand(9, 9, 9, 3)
+        res = interpolate_3d(table, self.values, TETRAHEDRAL, chunk_size=77)
+        ref = numpy.array([tetrahedral_reference(table, rgb)
+                           for rgb in self.values])
+        self.assertTrue(numpy.allclose(res, ref, rtol=0, atol=1e-12))
+        # chunks don't change result
+        self.assertTrue((res == interpolate_3d(table, self.values,
+                                               chunk_size=None)).all())
+        # lattice points are exact
+        self.assertTrue((interpolate_3d(table, self.identity)
+                         == table).all())
+
+    def test_lut_model(self):
+        """ LUTs are process functions
+
+        """
+        lut = read_lut(os.path.join(self.test_dir, 'saturation.3dl'),
+                       dtype=numpy.float64)
+        ramp = numpy.linspace(0.0, 1.0, lut.cube_size)
+        self.assertTrue(numpy.allclose(lut([ramp[3], ramp[16], ramp[8]]),
+                                       lut.table[3, 16, 8], rtol=0,
+                                       atol=1e-12))
+        # domain
+        lut = Lut3D(self.identity, domain=[0.0, 2.0])
+        self.assertTrue(numpy.allclose(lut(self.values), self.values / 2,
+                                       rtol=0, atol=1e-12))
+        # 1D
+        positions = numpy.column_stack([numpy.linspace(0.0, 1.0, 5)] * 3)
+        res = interpolate_1d(positions ** 2, positions, [0.125, 0.5, 2.0])
+        self.assertTrue(numpy.allclose(res, [0.03125, 0.25, 1.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+""" Testing LUT readers and LUT model
+
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from utils import lut_presets as presets
+from utils.lut_model import (read_lut, Lut1D, Lut3D, LutModelException,
+                             parse_values, samples_match, LatticeFunction,
+                             LUT_CACHE)
+from utils.csp_helper import CSP_HELPER
+from utils.cube_helper import CUBE_HELPER
+from utils.threedl_helper import THREEDL_HELPER
+from utils.spi_helper import SPI_HELPER
+from utils.ascii_helper import ASCII_HELPER
+from utils.clcc_helper import CLCC_HELPER
+from utils.json_helper import JSON_HELPER
+from transforms import saturation, channel_gamma
+
+
+class LutModelTest(unittest.TestCase):
+    """ Test native LUT reading
+
+    """
+    def setUp(self):
+        self.test_dir = os.path.join(os.path.dirname(__file__), 'test_files')
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+
+    def test_read_3d(self):
+        """ Read written 3D LUTs
+
+        """
+        cube_size = 9
+        ramp = numpy.linspace(0.0, 1.0, cube_size)
+        red, green, blue = numpy.meshgrid(ramp, ramp, ramp, indexing='ij')
+        ref = saturation(numpy.column_stack((red.ravel(), green.ravel(),
+                                             blue.ravel())))
+        ref = ref.reshape(cube_size, cube_size, cube_size, 3)
+        for helper, ext, tolerance in [(CUBE_HELPER, '.cube', 1e-6),
+                                       (CSP_HELPER, '.csp', 1e-6),
+                                       (SPI_HELPER, '.spi3d', 1e-6),
+                                       (THREEDL_HELPER, '.3dl', 1 / 4095.0),
+                                       (CLCC_HELPER, '.cc', 1e-6),
+                                       (JSON_HELPER, '.json', 1e-12)]:
+            preset = helper.get_default_preset()
+            preset[presets.TYPE] = '3D'
+            preset[presets.CUBE_SIZE] = cube_size
+            outlutfile = os.path.join(self.tmp_dir, 'saturation' + ext)
+            helper.write_3d_lut(saturation, outlutfile, preset)
+            lut = read_lut(outlutfile, dtype=numpy.float64)
+            self.assertTrue(isinstance(lut, Lut3D))
+            self.assertEqual(lut.cube_size, cube_size)
+            self.assertTrue(numpy.abs(lut.table - ref).max() <= tolerance,
+                            ext)
+            self.assertEqual(read_lut(outlutfile).dtype, numpy.float32)
+        # 3dl ranges
+        self.assertEqual(lut.input_range, [0.0, 1.0])
+        lut = read_lut(os.path.join(self.tmp_dir, 'saturation.3dl'))
+        self.assertEqual(lut.input_range, [0, 1023])
+        self.assertEqual(lut.output_range, [0, 4095])
+
+    def test_read_1d(self):
+        """ Read written 1D / 2D LUTs
+
+        """
+        for helper, ext, tolerance in [(CUBE_HELPER, '.cube', 1e-6),
+                                       (CSP_HELPER, '.csp', 1e-6),
+                                       (SPI_HELPER, '.spi1d', 1e-12),
+                                       (ASCII_HELPER, '.lut', 1 / 1023.0)]:
+            preset = helper.get_default_preset()
+            preset[presets.TYPE] = '2D'
+            preset[presets.OUT_BITDEPTH] = 10
+            outlutfile = os.path.join(self.tmp_dir, 'gamma' + ext)
+            helper.write_2d_lut(channel_gamma, outlutfile, preset)
+            lut = read_lut(outlutfile, dtype=numpy.float64)
+            self.assertTrue(isinstance(lut, Lut1D))
+            ref = channel_gamma(lut.get_positions())
+            if ext == '.spi1d':
+                # spi1d is a 1 component LUT
+                ref = numpy.column_stack([ref[:, 0]] * 3)
+            self.assertTrue(numpy.abs(lut.table - ref).max() <= tolerance,
+                            ext)
+
+    def test_read_ocio_files(self):
+        """ Read LUTs that weren't written by ColorPipe-tools
+
+        """
+        lut = read_lut(os.path.join(self.test_dir, 'identity.3dl'))
+        self.assertEqual(lut.cube_size, 33)
+        self.assertEqual(lut.input_range, [0, 65535])
+        self.assertTrue(numpy.allclose(lut.table[32, 16, 0],
+                                       [1.0, 0.5, 0.0], atol=1e-3))
+        lut = read_lut(os.path.join(self.test_dir, 'saturation.3dl'))
+        self.assertEqual(lut.cube_size, 17)
+        # comment lines in data block
+        commented_lutfile = os.path.join(self.tmp_dir, 'commented.3dl')
+        shutil.copy(os.path.join(self.test_dir, 'saturation.3dl'),
+                    commented_lutfile)
+        with open(commented_lutfile, 'a') as lutfile:
+            lutfile.write("# display\n")
+        self.assertTrue(numpy.array_equal(read_lut(commented_lutfile).table,
+                                          lut.table))
+        lut = read_lut(os.path.join(self.test_dir, 'CineonToLin_1D.csp'))
+        self.assertEqual(lut.size, 1024)
+        self.failUnlessRaises(LutModelException, read_lut,
+                              os.path.join(self.test_dir, 'unknown.vf'))
+        self.failUnlessRaises(LutModelException, parse_values, "0 1 a", 3)
+
+    def test_read_csp_prelut(self):
+        """ Non linear csp pre LUT outputs are lattice coordinates, like in
+        OpenColorIO
+
+        """
+        from utils.ocio_helper import (create_ocio_processor,
+                                       get_process_function)
+        # pre LUT doesn't reach the top of the cube, lattice is an identity
+        prelut_inputs = [0.0, 0.5, 1.0]
+        prelut_outputs = [0.0, 0.125, 0.5]
+        lines = ['CSPLUTV100', '3D', '']
+        for _ in range(3):
+            lines += ['3', ' '.join(str(value) for value in prelut_inputs),
+                      ' '.join(str(value) for value in prelut_outputs)]
+        lines += ['', '2 2 2']
+        for blue in [0, 1]:
+            for green in [0, 1]:
+                for red in [0, 1]:
+                    lines.append('{0} {1} {2}'.format(red, green, blue))
+        lutfile = os.path.join(self.tmp_dir, 'prelut.csp')
+        with open(lutfile, 'w') as csp:
+            csp.write('\n'.join(lines) + '\n')
+        values = numpy.random.rand(100, 3)
+        ref = numpy.interp(values, prelut_inputs, prelut_outputs)
+        lut = read_lut(lutfile, dtype=numpy.float64)
+        self.assertTrue(numpy.allclose(lut(values), ref, rtol=0, atol=1e-9))
+        processor = create_ocio_processor(lutfile)
+        self.assertTrue(numpy.allclose(lut(values),
+                                       get_process_function(processor)(
+                                           values),
+                                       rtol=0, atol=1e-5))
+
+    def test_lattice_function(self):
+        """ Copy LUT samples without resampling
+
+        """
+        lut = Lut3D(numpy.random.rand(5, 5, 5, 3))
+        preset = CUBE_HELPER.get_default_preset()
+        preset[presets.TYPE] = '3D'
+        preset[presets.CUBE_SIZE] = 5
+        self.assertTrue(samples_match(lut, preset))
+        ramp = numpy.linspace(0.0, 1.0, 5)
+        self.assertTrue((LatticeFunction(lut)([ramp[1], ramp[4], ramp[2]])
+                         == lut.table[1, 4, 2]).all())
+        # not a sample position
+        self.failUnlessRaises(LutModelException, LatticeFunction(lut),
+                              [0.1, 0.0, 0.0])
+        # other size or domain
+        preset[presets.CUBE_SIZE] = 9
+        self.assertFalse(samples_match(lut, preset))
+        preset[presets.CUBE_SIZE] = 5
+        preset[presets.IN_RANGE] = [0.0, 2.0]
+        self.assertFalse(samples_match(lut, preset))
+        self.assertTrue(samples_match(Lut3D(lut.table, domain=[0.0, 2.0]),
+                                      preset))
+        # 1D
+        preset = CSP_HELPER.get_default_preset()
+        preset[presets.TYPE] = '1D'
+        preset[presets.OUT_BITDEPTH] = 8
+        lut = Lut1D(numpy.random.rand(256, 3))
+        self.assertTrue(samples_match(lut, preset))
+        values = numpy.column_stack([numpy.linspace(0.0, 1.0, 256)] * 3)
+        self.assertTrue((LatticeFunction(lut)(values) == lut.table).all())
+        preset[presets.SMOOTH] = 16
+        self.assertFalse(samples_match(lut, preset))
+
+    def test_lut_cache(self):
+        """ Unchanged LUTs are read once when cache is enabled
+
+        """
+        lutfile = os.path.join(self.tmp_dir, 'cached.cube')
+        preset = CUBE_HELPER.get_default_preset()
+        preset[presets.TYPE] = '3D'
+        preset[presets.CUBE_SIZE] = 5
+        CUBE_HELPER.write_3d_lut(saturation, lutfile, preset)
+        # disabled by default
+        self.assertFalse(read_lut(lutfile) is read_lut(lutfile))
+        self.assertEqual(len(LUT_CACHE), 0)
+        LUT_CACHE.set_capacity(1)
+        try:
+            lut = read_lut(lutfile)
+            self.assertTrue(read_lut(lutfile) is lut)
+            self.assertFalse(read_lut(lutfile, numpy.float64) is lut)
+            self.assertEqual(LUT_CACHE.get_stats()['size'], 1)
+            # modified file is read again
+            preset[presets.CUBE_SIZE] = 9
+            CUBE_HELPER.write_3d_lut(saturation, lutfile, preset)
+            os.utime(lutfile, (0, 0))
+            self.assertEqual(read_lut(lutfile).cube_size, 9)
+        finally:
+            LUT_CACHE.set_capacity(0)
+            LUT_CACHE.clear()
+        self.assertEqual(len(LUT_CACHE), 0)
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+""" Testing lut_server and lut_client
+
+"""
+import unittest
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from lutLab.lut_server import LutServer, LutServerException, run_tool
+from lutLab.lut_client import run, LutClientException
+from utils.lut_model import read_lut
+from utils.cache_helper import OUTPUT_CACHE_DIR_ENV
+
+
+class LutServerTest(unittest.TestCase):
+    """ Test tools served to local clients
+
+    """
+    def setUp(self):
+        test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'test_files')
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+        self.lut3d = os.path.join(test_dir, 'saturation.3dl')
+        self.socket_path = os.path.join(self.tmp_dir, 'lut_server.sock')
+        self.server = LutServer(self.socket_path, processes=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def test_run_tool(self):
+        """ Run a tool in the current process
+
+        """
+        status, output = run_tool('rgb_to_rgb_matrix',
+                                  ['-in', 'Rec709', '-out', 'XYZ'])
+        self.assertEqual(status, 0)
+        self.assertTrue("Rec709 to XYZ matrix" in output)
+        status, output = run_tool('rgb_to_rgb_matrix', ['-in', 'Rec709'])
+        self.assertEqual(status, 2)
+        self.assertTrue("required" in output)
+        self.assertEqual(run_tool('unknown', [])[0], 2)
+
+    def test_client(self):
+        """ Convert LUTs through the server
+
+        """
+        outlutfile = os.path.join(self.tmp_dir, 'saturation.cube')
+        shutil.copy(self.lut3d, self.tmp_dir)
+        # relative paths are relative to the client directory, server
+        # directory doesn't change
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir)
+        try:
+            for _ in range(2):
+                status, output = run('lut_to_lut',
+                                     ['saturation.3dl', '--out_type', '3D',
+                                      '--out_format', 'cube', '-outfile',
+                                      'saturation.cube'], self.socket_path)
+                self.assertEqual(status, 0, output)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(read_lut(outlutfile).cube_size, 17)
+        status, output = run('curve_to_lut',
+                             ['--colorspace', 'sRGB', '--out_type', '1D',
+                              '--out_format', 'spi',
+                              os.path.join(self.tmp_dir, 'srgb.spi1d')],
+                             self.socket_path)
+        self.assertEqual(status, 0, output)
+        # errors are returned with output
+        status, output = run('lut_to_lut', [self.lut3d, '--out_type', '3D',
+                                            '--out_format', 'cube',
+                                            '-outfile', 'out.3dl'],
+                             self.socket_path)
+        self.assertEqual(status, 1)
+        self.assertTrue("Error" in output)
+        self.assertEqual(run('lut_to_lut', ['-h'], self.socket_path)[0], 0)
+        self.failUnlessRaises(LutClientException, run, 'lut_to_lut', [],
+                              os.path.join(self.tmp_dir, 'missing.sock'))
+
+    def test_client_environment(self):
+        """ Requests are run with the client tool environment, workers
+        environment is restored afterwards
+
+        """
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        previous_cache_dir = os.environ.pop(OUTPUT_CACHE_DIR_ENV, None)
+        try:
+            status, output = run_tool(
+                'curve_to_lut', ['--colorspace', 'sRGB', '--out_type', '1D',
+                                 '--out_format', 'spi', self.tmp_dir],
+                environment={OUTPUT_CACHE_DIR_ENV: cache_dir, 'PATH': ''})
+            self.assertEqual(status, 0, output)
+            self.assertTrue(os.listdir(cache_dir))
+            self.assertFalse(OUTPUT_CACHE_DIR_ENV in os.environ)
+            self.assertTrue(os.environ['PATH'])
+            shutil.rmtree(cache_dir)
+            # workers were started before the variable was set
+            os.environ[OUTPUT_CACHE_DIR_ENV] = cache_dir
+            status, output = run('curve_to_lut',
+                                 ['--colorspace', 'sRGB', '--out_type', '1D',
+                                  '--out_format', 'spi', self.tmp_dir],
+                                 self.socket_path)
+            self.assertEqual(status, 0, output)
+            self.assertTrue(os.listdir(cache_dir))
+        finally:
+            if previous_cache_dir is None:
+                os.environ.pop(OUTPUT_CACHE_DIR_ENV, None)
+            else:
+                os.environ[OUTPUT_CACHE_DIR_ENV] = previous_cache_dir
+
+    def test_socket(self):
+        """ Only the server user can connect, a running server isn't
+        replaced
+
+        """
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode),
+                         0600)
+        self.failUnlessRaises(LutServerException, LutServer,
+                              self.socket_path, 1)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,20 @@ import unittest
 import shutil
 import os
 import tempfile
-from lutLab.lut_to_lut import lut_to_lut
+import json
+import numpy
+from lutLab.lut_to_lut import (lut_to_lut, LutToLutException,
+                               main as lut_to_lut_main)
+from lutLab.batch_lut_to_lut import (batch_lut_to_lut, read_manifest,
+                                     complete_jobs, get_glob_jobs,
+                                     get_output_collisions,
+                                     BatchLutToLutException)
+from lutLab.sync_lut_to_lut import sync_lut_to_lut, SyncLutToLutException
 from utils.lut_utils import LUTException
 from utils.lut_presets import PresetException
+from utils import spi_helper
+from utils.lut_model import read_lut
+from utils.cache_helper import OUTPUT_CACHE, OUTPUT_CACHE_DIR_ENV
 from utils.threedl_helper import ThreeDLHelperException
 from utils.clcc_helper import CLCCHelperException
 from utils.json_helper import JsonHelperException
@@ -120,6 +131,265 @@ class LUTToLUTTest(unittest.TestCase):
                    "3D", "csp", outlutfile)
         lut_to_lut(outlutfile, "2D", "lut", self.tmp_dir)
 
+    def test_prelut_inverse(self):
+        """ Pre / post LUTs are never inverted
+
+        """
+        from PyOpenColorIO.Constants import TRANSFORM_DIR_INVERSE
+        from utils import ocio_helper
+        transforms = []
+        file_transform = ocio_helper.FileTransform
+
+        def record_transform(lutfile, **kwargs):
+            """ Record built OpenColorIO file transforms """
+            transforms.append((lutfile, kwargs.get('direction')))
+            return file_transform(lutfile, **kwargs)
+        ocio_helper.FileTransform = record_transform
+        ocio_helper.PROCESSOR_CACHE.clear()
+        try:
+            outlutfile = os.path.join(self.tmp_dir, "inverse.spi1d")
+            status = lut_to_lut_main([self.lut1d, '--out_type', '1D',
+                                      '--out_format', 'spi', '-outfile',
+                                      outlutfile, '--inverse', '--prelut',
+                                      self.lut3d, '--postlut', self.lut3d,
+                                      '--silent', '--no-cache'])
+        finally:
+            ocio_helper.FileTransform = file_transform
+            ocio_helper.PROCESSOR_CACHE.clear()
+        self.assertEqual(status, 0)
+        # every built chain: pre LUT, inverted input LUT, post LUT
+        self.assertEqual(len(transforms) % 3, 0)
+        self.assertEqual(set((lutfile, direction == TRANSFORM_DIR_INVERSE)
+                             for lutfile, direction in transforms),
+                         set([(self.lut3d, False), (self.lut1d, True)]))
+        self.assertEqual(transforms[1][0], self.lut1d)
+
+    def test_shaper_report(self):
+        """ Shaper accuracy report is only measured on demand
+
+        """
+        from lutLab import lut_to_lut as lut_to_lut_module
+        reports = []
+        accuracy_report = lut_to_lut_module.get_accuracy_report
+
+        def record_report(function, preset):
+            """ Record accuracy reports """
+            reports.append(preset)
+            return ''
+        lut_to_lut_module.get_accuracy_report = record_report
+        try:
+            outlutfile = os.path.join(self.tmp_dir, "report.spi3d")
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2',
+                       verbose=True, use_cache=False)
+            self.assertEqual(reports, [])
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2',
+                       use_cache=False, shaper_report=True)
+            self.assertEqual(len(reports), 1)
+        finally:
+            lut_to_lut_module.get_accuracy_report = accuracy_report
+
+    def test_multi_format(self):
+        """ Test export of several formats at once
+
+        """
+        formats = ['cube', '3dl', 'csp', 'spi']
+        outlutfiles = lut_to_lut(self.lut3d, "3D", formats, self.tmp_dir)
+        self.assertEqual(len(outlutfiles), len(formats))
+        for form, outlutfile in zip(formats, outlutfiles):
+            ref_outlutfile = os.path.join(self.tmp_dir, "ref")
+            os.mkdir(ref_outlutfile)
+            ref_outlutfile = lut_to_lut(self.lut3d, "3D", form, ref_outlutfile)
+            with open(outlutfile) as lut, open(ref_outlutfile) as ref_lut:
+                self.assertEqual(lut.read(), ref_lut.read())
+            shutil.rmtree(os.path.dirname(ref_outlutfile))
+        # several exports need an output directory
+        self.failUnlessRaises(LutToLutException, lut_to_lut, self.lut3d,
+                              "3D", formats, outlutfiles[0])
+
+    def test_lossless_copy(self):
+        """ Test export of a LUT with its own size: samples are copied
+
+        """
+        # 17^3 3dl to 17^3 cube / spi3d / 3dl
+        ref = read_lut(self.lut3d, dtype=numpy.float64)
+        for form, out_range in [('cube', [0.0, 1.0]), ('spi', [0.0, 1.0]),
+                                ('3dl', [0, 1023])]:
+            outlutfile = lut_to_lut(self.lut3d, "3D", form, self.tmp_dir,
+                                    out_cube_size=17, output_range=out_range)
+            lut = read_lut(outlutfile, dtype=numpy.float64)
+            self.assertTrue(numpy.abs(lut.table - ref.table).max() < 1e-6)
+        # int to int is exact
+        self.assertTrue((lut.table * 1023 == ref.table * 1023).all())
+        # 3dl ranges are rescaled
+        lut_to_lut(self.lut3d, "3D", '3dl', outlutfile, out_cube_size=17,
+                   input_range=[0, 4095], output_range=[0, 65535])
+        lut = read_lut(outlutfile, dtype=numpy.float64)
+        self.assertEqual(lut.input_range, [0, 4095])
+        self.assertTrue(numpy.abs(lut.table - ref.table).max() < 1 / 65535.0)
+
+    def test_output_cache(self):
+        """ Exports are reused from the output cache
+
+        """
+        previous_cache_dir = os.environ.get(OUTPUT_CACHE_DIR_ENV)
+        os.environ[OUTPUT_CACHE_DIR_ENV] = os.path.join(self.tmp_dir, 'cache')
+        try:
+            outlutfile = os.path.join(self.tmp_dir, "saturation.spi3d")
+            shaper_file = os.path.join(self.tmp_dir, "saturation_shaper.spi1d")
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2')
+            hits = OUTPUT_CACHE.hits
+            os.remove(outlutfile)
+            os.remove(shaper_file)
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2')
+            # pre-LUT is reused too
+            self.assertTrue(os.path.isfile(shaper_file))
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 1)
+            # outputs are copies: editing one doesn't modify the cache
+            self.assertEqual(os.stat(outlutfile).st_nlink, 1)
+            with open(outlutfile, 'a') as lut:
+                lut.write('# edited\n')
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2')
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 2)
+            with open(outlutfile) as lut:
+                self.assertFalse('# edited' in lut.read())
+            # other settings
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, out_cube_size=9,
+                       shaper='log2')
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 2)
+            self.assertEqual(read_lut(outlutfile).cube_size, 9)
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2')
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 3)
+            # other writer version
+            spi_version = spi_helper.__version__
+            spi_helper.__version__ = 'test'
+            try:
+                lut_to_lut(self.lut3d, "3D", "spi", outlutfile,
+                           shaper='log2')
+            finally:
+                spi_helper.__version__ = spi_version
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 3)
+            # no cache
+            lut_to_lut(self.lut3d, "3D", "spi", outlutfile, shaper='log2',
+                       use_cache=False)
+            self.assertEqual(OUTPUT_CACHE.hits, hits + 3)
+        finally:
+            if previous_cache_dir is None:
+                del os.environ[OUTPUT_CACHE_DIR_ENV]
+            else:
+                os.environ[OUTPUT_CACHE_DIR_ENV] = previous_cache_dir
+
+    def test_batch(self):
+        """ Test batch conversion from a manifest
+
+        """
+        manifest = os.path.join(self.tmp_dir, "manifest.json")
+        jobs = [{'inlutfiles': self.lut1d, 'out_type': '1D'},
+                {'inlutfiles': [self.lut1d, self.lut3d],
+                 'outlutfile': os.path.join(self.tmp_dir, "concat.csp")},
+                # wrong type
+                {'inlutfiles': self.lut3d, 'out_format': '3dl',
+                 'out_type': '2D'},
+                {'inlutfiles': os.path.join(self.tmp_dir, "missing.3dl")}]
+        with open(manifest, 'w') as manifest_file:
+            json.dump(jobs, manifest_file)
+        jobs = complete_jobs(read_manifest(manifest),
+                             {'out_type': '3D', 'out_format': 'csp',
+                              'outlutfile': self.tmp_dir})
+        results = batch_lut_to_lut(jobs, processes=2)
+        self.assertEqual([result['index'] for result in results],
+                         range(len(jobs)))
+        self.assertEqual([result['error'] is None for result in results],
+                         [True, True, False, False])
+        for result in results[:2]:
+            self.assertTrue(os.path.isfile(result['outlutfile']))
+        # CSV manifest
+        manifest = os.path.join(self.tmp_dir, "manifest.csv")
+        with open(manifest, 'w') as manifest_file:
+            manifest_file.write("inlutfiles,out_type,output_range\n")
+            manifest_file.write("{0};{1},3D,0.0 2.0\n".format(self.lut1d,
+                                                              self.lut3d))
+        self.assertEqual(read_manifest(manifest),
+                         [{'inlutfiles': [self.lut1d, self.lut3d],
+                           'out_type': '3D', 'output_range': [0.0, 2.0]}])
+        # same named LUTs of several shots, same output directory
+        for shot in ['shot1', 'shot2']:
+            os.mkdir(os.path.join(self.tmp_dir, shot))
+            shutil.copy(self.lut3d, os.path.join(self.tmp_dir, shot))
+        jobs = complete_jobs(get_glob_jobs([os.path.join(self.tmp_dir, '*',
+                                                         '*.3dl')]),
+                             {'out_type': '3D', 'out_format': 'cube',
+                              'outlutfile': self.tmp_dir})
+        self.assertEqual(len(get_output_collisions(jobs)), 1)
+        self.failUnlessRaises(BatchLutToLutException, batch_lut_to_lut, jobs)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir,
+                                                     'saturation.cube')))
+
+    def test_sync(self):
+        """ Only changed LUTs are converted again
+
+        """
+        source_dir = os.path.join(self.tmp_dir, 'source')
+        output_dir = os.path.join(self.tmp_dir, 'delivery')
+        os.makedirs(os.path.join(source_dir, 'shot'))
+        shutil.copy(self.lut3d, source_dir)
+        shutil.copy(self.lut1d, os.path.join(source_dir, 'shot'))
+        postlut = os.path.join(self.tmp_dir, 'display.3dl')
+        shutil.copy(os.path.join(os.path.dirname(self.lut3d),
+                                 'identity.3dl'), postlut)
+        defaults = {'out_type': '3D', 'out_format': 'cube',
+                    'out_cube_size': 9, 'postlutfiles': [postlut]}
+
+        def sync(**kwargs):
+            """ Return converted source LUTs
+
+            """
+            settings = dict(defaults, **kwargs)
+            results = sync_lut_to_lut(source_dir, output_dir, settings,
+                                      processes=2)
+            self.assertTrue(all(result['error'] is None
+                                for result in results))
+            return sorted(os.path.relpath(result['inlutfiles'][0],
+                                          source_dir)
+                          for result in results)
+        self.assertEqual(sync(), ['saturation.3dl',
+                                  os.path.join('shot', 'CineonToLin_1D.csp')])
+        outlutfile = os.path.join(output_dir, 'shot', 'CineonToLin_1D.cube')
+        self.assertEqual(read_lut(outlutfile).cube_size, 9)
+        self.assertEqual(sync(), [])
+        # touched but same content
+        os.utime(postlut, (0, 0))
+        self.assertEqual(sync(), [])
+        # pre / post LUT changed
+        with open(postlut, 'a') as lutfile:
+            lutfile.write("# display\n")
+        self.assertEqual(len(sync()), 2)
+        # settings changed
+        self.assertEqual(len(sync(out_cube_size=17)), 2)
+        self.assertEqual(read_lut(outlutfile).cube_size, 17)
+        # missing output, removed source
+        os.remove(outlutfile)
+        os.remove(os.path.join(source_dir, 'saturation.3dl'))
+        self.assertEqual(sync(out_cube_size=17),
+                         [os.path.join('shot', 'CineonToLin_1D.csp')])
+        self.assertFalse(os.path.exists(os.path.join(output_dir,
+                                                     'saturation.cube')))
+        # source LUTs converted into the same output
+        cube_lutfile = lut_to_lut(self.lut3d, '3D', 'cube', self.tmp_dir)
+        shot_lutfile = os.path.join(source_dir, 'shot', 'CineonToLin_1D')
+        shutil.copy(cube_lutfile, shot_lutfile + '.cube')
+        self.failUnlessRaises(BatchLutToLutException, sync_lut_to_lut,
+                              source_dir, output_dir, defaults)
+        self.assertTrue(os.path.isfile(outlutfile))
+        # output of removed source LUT is now the one of another source LUT
+        os.remove(shot_lutfile + '.csp')
+        self.assertEqual(sync(), [os.path.join('shot',
+                                               'CineonToLin_1D.cube')])
+        self.assertEqual(read_lut(outlutfile).cube_size, 9)
+        self.assertEqual(sync(), [])
+        self.assertTrue(os.path.isfile(outlutfile))
+        self.failUnlessRaises(SyncLutToLutException, sync_lut_to_lut,
+                              source_dir, os.path.join(source_dir, 'out'))
+
     def tearDown(self):
         # Remove test directory
         shutil.rmtree(self.tmp_dir)
@@ -0,0 +1,119 @@
+""" Testing OpenColorIO helpers
+
+"""
+import unittest
+import os
+import shutil
+import tempfile
+from PyOpenColorIO.Constants import INTERP_LINEAR, INTERP_TETRAHEDRAL
+from utils import ocio_helper
+from utils.ocio_helper import (create_ocio_processor, ProcessorCache,
+                               PROCESSOR_CACHE)
+
+
+class ProcessorCacheTest(unittest.TestCase):
+    """ Test processor cache
+
+    """
+    def setUp(self):
+        test_dir = os.path.join(os.path.dirname(__file__), 'test_files')
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+        self.lut1d = os.path.join(test_dir, 'CineonToLin_1D.csp')
+        self.lut3d = os.path.join(test_dir, 'saturation.3dl')
+        PROCESSOR_CACHE.clear()
+
+    def test_create_processor(self):
+        """ Same LUT chain returns the same processor
+
+        """
+        processor = create_ocio_processor(self.lut3d,
+                                          interpolation=INTERP_TETRAHEDRAL)
+        self.assertTrue(create_ocio_processor(
+            self.lut3d, interpolation=INTERP_TETRAHEDRAL) is processor)
+        # other interpolation or direction is another processor
+        self.assertFalse(create_ocio_processor(
+            self.lut3d, interpolation=INTERP_LINEAR) is processor)
+        self.assertFalse(create_ocio_processor(
+            self.lut3d, interpolation=INTERP_TETRAHEDRAL,
+            inverse=True) is processor)
+        # bypass
+        self.assertFalse(create_ocio_processor(
+            self.lut3d, interpolation=INTERP_TETRAHEDRAL,
+            use_cache=False) is processor)
+        stats = PROCESSOR_CACHE.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['size'], 3)
+        # tetrahedral fallback on a 1D LUT reuses linear processor
+        processor = create_ocio_processor(self.lut1d,
+                                          interpolation=INTERP_LINEAR)
+        self.assertTrue(create_ocio_processor(
+            self.lut1d, interpolation=INTERP_TETRAHEDRAL) is processor)
+
+    def test_file_change(self):
+        """ A modified or invalidated LUT isn't served from cache
+
+        """
+        lutfile = os.path.join(self.tmp_dir, 'cached.3dl')
+        shutil.copy(self.lut3d, lutfile)
+        processor = create_ocio_processor(lutfile)
+        self.assertTrue(create_ocio_processor(lutfile) is processor)
+        self.assertEqual(PROCESSOR_CACHE.invalidate(lutfile), 1)
+        self.assertFalse(create_ocio_processor(lutfile) is processor)
+        # touching the file changes its signature
+        stat = os.stat(lutfile)
+        os.utime(lutfile, (stat.st_atime, stat.st_mtime + 10))
+        key = ProcessorCache.get_key([lutfile], INTERP_LINEAR, False)
+        self.assertTrue(PROCESSOR_CACHE.get(key) is None)
+
+    def test_ocio_cache_clear(self):
+        """ OpenColorIO file cache is cleared when a parsed LUT changed
+
+        """
+        cleared = []
+        clear_all_caches = ocio_helper.ClearAllCaches
+        ocio_helper.ClearAllCaches = lambda: cleared.append(True)
+        try:
+            lutfile = os.path.join(self.tmp_dir, 'changed.3dl')
+            shutil.copy(self.lut3d, lutfile)
+            create_ocio_processor(lutfile)
+            create_ocio_processor(lutfile, use_cache=False)
+            self.assertEqual(cleared, [])
+            stat = os.stat(lutfile)
+            os.utime(lutfile, (stat.st_atime, stat.st_mtime + 10))
+            create_ocio_processor(lutfile)
+            self.assertEqual(cleared, [True])
+            # uncached processor of a changed LUT clears too
+            os.utime(lutfile, (stat.st_atime, stat.st_mtime + 20))
+            create_ocio_processor(lutfile, use_cache=False)
+            self.assertEqual(cleared, [True, True])
+        finally:
+            ocio_helper.ClearAllCaches = clear_all_caches
+
+    def test_capacity(self):
+        """ Least recently used processors are dropped
+
+        """
+        cache = ProcessorCache(capacity=2)
+        for index in range(3):
+            cache.put(index, str(index))
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.get(0) is None)
+        self.assertEqual(cache.get(1), '1')
+        cache.put(3, '3')
+        self.assertEqual(cache.get(1), '1')
+        self.assertTrue(cache.get(2) is None)
+        cache.set_capacity(0)
+        cache.put(4, '4')
+        self.assertEqual(cache.get_stats(), {'size': 0, 'capacity': 0,
+                                             'hits': 2, 'misses': 2})
+
+    def tearDown(self):
+        PROCESSOR_CACHE.clear()
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
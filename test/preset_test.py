@@ -68,6 +68,51 @@ class GeneralTest(unittest.TestCase):
         preset = loaded_presets.values()[0]
         curve_to_lut('sRGB', None, outlutfile=self.tmp_dir, preset=preset)
 
+    def test_preset_index(self):
+        """ Index presets, read preset bodies only when needed
+
+        """
+        preset_dir = os.path.join(self.tmp_dir, 'presets')
+        os.mkdir(preset_dir)
+        for name in ['first', 'second']:
+            presets.write_preset(os.path.join(preset_dir, name + '.json'),
+                                 {presets.TYPE: '1D', presets.TITLE: name})
+        with open(os.path.join(preset_dir, 'invalid.json'), 'w') as invalid:
+            invalid.write('not a preset')
+        previous_env = os.environ.get(presets.PRESET_ENV)
+        os.environ[presets.PRESET_ENV] = preset_dir
+        try:
+            cache_dir = os.path.join(self.tmp_dir, 'cache')
+            index = presets.PresetIndex(cache_dir)
+            self.assertEqual(sorted(index.get_names()), ['first', 'second'])
+            self.assertTrue(os.path.isfile(
+                os.path.join(cache_dir, presets.PRESET_INDEX_FILE)))
+            # next process: names come from on-disk index, no file is read
+            index = presets.PresetIndex(cache_dir)
+            read_files = []
+            read_preset = presets.read_preset
+            presets.read_preset = read_files.append
+            try:
+                self.assertEqual(sorted(index.get_names()),
+                                 ['first', 'second'])
+            finally:
+                presets.read_preset = read_preset
+            self.assertEqual(read_files, [])
+            # modified preset
+            index = presets.PresetIndex(cache_dir)
+            preset_path = os.path.join(preset_dir, 'second.json')
+            presets.write_preset(preset_path, {presets.TYPE: '3D',
+                                               presets.TITLE: 'modified'})
+            self.assertEqual(index.get_preset('second')[presets.TITLE],
+                             'modified')
+            self.failUnlessRaises(presets.PresetException, index.get_preset,
+                                  'invalid')
+        finally:
+            if previous_env is None:
+                del os.environ[presets.PRESET_ENV]
+            else:
+                os.environ[presets.PRESET_ENV] = previous_env
+
     def tearDown(self):
         # Remove test directory
         shutil.rmtree(self.tmp_dir)
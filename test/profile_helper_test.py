@@ -0,0 +1,81 @@
+""" Testing stage timings
+
+"""
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from utils.profile_helper import PROFILER, Profiler
+from lutLab.curve_to_lut import main as curve_to_lut_main
+
+
+class ProfileHelperTest(unittest.TestCase):
+    """ Test profiler stages, counters and trace
+
+    """
+    def setUp(self):
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+
+    def test_profiler(self):
+        """ Nested stages are timed only when profiler is enabled
+
+        """
+        profiler = Profiler()
+        with profiler.stage('disabled', 10):
+            profiler.count('disabled')
+        self.assertEqual(profiler.get_stats()['stages'], {})
+        self.assertEqual(profiler.get_stats()['counters'], {})
+        profiler.enable()
+        for _ in range(2):
+            with profiler.stage('export', 100):
+                with profiler.stage('format', 100):
+                    profiler.count('rows', 100)
+        profiler.disable()
+        stats = profiler.get_stats()
+        self.assertEqual(stats['stages'].keys(), ['export', 'export/format'])
+        self.assertEqual(stats['stages']['export/format']['calls'], 2)
+        self.assertEqual(stats['stages']['export/format']['samples'], 200)
+        self.assertEqual(stats['counters'], {'rows': 200})
+        self.assertTrue("  format" in profiler.format_report())
+        trace_file = os.path.join(self.tmp_dir, 'trace.json')
+        profiler.write_trace(trace_file, tool='test')
+        with open(trace_file) as trace:
+            trace = json.load(trace)
+        self.assertEqual(trace['tool'], 'test')
+        self.assertEqual(len(trace['events']), 4)
+        # enable clears previous timings
+        profiler.enable()
+        self.assertEqual(profiler.get_stats()['stages'], {})
+
+    def test_tool_trace(self):
+        """ --profile-trace writes a per-stage trace of a tool run
+
+        """
+        trace_file = os.path.join(self.tmp_dir, 'trace.json')
+        outlutfile = os.path.join(self.tmp_dir, 'curve.spi1d')
+        status = curve_to_lut_main(['--colorspace', 'sRGB', outlutfile,
+                                    '--out_type', '1D', '--out_format',
+                                    'spi', '-os', '12', '--silent',
+                                    '--no-cache', '--profile-trace',
+                                    trace_file])
+        self.assertEqual(status, 0)
+        self.assertFalse(PROFILER.is_enabled())
+        with open(trace_file) as trace:
+            trace = json.load(trace)
+        self.assertEqual(trace['tool'], 'curve_to_lut')
+        stages = trace['stages']
+        self.assertEqual(stages['total/export']['samples'], 4096)
+        self.assertEqual(stages['total/export/sample.1d']['samples'], 4096)
+        self.assertTrue(stages['total/export/format']['throughput'] > 0)
+        self.assertTrue('total/export/io.write' in stages)
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+""" Testing shaper export
+
+"""
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from utils import lut_presets as presets
+from utils.lut_utils import array_capable
+from utils.lut_model import read_lut
+from utils.csp_helper import CSP_HELPER
+from utils.spi_helper import SPI_HELPER
+from utils.threedl_helper import THREEDL_HELPER
+from utils.cube_helper import CUBE_HELPER
+from utils.abstract_lut_helper import AbstractLUTException
+from utils.bake_helper import get_chain_function
+from utils.shaper_helper import (get_shaper, get_accuracy_report,
+                                 Log2Shaper, ShaperHelperException)
+
+
+@array_capable
+def tone_map(values):
+    """ A scene linear to display transform
+
+    """
+    values = numpy.maximum(values, 0)
+    return numpy.power(values / (1 + values), 1 / 2.2)
+
+
+class ShaperHelperTest(unittest.TestCase):
+    """ Test shaped 3D LUT export
+
+    """
+    def setUp(self):
+        self.tmp_dir = os.path.join(tempfile.gettempdir(), 'testCoPipe')
+        if not os.path.exists(self.tmp_dir):
+            os.mkdir(self.tmp_dir)
+        numpy.random.seed(0)
+        # mostly dark values, like scene linear images
+        self.values = numpy.power(2.0, numpy.random.uniform(-10, 4,
+                                                            (2000, 3)))
+
+    def __get_preset(self, helper, cube_size=17, shaper='log2'):
+        """ Return a scene linear 3D preset
+
+        """
+        preset = helper.get_default_preset()
+        preset[presets.TYPE] = '3D'
+        preset[presets.CUBE_SIZE] = cube_size
+        preset[presets.IN_RANGE] = [0.0, 16.0]
+        preset[presets.SHAPER_CURVE] = shaper
+        return preset
+
+    def test_shapers(self):
+        """ Shaper curves
+
+        """
+        shaper = Log2Shaper([0.0, 16.0])
+        ramp = numpy.linspace(0.0, 1.0, 11)
+        self.assertTrue(numpy.allclose(
+            shaper.encode_gradation(shaper.decode_gradation(ramp)), ramp))
+        self.assertEqual(shaper.decode_gradation([0.0, 1.0]).tolist(),
+                         [0.0, 16.0])
+        preset = self.__get_preset(CSP_HELPER, shaper='AlexaLogCV3')
+        preset[presets.IN_RANGE] = [0.0, 1.0]
+        shaper = get_shaper(preset)
+        self.assertTrue(numpy.allclose(shaper.decode_gradation([0.0, 1.0]),
+                                       [0.0, 1.0]))
+        preset[presets.SHAPER_CURVE] = 'unknown'
+        self.failUnlessRaises(ShaperHelperException, get_shaper, preset)
+
+    def test_export(self):
+        """ Shaped cubes are more accurate than uniform ones
+
+        """
+        ref = tone_map(self.values)
+        for helper, ext in [(CSP_HELPER, '.csp'), (SPI_HELPER, '.spi3d')]:
+            outlutfile = os.path.join(self.tmp_dir, 'shaped' + ext)
+            helper.write_3d_lut(tone_map, outlutfile,
+                                self.__get_preset(helper))
+            if ext == '.spi3d':
+                # pre-LUT is another file
+                lutfiles = [SPI_HELPER.get_shaper_path(outlutfile),
+                            outlutfile]
+            else:
+                lutfiles = [outlutfile]
+            shaped_error = numpy.abs(get_chain_function(lutfiles)(self.values)
+                                     - ref).max()
+            preset = self.__get_preset(helper, shaper=None)
+            helper.write_3d_lut(tone_map, outlutfile, preset)
+            uniform_error = numpy.abs(read_lut(outlutfile)(self.values)
+                                      - ref).max()
+            self.assertTrue(shaped_error * 5 < uniform_error, ext)
+        # 3dl: shaper lut
+        outlutfile = os.path.join(self.tmp_dir, 'shaped.3dl')
+        preset = THREEDL_HELPER.get_default_preset()
+        preset[presets.SHAPER_CURVE] = 'log2'
+        THREEDL_HELPER.write_3d_lut(tone_map, outlutfile, preset)
+        lut = read_lut(outlutfile)
+        self.assertTrue((numpy.diff(lut.shaper.positions[:, 0]) > 0).all())
+        values = numpy.random.rand(1000, 3)
+        self.assertTrue(numpy.abs(lut(values) - tone_map(values)).max()
+                        < 0.05)
+        # formats without pre-LUT
+        self.failUnlessRaises(AbstractLUTException, CUBE_HELPER.write_3d_lut,
+                              tone_map, outlutfile,
+                              self.__get_preset(CUBE_HELPER))
+
+    def test_accuracy_report(self):
+        """ Equivalent accuracy
+
+        """
+        report = get_accuracy_report(tone_map, self.__get_preset(CSP_HELPER))
+        self.assertTrue("Shaped 17^3" in report)
+        self.assertTrue("Uniform 33^3" in report)
+
+    def tearDown(self):
+        # Remove test directory
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
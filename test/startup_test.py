@@ -0,0 +1,94 @@
+""" Testing command line tools startup
+
+"""
+import unittest
+import os
+import subprocess
+import sys
+
+
+# Modules that command line tools must only import when they are used
+HEAVY_MODULES = ['PyOpenColorIO', 'scipy', 'matplotlib']
+
+# Format helpers, imported when their format is exported
+HELPER_MODULES = ['utils.threedl_helper', 'utils.csp_helper',
+                  'utils.cube_helper', 'utils.ascii_helper',
+                  'utils.clcc_helper', 'utils.spi_helper',
+                  'utils.json_helper']
+
+
+def get_imported_modules(module_name, statement=''):
+    """ Import a module in a new interpreter and return imported modules
+
+    Args:
+        module_name (str): module to import
+
+    Kwargs:
+        statement (str): python code run after import
+
+    Returns:
+        .[str]
+
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root,
+                                         os.path.join(root, 'plotThatLut')]
+                                        + sys.path)
+    code = ("import sys\nimport {0}\n{1}\n"
+            "print '\\n'.join(name for name, module in sys.modules.items()"
+            " if module is not None)").format(module_name, statement)
+    output = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                     cwd=root)
+    return output.split()
+
+
+class StartupTest(unittest.TestCase):
+    """ Test command line tools only import what they use
+
+    """
+    def __check_modules(self, module_name, unexpected_modules, statement=''):
+        """ Check a module doesn't import some modules
+
+        """
+        imported_modules = get_imported_modules(module_name, statement)
+        for name in unexpected_modules:
+            self.assertFalse(name in imported_modules,
+                             "{0} imports {1}".format(module_name, name))
+
+    def test_lazy_imports(self):
+        """ Heavy dependencies and format helpers are imported lazily
+
+        """
+        for module_name in ['lutLab.lut_to_lut', 'lutLab.curve_to_lut',
+                            'lutLab.batch_lut_to_lut',
+                            'lutLab.sync_lut_to_lut']:
+            self.__check_modules(module_name,
+                                 HEAVY_MODULES + HELPER_MODULES)
+        for module_name in ['lutLab.rgb_to_rgb_matrix', 'ptlut']:
+            self.__check_modules(module_name, HEAVY_MODULES)
+        # thin client
+        self.__check_modules('lutLab.lut_client',
+                             HEAVY_MODULES + HELPER_MODULES + ['numpy'])
+        # an export imports its format helper only
+        self.__check_modules(
+            'utils.export_tool_helper', HEAVY_MODULES + HELPER_MODULES[1:],
+            "utils.export_tool_helper._get_ext_and_helper('3dl', '3D')")
+
+    def test_lazy_versions(self):
+        """ Modules versions are computed when -V is used only
+
+        """
+        self.__check_modules(
+            'utils.debug_helper', ['utils.json_helper'],
+            "utils.debug_helper.get_lazy_modules_versions(globals(), "
+            "['utils.json_helper'])")
+        versions = get_imported_modules(
+            'utils.debug_helper',
+            "print utils.debug_helper.get_lazy_modules_versions(globals(), "
+            "['utils.json_helper'])()")
+        self.assertTrue('utils.json_helper' in versions)
+
+
+if __name__ == '__main__':
+    unittest.main()
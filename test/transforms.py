@@ -0,0 +1,32 @@
+""" Process functions shared by tests and benchmarks
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+import numpy
+from utils.lut_utils import array_capable
+
+
+@array_capable
+def saturation(values):
+    """ A 3D transform
+
+    """
+    luma = numpy.dot(values, [0.2126, 0.7152, 0.0722])[:, numpy.newaxis]
+    return numpy.clip(luma + 1.2 * (values - luma), 0.0, 1.0)
+
+
+@array_capable
+def gamma(values):
+    """ A 1D transform
+
+    """
+    return numpy.power(numpy.clip(values, 0.0, 1.0), 1 / 2.2)
+
+
+@array_capable
+def channel_gamma(values):
+    """ A 2D transform: one gamma per channel
+
+    """
+    return numpy.power(values, [1 / 2.2, 1 / 2.4, 1 / 2.6])
@@ -3,21 +3,26 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.3"
+__version__ = "0.4"
 from abc import ABCMeta, abstractmethod
 from collections import namedtuple
 from numpy import linspace
-from utils.lut_utils import get_file_shortname
+from utils.lut_utils import (get_file_shortname, is_array_capable,
+                             array_capable)
 from utils import lut_presets as presets
+from utils.serialization_helper import to_percent_format, write_rows
+from utils.lut_model import DEFAULT_DTYPE
+from utils.shaper_helper import get_shaper
+from utils.profile_helper import PROFILER
 from utils.lut_presets import (TYPE, IN_RANGE, OUT_RANGE, OUT_BITDEPTH,
                                CUBE_SIZE, BASIC_ATTRS, RAISE_MODE, FILL_MODE,
                                TYPE_CHOICE, BITDEPTH_MAX_VALUE,
                                BITDEPTH_MIN_VALUE, CUBE_SIZE_MAX_VALUE,
                                CUBE_SIZE_MIN_VALUE, PresetException,
                                MISSING_ATTR_MESSAGE)
-from scipy.interpolate import PchipInterpolator
 import numpy
-import itertools
+import hashlib
+from collections import OrderedDict
 
 # RGB triplet object
 Rgb = namedtuple('Rgb', 'r g b')
@@ -79,13 +84,13 @@ class AbstractLUTHelper(object):
         Args:
             preset (dict): lut generic and sampling informations
 
-            rgb (Rgb): values
+            rgb (Rgb or [float, float, float]): values
 
         Returns:
             .str
 
         """
-        return self._get_pattern_1d(preset).format(rgb.r)
+        return self._get_pattern_1d(preset).format(rgb[0])
 
     def _get_rgb_value_line(self, preset, rgb, in_rgb=None, separator=" "):
         """ Get string pattern for a 2D / 3D LUT
@@ -93,7 +98,7 @@ class AbstractLUTHelper(object):
         Args:
             preset (dict): lut generic and sampling informations
 
-            rgb (Rgb): values
+            rgb (Rgb or [float, float, float]): values
 
         Kwargs:
             in_rgb: input triplets, required by some LUT formats
@@ -105,15 +110,87 @@ class AbstractLUTHelper(object):
             .str
 
         """
-        line = self._get_pattern(preset, separator).format(rgb.r, rgb.g, rgb.b)
+        line = self._get_pattern(preset, separator).format(rgb[0], rgb[1],
+                                                           rgb[2])
         if in_rgb is not None:
-            return "{0}{4}{1}{4}{2}{4}{3}".format(in_rgb.r,
-                                                  in_rgb.g,
-                                                  in_rgb.b,
+            return "{0}{4}{1}{4}{2}{4}{3}".format(in_rgb[0],
+                                                  in_rgb[1],
+                                                  in_rgb[2],
                                                   line,
                                                   separator)
         return line
 
+    def _get_row_format(self, preset, line_function, separator=' '):
+        """ Get %-format of the lines written by a line function.
+        See utils.serialization_helper
+
+        Args:
+            preset (dict): lut generic and sampling informations
+
+            line_function (function): _get_rgb_value_line or
+            _get_r_value_line
+
+        Kwargs:
+            separator (str): string that will separate each triplet values.
+
+        Returns:
+            .str
+
+        """
+        if line_function == self._get_r_value_line:
+            return to_percent_format(self._get_pattern_1d(preset))
+        return to_percent_format(self._get_pattern(preset, separator))
+
+    def _write_1d_2d_values(self, lutfile, preset, data, line_function):
+        """ Write 1D / 2D values in bulk, as line_function would write them
+        line by line
+
+        Args:
+            lutfile (file): output file
+
+            preset (dict): lut generic and sampling informations
+
+            data (Rgb of numpy.array): processed with _get_1d_data
+
+            line_function (function): _get_rgb_value_line or
+            _get_r_value_line
+
+        """
+        if line_function == self._get_r_value_line:
+            rows = data.r
+        else:
+            rows = numpy.column_stack(data)
+        write_rows(lutfile, self._get_row_format(preset, line_function),
+                   rows)
+
+    def _write_3d_values(self, lutfile, preset, data, in_data=None,
+                         separator=' '):
+        """ Write 3D values in bulk, as _get_rgb_value_line would write them
+        line by line
+
+        Args:
+            lutfile (file): output file
+
+            preset (dict): lut generic and sampling informations
+
+            data (numpy.array): (N, 3) values processed with _get_3d_data
+
+        Kwargs:
+            in_data (numpy.array): (N, 3) input lattice indexes, required by
+            some LUT formats
+
+            separator (str): string that will separate each triplet values.
+
+        """
+        row_format = self._get_row_format(preset, self._get_rgb_value_line,
+                                          separator)
+        rows = data
+        if in_data is not None:
+            row_format = "%d{0}%d{0}%d{0}{1}".format(
+                separator.replace('%', '%%'), row_format)
+            rows = numpy.column_stack((in_data, data))
+        write_rows(lutfile, row_format, rows)
+
     def _get_1d_data(self, process_function, preset):
         """ Process 1D/2D data considering LUT params
 
@@ -126,7 +203,7 @@ class AbstractLUTHelper(object):
             preset (dict): lut generic and sampling informations
 
         Returns:
-            .[Rgb]
+            .Rgb of numpy.array (per channel values)
 
         """
         self.check_preset(preset)
@@ -146,66 +223,73 @@ class AbstractLUTHelper(object):
         compute_range = linspace(input_range[0],
                                  input_range[1],
                                  samples_count)
-        data = []
-        for code_value in compute_range:
-            norm_value = code_value
-            if is_int:
-                norm_value = (code_value - input_range[0]) / input_range[1]
-            res = process_function([norm_value, norm_value, norm_value])
-            res = [(x * output_range[1]) + output_range[0] for x in res]
+        if is_int:
+            compute_range = (compute_range - input_range[0]) / input_range[1]
+        # process the whole ramp
+        values = numpy.column_stack((compute_range,
+                                     compute_range,
+                                     compute_range))
+        with PROFILER.stage('sample.1d', samples_count):
+            data = self._process_values(process_function, values)
+            data = data * output_range[1] + output_range[0]
             if is_int:
-                res = [int(x) for x in res]
-            data.append(Rgb(res[0], res[1], res[2]))
+                data = data.astype(int)
+            # one contiguous array per channel
+            data = Rgb(*numpy.ascontiguousarray(data.T))
         if smooth_size:
-            data = self.__smooth_1d_data(data, preset)
+            with PROFILER.stage('smooth', smooth_size):
+                data = self.__smooth_1d_data(data, preset)
         return data
 
     def __smooth_1d_data(self, data, preset):
         """ Smooth data (1D / 2D only)
 
         Args:
-            data ([Rgb]): processed with _get_1d_data
+            data (Rgb of numpy.array): processed with _get_1d_data
 
             preset (dict): lut generic and sampling informations
 
         Returns:
-            .[Rgb]
+            .Rgb of numpy.array
 
         """
         samples_count = pow(2, preset[presets.OUT_BITDEPTH])
         smooth_count = preset['smooth']
-
-        # remap processed values
-        red_values = []
-        green_values = []
-        blue_values = []
-        for rgb in data:
-            red_values.append(rgb.r)
-            green_values.append(rgb.g)
-            blue_values.append(rgb.b)
         # get full range
         old_range = numpy.arange(0, smooth_count)
         new_range = numpy.arange(0, smooth_count - 1,
                                  float(smooth_count - 1) / samples_count)
-        # get a monotonic cubic function from subsampled curve
-        red_cubic_monotonic_func = PchipInterpolator(old_range,
-                                                     red_values)
-        green_cubic_monotonic_func = PchipInterpolator(old_range,
-                                                       green_values)
-        blue_cubic_monotonic_func = PchipInterpolator(old_range,
-                                                      blue_values)
-        # get new values
-        sampled_reds = red_cubic_monotonic_func(new_range)
-        sampled_greens = green_cubic_monotonic_func(new_range)
-        sampled_blues = blue_cubic_monotonic_func(new_range)
-
-        # remap processed values in data
-        data = []
-        for red, green, blue in itertools.izip(sampled_reds,
-                                               sampled_greens,
-                                               sampled_blues):
-            data.append(Rgb(red, green, blue))
-        return data
+        # get a monotonic cubic function from subsampled curve per channel
+        # and get new values
+        from scipy.interpolate import PchipInterpolator
+        return Rgb(*[PchipInterpolator(old_range, values)(new_range)
+                     for values in data])
+
+    @staticmethod
+    def _process_values(process_function, values):
+        """ Process an array of RGB triplets.
+        Array capable functions (see utils.lut_utils.array_capable) are called
+        once with the whole array, other functions are called triplet by
+        triplet.
+
+        Args:
+            process_function (func): could be a processor.applyRGB
+            (PyOpenColorIO.config.Processor) or a function that took a range
+            of values and return the modified values. Ex: colorspace gradation
+            functions
+
+            values (numpy.array): (N, 3) float array of RGB triplets
+
+        Returns:
+            .numpy.array (N, 3)
+
+        """
+        if is_array_capable(process_function):
+            res = process_function(values)
+            return numpy.asarray(res, dtype=float).reshape(values.shape)
+        # scalar only function
+        return numpy.array([process_function(rgb) for rgb in values.tolist()],
+                           dtype=float).reshape(values.shape)
 
     def _get_3d_data(self, process_function, preset,
                      inverse_loops_order=False):
@@ -229,7 +313,107 @@ class AbstractLUTHelper(object):
                     for red in blues:
 
         Returns:
-            .[input Rgb], [output Rgb]
+            .numpy.array (N, 3) input indexes, numpy.array (N, 3) output values
+            Input indexes are (r, g, b) lattice indexes, considering
+            blue as the slowest axis and red as the fastest one.
+
+        """
+        cube_size, compute_range = self._get_3d_sampling(preset)
+        # lattice indexes in loop order: first loop is the slowest
+        indexes = numpy.indices((cube_size, cube_size, cube_size))
+        first, green, last = indexes.reshape(3, -1)
+        in_data = numpy.column_stack((last, green, first))
+        # process the whole lattice, always in the same order so that a
+        # shared process function (see SharedProcessFunction) can reuse it
+        data = self._process_3d_values(process_function, preset,
+                                       compute_range[in_data])
+        if inverse_loops_order:
+            # (blue, green, red) lattice to (red, green, blue) lattice
+            data = data.reshape(cube_size, cube_size, cube_size, 3)
+            data = data.transpose(2, 1, 0, 3).reshape(-1, 3)
+        return in_data, data
+
+    def _iter_3d_data(self, process_function, preset,
+                      inverse_loops_order=False):
+        """ Process 3D data plane by plane, a plane being one iteration of
+        the slowest loop (see _get_3d_data). Memory used is proportional to
+        a plane instead of the whole lattice.
+        Preset is checked at call, not at first iteration.
+
+        Args:
+            process_function (func): could be a processor.applyRGB
+            (PyOpenColorIO.config.Processor) or a function that took a range
+            of values and return the modified values. Ex: colorspace gradation
+            functions
+
+            preset (dict): lut generic and sampling informations
+
+            inverse_loops_order (bool): if true (3dl case), red is the slowest
+            axis, else blue is.
+
+        Returns:
+            .iterator of (numpy.array (cube_size^2, 3) input (r, g, b) lattice
+            indexes, numpy.array (cube_size^2, 3) output values)
+
+        """
+        cube_size, compute_range = self._get_3d_sampling(preset)
+        if isinstance(process_function, SharedProcessFunction):
+            # the whole lattice is shared with other formats
+            return self.__iter_3d_planes(
+                self._get_3d_data(process_function, preset,
+                                  inverse_loops_order), cube_size)
+        return self.__iter_3d_processed_planes(process_function, preset,
+                                               cube_size, compute_range,
+                                               inverse_loops_order)
+
+    @staticmethod
+    def __iter_3d_planes(lattice_data, cube_size):
+        """ Iterate over planes of processed 3D data
+
+        Args:
+            lattice_data ((numpy.array, numpy.array)): see _get_3d_data
+
+            cube_size (int): cube size
+
+        Returns:
+            .iterator of (numpy.array, numpy.array)
+
+        """
+        in_data, data = lattice_data
+        plane_size = cube_size * cube_size
+        for start in range(0, len(data), plane_size):
+            yield (in_data[start:start + plane_size],
+                   data[start:start + plane_size])
+
+    def __iter_3d_processed_planes(self, process_function, preset, cube_size,
+                                   compute_range, inverse_loops_order):
+        """ Process and iterate over planes of 3D data.
+        See _iter_3d_data
+
+        Returns:
+            .iterator of (numpy.array, numpy.array)
+
+        """
+        # plane indexes in loop order: first loop is the slowest
+        green, last = numpy.indices((cube_size, cube_size)).reshape(2, -1)
+        first = numpy.zeros(len(last), dtype=last.dtype)
+        for index in range(cube_size):
+            first.fill(index)
+            if inverse_loops_order:
+                in_data = numpy.column_stack((first, green, last))
+            else:
+                in_data = numpy.column_stack((last, green, first))
+            yield in_data, self._process_3d_values(process_function, preset,
+                                                   compute_range[in_data])
+
+    def _get_3d_sampling(self, preset):
+        """ Check preset and return 3D sampling
+
+        Args:
+            preset (dict): lut generic and sampling informations
+
+        Returns:
+            .int cube size, numpy.array values sampled on each axis
 
         """
         self.check_preset(preset)
@@ -237,47 +421,56 @@ class AbstractLUTHelper(object):
             raise AbstractLUTException(("Preset isn't valid for 3D LUT:"
                                         " {0}").format(preset))
         cube_size = preset[presets.CUBE_SIZE]
+        shaper = get_shaper(preset)
+        if shaper is not None:
+            # lattice is sampled in the shaped domain
+            return cube_size, self._get_shaped_sampling(shaper, preset)
         input_range = preset[presets.IN_RANGE]
-        output_range = preset[presets.OUT_RANGE]
-        is_int = False
-        if (isinstance(output_range[0], int) and
-                isinstance(output_range[1], int)):
-            is_int = True
         compute_range = linspace(input_range[0],
                                  input_range[1],
                                  cube_size)
-        data = []
-        in_data = []
-        b_index = 0
-        for first in compute_range:
-            g_index = 0
-            for green in compute_range:
-                r_index = 0
-                for last in compute_range:
-                    if inverse_loops_order:
-                        blue = last
-                        red = first
-                    else:
-                        blue = first
-                        red = last
-                    norm_red = red
-                    norm_green = green
-                    norm_blue = blue
-                    if is_int:
-                        norm_red = (red - input_range[0]) / input_range[1]
-                        norm_green = (green - input_range[0]) / input_range[1]
-                        norm_blue = (blue - input_range[0]) / input_range[1]
-                    res = process_function([norm_red, norm_green, norm_blue])
-                    res = [(x * output_range[1]) + output_range[0]
-                           for x in res]
-                    if is_int:
-                        res = [int(x) for x in res]
-                    in_data.append(Rgb(r_index, g_index, b_index))
-                    data.append(Rgb(res[0], res[1], res[2]))
-                    r_index += 1
-                g_index += 1
-            b_index += 1
-        return in_data, data
+        if presets.is_int(preset[presets.OUT_RANGE]):
+            compute_range = (compute_range - input_range[0]) / input_range[1]
+        return cube_size, compute_range
+
+    def _get_shaped_sampling(self, shaper, preset):
+        """ Return values sampled on each axis of a 3D LUT with a shaper.
+        Formats supporting pre-LUTs override it.
+
+        Args:
+            shaper (utils.shaper_helper.Log2Shaper or GradationShaper):
+            shaper curve
+
+            preset (dict): lut generic and sampling informations
+
+        Returns:
+            .numpy.array
+
+        """
+        raise AbstractLUTException(("Shaper isn't supported by "
+                                    "{0}").format(self.__class__.__name__))
+
+    def _process_3d_values(self, process_function, preset, values):
+        """ Process lattice values and scale them to output range
+
+        Args:
+            process_function (func): see _get_3d_data
+
+            preset (dict): lut generic and sampling informations
+
+            values (numpy.array): (N, 3) float array of RGB triplets
+
+        Returns:
+            .numpy.array (N, 3)
+
+        """
+        output_range = preset[presets.OUT_RANGE]
+        with PROFILER.stage('sample.3d', len(values)):
+            data = self._process_values(process_function, values)
+            data = data * output_range[1] + output_range[0]
+            if presets.is_int(output_range):
+                data = data.astype(int)
+        return data
 
     @abstractmethod
     def _write_1d_2d_lut(self, process_function, file_path, preset,
@@ -353,6 +546,38 @@ class AbstractLUTHelper(object):
         """
         pass
 
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        """ Read a LUT file
+
+        Args:
+            file_path (str): path to a LUT
+
+        Kwargs:
+            dtype (numpy.dtype): table type
+
+        Returns:
+            .utils.lut_model.Lut1D or Lut3D
+
+        """
+        raise AbstractLUTException(("Reading isn't supported by {0}: "
+                                    "{1}").format(self.__class__.__name__,
+                                                  file_path))
+
+    @staticmethod
+    def _read_text(file_path):
+        """ Return LUT file content
+
+        Args:
+            file_path (str): path to a LUT
+
+        Returns:
+            .str
+
+        """
+        # universal newlines
+        with open(file_path, 'rU') as lutfile:
+            return lutfile.read()
+
     @staticmethod
     @abstractmethod
     def get_default_preset():
@@ -361,6 +586,20 @@ class AbstractLUTHelper(object):
         """
         pass
 
+    def get_output_files(self, file_path, preset):
+        """ Return files written by an export
+
+        Args:
+            file_path (str): path to the exported LUT
+
+            preset (dict): lut generic and sampling informations
+
+        Returns:
+            .[str]
+
+        """
+        return [file_path]
+
     @staticmethod
     def get_export_message(file_path):
         """ Get export message
@@ -489,3 +728,56 @@ class AbstractLUTHelper(object):
         return "{0} {1} {2}".format(get_file_shortname(file_path),
                                     preset[presets.IN_RANGE],
                                     preset[presets.OUT_RANGE])
+
+
+@array_capable
+class SharedProcessFunction(object):
+    """Process function wrapper remembering its last results.
+    Writing the same transform in several formats with one shared function
+    samples it once: every helper asks for the same 1D ramp or 3D lattice as
+    long as sizes and input ranges are the same, only output scaling and
+    ordering differ.
+
+    """
+    def __init__(self, process_function, max_results=4):
+        """ Ctor
+
+        Args:
+            process_function (func): could be a processor.applyRGB
+            (PyOpenColorIO.config.Processor) or a function that took a range
+            of values and return the modified values. Ex: colorspace gradation
+            functions
+
+        Kwargs:
+            max_results (int): max number of remembered results
+
+        """
+        self.process_function = process_function
+        self.max_results = max_results
+        self._results = OrderedDict()
+
+    def __call__(self, values):
+        """Process RGB values
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a (N, 3) array of RGB triplets
+
+        Returns:
+            .[float, float, float] or read only numpy.array (N, 3)
+
+        """
+        if not isinstance(values, numpy.ndarray):
+            return self.process_function(values)
+        values = numpy.ascontiguousarray(values)
+        key = (values.shape, values.dtype.str,
+               hashlib.sha1(values).hexdigest())
+        res = self._results.pop(key, None)
+        if res is None:
+            res = AbstractLUTHelper._process_values(self.process_function,
+                                                    values)
+            res.flags.writeable = False
+            while self._results and len(self._results) >= self.max_results:
+                self._results.popitem(last=False)
+        self._results[key] = res
+        return res
@@ -7,6 +7,11 @@ __version__ = "0.3"
 from utils.abstract_lut_helper import AbstractLUTHelper
 import utils.lut_presets as presets
 from utils.lut_utils import get_bitdepth
+from utils.serialization_helper import (to_percent_format, write_rows,
+                                        atomic_write)
+from utils.lut_model import (DEFAULT_DTYPE, TextCursor, Lut1D, parse_values,
+                             is_number, get_likely_bitdepth)
+import numpy
 
 
 class AsciiHelperException(Exception):
@@ -81,67 +86,63 @@ class AsciiLutHelper(AbstractLUTHelper):
                                                      bitdepth_maxvalue))
         # get data
         data = self._get_1d_data(process_function, preset)
-        lutfile = open(file_path, 'w+')
-        # header
-        header = preset[presets.HEADER_TYPE]
-        if header:
-            if header == presets.SCRATCH_HEADER:
-                # ex: LUT: 1 1024
-                lutfile.write('LUT: ')
+        with atomic_write(file_path) as lutfile:
+            # header
+            header = preset[presets.HEADER_TYPE]
+            if header:
+                if header == presets.SCRATCH_HEADER:
+                    # ex: LUT: 1 1024
+                    lutfile.write('LUT: ')
+                    if preset[presets.TYPE] == '2D':
+                        lutfile.write('3 ')
+                    else:
+                        lutfile.write('1 ')
+                    lutfile.write("{0}\n".format(bitdepth_size))
+                elif header == presets.LUSTRE_HEADER:
+                    # ex: LUT16 from 16
+                    if preset[presets.IS_FLOAT]:
+                        raise AsciiHelperException(("An 1D Lustre LUT must "
+                                                    "have int ranges and "
+                                                    "ascii is_float option "
+                                                    "set to false !"))
+
+                    in_bit_depth = get_bitdepth(preset[presets.IN_RANGE][1])
+                    out_bit_depth = get_bitdepth(preset[presets.OUT_RANGE][1])
+                    lutfile.write("LUT{0} from {1}\n\n".format(in_bit_depth,
+                                                               out_bit_depth))
+                else:
+                    # write custom header
+                    lutfile.write("{0}\n".format(header))
+            # data
+            if preset[presets.LAYOUT] == presets.BLOCK_LAYOUT:
+                # line_function mustn't be used here
+                row_format = to_percent_format(self._get_pattern_1d(preset))
+                write_rows(lutfile, row_format, data.r)
                 if preset[presets.TYPE] == '2D':
-                    lutfile.write('3 ')
+                    write_rows(lutfile, row_format, data.g)
+                    write_rows(lutfile, row_format, data.b)
+            elif preset[presets.LAYOUT] == presets.TRIPLET_LAYOUT:
+                separator = preset[presets.SEPARATOR]
+                row_format = self._get_row_format(preset, line_function,
+                                                  separator)
+                if line_function == self._get_r_value_line:
+                    rows = data.r
                 else:
-                    lutfile.write('1 ')
-                lutfile.write("{0}\n".format(bitdepth_size))
-            elif header == presets.LUSTRE_HEADER:
-                # ex: LUT16 from 16
-                if preset[presets.IS_FLOAT]:
-                    raise AsciiHelperException(("An 1D Lustre LUT must have"
-                                                " int ranges and ascii "
-                                                "is_float option set to "
-                                                "false !"))
-
-                in_bit_depth = get_bitdepth(preset[presets.IN_RANGE][1])
-                out_bit_depth = get_bitdepth(preset[presets.OUT_RANGE][1])
-                lutfile.write("LUT{0} from {1}\n\n".format(in_bit_depth,
-                                                           out_bit_depth))
-            else:
-                # write custom header
-                lutfile.write("{0}\n".format(header))
-        # data
-        if preset[presets.LAYOUT] == presets.BLOCK_LAYOUT:
-            # line_function mustn't be used here
-            for rgb in data:
-                lutfile.write(self._get_pattern_1d(preset).format(rgb.r))
-            if preset[presets.TYPE] == '2D':
-                for rgb in data:
-                    lutfile.write(self._get_pattern_1d(preset).format(rgb.g))
-                for rgb in data:
-                    lutfile.write(self._get_pattern_1d(preset).format(rgb.b))
-        elif preset[presets.LAYOUT] == presets.TRIPLET_LAYOUT:
-            index = 0
-            for rgb in data:
-                line = line_function(preset, rgb,
-                                     separator=preset[presets.SEPARATOR])
+                    rows = numpy.column_stack(data)
+                separator = separator.replace('%', '%%')
                 # add alpha value if necessary
                 if preset[presets.WRITE_ALPHA]:
-                    line = line.strip()
                     if preset[presets.IS_FLOAT]:
                         alpha = '0.0'
                     else:
                         alpha = '0'
-                    line = "{0}{1}{2}\n".format(line,
-                                                preset[presets.SEPARATOR],
-                                                alpha)
-
+                    row_format = "{0}{1}{2}\n".format(row_format.strip(),
+                                                      separator, alpha)
                 # add index value if necessary
                 if preset[presets.WRITE_INDEX]:
-                    line = "{0}{1}{2}".format(index,
-                                              preset[presets.SEPARATOR],
-                                              line)
-                lutfile.write(line)
-                index += 1
-        lutfile.close()
+                    row_format = "%d{0}{1}".format(separator, row_format)
+                    rows = numpy.column_stack((numpy.arange(len(rows)), rows))
+                write_rows(lutfile, row_format, rows)
         return self.get_export_message(file_path)
 
     def write_1d_lut(self, process_function, file_path, preset):
@@ -158,6 +159,56 @@ class AsciiLutHelper(AbstractLUTHelper):
         message = "3D  LUT is not supported in Ascii format"
         raise AsciiHelperException(message)
 
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        cursor = TextCursor(self._read_text(file_path))
+        channels = None
+        # skip header (see _write_1d_2d_lut)
+        line = cursor.peek_line()
+        while line is not None and not is_number(line.split()[0]):
+            tokens = cursor.next_line().split()
+            if tokens[0] == 'LUT:' and len(tokens) == 3:
+                # scratch header. Ex: LUT: 3 1024
+                channels = int(tokens[1])
+            line = cursor.peek_line()
+        if line is None:
+            raise AsciiHelperException("No data found in {0}".format(
+                file_path))
+        columns = len(line.split())
+        block = cursor.remaining()
+        is_float = '.' in block
+        data = parse_values(block, columns)
+        if columns == 1:
+            # block layout
+            data = data[:, 0]
+            if channels is None:
+                # 2D LUT size is 3 * 2^bitdepth
+                channels = 1
+                if (len(data) % 3 == 0
+                        and not len(data) & (len(data) - 1) == 0):
+                    channels = 3
+            if channels == 3:
+                data = data.reshape(3, -1).T
+        else:
+            # triplet layout, with an optional index and alpha
+            if columns == 5 or (columns == 4 and numpy.array_equal(
+                    data[:, 0], numpy.arange(len(data)))):
+                data = data[:, 1:]
+            data = data[:, :3]
+        size = len(data)
+        if is_float:
+            input_range = [0.0, 1.0]
+            output_range = [0.0, 1.0]
+        else:
+            input_range = [0, size - 1]
+            # out bit depth matches LUT size (see _write_1d_2d_lut)
+            max_value = size - 1
+            if data.max() > max_value:
+                max_value = pow(2, get_likely_bitdepth(data.max())) - 1
+            output_range = [0, max_value]
+            data = data / float(max_value)
+        return Lut1D(data, input_range=input_range,
+                     output_range=output_range, dtype=dtype)
+
     @staticmethod
     def _get_range_message(range_name, arange):
         """ Get range warning/error message
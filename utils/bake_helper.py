@@ -0,0 +1,274 @@
+""" Bake a chain of LUTs and matrices, independent of OpenColorIO
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.3"
+import hashlib
+import os
+import numpy
+from utils.lut_utils import array_capable, get_lut_list
+from utils.lut_model import (read_lut, is_readable, Lut1D, Lut3D,
+                             DEFAULT_DTYPE)
+from utils.lut_interpolation import TETRAHEDRAL, TRILINEAR
+from utils.matrix_helper import read_spimtx
+
+
+class BakeHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+MATRIX_EXT = '.spimtx'
+
+
+@array_capable
+class MatrixStage(object):
+    """ Matrix and offset applied to RGB triplets
+
+    """
+    def __init__(self, matrix, offset=None):
+        """ Ctor
+
+        Args:
+            matrix (numpy.array): 3x3 matrix
+
+        Kwargs:
+            offset (numpy.array): (3,) offset added after the matrix
+
+        """
+        self.matrix = numpy.asarray(matrix, dtype=numpy.float64)
+        if offset is None:
+            offset = numpy.zeros(3)
+        self.offset = numpy.asarray(offset, dtype=numpy.float64)
+
+    def combine(self, other):
+        """ Return a matrix stage applying self then other
+
+        Args:
+            other (MatrixStage): next stage
+
+        Returns:
+            .MatrixStage
+
+        """
+        return MatrixStage(numpy.dot(other.matrix, self.matrix),
+                           numpy.dot(other.matrix, self.offset)
+                           + other.offset)
+
+    def __call__(self, values):
+        """ Process RGB values
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a (N, 3) array of RGB triplets
+
+        Returns:
+            .numpy.array (3,) or (N, 3)
+
+        """
+        return numpy.dot(values, self.matrix.T) + self.offset
+
+
+def is_bakeable(file_path):
+    """ Return True if a LUT or matrix can be baked natively
+
+    Args:
+        file_path (str): path to a LUT or a spimtx
+
+    Returns:
+        .bool
+
+    """
+    return (os.path.splitext(file_path)[1].lower() == MATRIX_EXT
+            or is_readable(file_path))
+
+
+def read_stage(file_path, dtype=DEFAULT_DTYPE):
+    """ Read a chain stage
+
+    Args:
+        file_path (str): path to a LUT or a spimtx
+
+    Kwargs:
+        dtype (numpy.dtype): LUT table type
+
+    Returns:
+        .utils.lut_model.Lut1D, Lut3D or MatrixStage
+
+    """
+    if os.path.splitext(file_path)[1].lower() == MATRIX_EXT:
+        return MatrixStage(*read_spimtx(file_path))
+    return read_lut(file_path, dtype)
+
+
+def read_stages(file_paths, dtype=numpy.float64):
+    """ Read chain stages. A file appearing several times in the chain, or
+    several files with the same content, are read once. Consecutive matrices
+    are combined into one.
+
+    Args:
+        file_paths ([str]): paths to LUTs or spimtx, in processing order
+
+    Kwargs:
+        dtype (numpy.dtype): LUT table type
+
+    Returns:
+        .[Lut1D, Lut3D or MatrixStage]
+
+    """
+    read_stages_by_digest = {}
+    stages = []
+    for file_path in file_paths:
+        with open(file_path, 'rb') as stage_file:
+            digest = hashlib.sha1(stage_file.read()).hexdigest()
+        key = (os.path.splitext(file_path)[1].lower(), digest)
+        if key not in read_stages_by_digest:
+            read_stages_by_digest[key] = read_stage(file_path, dtype)
+        stage = read_stages_by_digest[key]
+        if (stages and isinstance(stage, MatrixStage)
+                and isinstance(stages[-1], MatrixStage)):
+            stages[-1] = stages[-1].combine(stage)
+        else:
+            stages.append(stage)
+    return stages
+
+
+@array_capable
+class ChainFunction(object):
+    """ Process function applying chain stages one after the other, on
+    whole arrays of RGB triplets.
+
+    """
+    def __init__(self, stages, interpolation=TETRAHEDRAL):
+        """ Ctor
+
+        Args:
+            stages ([Lut1D, Lut3D or MatrixStage]): see read_stages
+
+        Kwargs:
+            interpolation (str): 3D LUTs interpolation.
+            See utils.lut_interpolation
+
+        """
+        self.stages = stages
+        self.interpolation = interpolation
+
+    def __call__(self, values):
+        """ Process RGB values
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a (N, 3) array of RGB triplets
+
+        Returns:
+            .numpy.array (3,) or (N, 3)
+
+        """
+        values = numpy.asarray(values, dtype=numpy.float64)
+        for stage in self.stages:
+            if isinstance(stage, Lut3D):
+                values = stage(values, self.interpolation)
+            else:
+                values = stage(values)
+        return values
+
+
+def get_ocio_interpolation(stages):
+    """ Return 3D LUTs interpolation of the OpenColorIO processor of a chain,
+    as created by lutLab.lut_to_lut: tetrahedral, unless a 1D LUT of the
+    chain makes OpenColorIO fall back to linear interpolation for the whole
+    chain (see utils.ocio_helper.create_ocio_processor)
+
+    Args:
+        stages ([Lut1D, Lut3D or MatrixStage]): see read_stages
+
+    Returns:
+        .str. See utils.lut_interpolation
+
+    """
+    if any(isinstance(stage, Lut1D) for stage in stages):
+        return TRILINEAR
+    return TETRAHEDRAL
+
+
+def get_chain_function(lutfiles, prelutfile=None, postlutfile=None,
+                       interpolation=TETRAHEDRAL):
+    """ Return a process function of a LUT chain.
+    Same chain as utils.ocio_helper.create_ocio_processor
+
+    Args:
+        lutfiles (str or [str]): path to a LUT or list of LUT paths
+
+    Kwargs:
+        prelutfile (str or [str]): path to a pre LUT or list of pre LUT
+        paths
+
+        postlutfile (str or [str]): path to a post LUT or list of post LUT
+        paths
+
+        interpolation (str): 3D LUTs interpolation.
+        See utils.lut_interpolation. If None, interpolation OpenColorIO
+        would use (see get_ocio_interpolation)
+
+    Returns:
+        .ChainFunction
+
+    """
+    file_paths = (get_lut_list(prelutfile) + get_lut_list(lutfiles)
+                  + get_lut_list(postlutfile))
+    unsupported = [path for path in file_paths if not is_bakeable(path)]
+    if unsupported:
+        raise BakeHelperException(("Can't bake these files natively: "
+                                   "{0}").format(unsupported))
+    stages = read_stages(file_paths)
+    if interpolation is None:
+        interpolation = get_ocio_interpolation(stages)
+    return ChainFunction(stages, interpolation)
+
+
+def bake_chain(lutfiles, cube_size, prelutfile=None, postlutfile=None,
+               interpolation=TETRAHEDRAL, domain=None, dtype=DEFAULT_DTYPE):
+    """ Bake a LUT chain into a single 3D LUT
+
+    Args:
+        lutfiles (str or [str]): path to a LUT or list of LUT paths
+
+        cube_size (int): baked cube size. Ex: 33
+
+    Kwargs:
+        prelutfile (str): path to a pre LUT
+
+        postlutfile (str): path to a post LUT
+
+        interpolation (str): 3D LUTs interpolation.
+        See utils.lut_interpolation
+
+        domain ([float, float] or (2, 3) array): input values of the first
+        and last samples. Default is [0.0, 1.0]
+
+        dtype (numpy.dtype): baked table type
+
+    Returns:
+        .utils.lut_model.Lut3D
+
+    """
+    chain_function = get_chain_function(lutfiles, prelutfile, postlutfile,
+                                        interpolation)
+    if domain is None:
+        domain = [0.0, 1.0]
+    domain = numpy.asarray(domain, dtype=numpy.float64).reshape(2, -1)
+    ramp = numpy.linspace(0.0, 1.0, cube_size)[:, numpy.newaxis]
+    positions = numpy.broadcast_to(domain[0] + ramp * (domain[1] - domain[0]),
+                                   (cube_size, 3))
+    red, green, blue = numpy.meshgrid(positions[:, 0], positions[:, 1],
+                                      positions[:, 2], indexing='ij')
+    values = numpy.column_stack((red.ravel(), green.ravel(), blue.ravel()))
+    table = chain_function(values).reshape(cube_size, cube_size, cube_size,
+                                           3)
+    return Lut3D(table, domain=[positions[0], positions[-1]], dtype=dtype)
@@ -0,0 +1,629 @@
+""" In-memory and on-disk caches of computed numpy arrays and written LUTs
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.4"
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy
+from utils.lut_utils import get_file_signature
+
+
+class CacheHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Directory of the on-disk cache. Disk cache is disabled if it isn't set.
+CACHE_DIR_ENV = 'COLORPIPE_CACHE_DIR'
+CACHE_EXT = '.npy'
+# Directory of the written LUTs cache. Output cache is disabled if it isn't
+# set.
+OUTPUT_CACHE_DIR_ENV = 'COLORPIPE_OUTPUT_CACHE_DIR'
+# Max size of the written LUTs cache, in MB
+OUTPUT_CACHE_SIZE_ENV = 'COLORPIPE_OUTPUT_CACHE_SIZE'
+DEFAULT_OUTPUT_CACHE_SIZE = 1024
+# Prefix of entries being written
+TMP_PREFIX = '.tmp'
+
+
+def get_cache_dir():
+    """ Return on-disk cache directory
+
+    Returns:
+        .str or None if disk cache is disabled
+
+    """
+    return os.environ.get(CACHE_DIR_ENV) or None
+
+
+def get_key_digest(key):
+    """ Return a file name safe digest of a cache key
+
+    Args:
+        key (tuple): hashable key made of str / int / float / tuple
+
+    Returns:
+        .str
+
+    """
+    return hashlib.sha1(repr(key)).hexdigest()
+
+
+class ArrayCache(object):
+    """Thread safe cache of numpy arrays. Arrays are kept in memory and,
+    if a cache directory is set, saved as .npy files so that next processes
+    can load them instead of computing them.
+    Cached arrays are read only.
+
+    """
+    def __init__(self, cache_dir=None):
+        """ Ctor
+
+        Kwargs:
+            cache_dir (str): on-disk cache directory. Default is
+            COLORPIPE_CACHE_DIR environment variable
+
+        """
+        self._cache_dir = cache_dir
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def get_cache_dir(self):
+        """ Return on-disk cache directory
+
+        Returns:
+            .str or None if disk cache is disabled
+
+        """
+        return self._cache_dir or get_cache_dir()
+
+    def _get_path(self, key):
+        """ Return .npy path of a key
+
+        Args:
+            key (tuple): cache key
+
+        Returns:
+            .str or None if disk cache is disabled
+
+        """
+        cache_dir = self.get_cache_dir()
+        if cache_dir is None:
+            return None
+        return os.path.join(cache_dir, get_key_digest(key) + CACHE_EXT)
+
+    def get(self, key, use_disk=True):
+        """ Return cached array
+
+        Args:
+            key (tuple): cache key
+
+        Kwargs:
+            use_disk (bool): look for the array in the on-disk cache
+
+        Returns:
+            .numpy.array or None
+
+        """
+        with self._lock:
+            array = self._arrays.get(key)
+        if array is not None or not use_disk:
+            return array
+        path = self._get_path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            array = numpy.load(path)
+        except (IOError, ValueError):
+            # corrupted file, computed again
+            return None
+        array.flags.writeable = False
+        with self._lock:
+            self._arrays[key] = array
+        return array
+
+    def put(self, key, array, use_disk=True):
+        """ Cache an array
+
+        Args:
+            key (tuple): cache key
+
+            array (numpy.array): array to cache
+
+        Kwargs:
+            use_disk (bool): save the array in the on-disk cache
+
+        Returns:
+            .numpy.array read only cached array
+
+        """
+        array = numpy.array(array)
+        array.flags.writeable = False
+        with self._lock:
+            self._arrays[key] = array
+        path = self._get_path(key)
+        if use_disk and path is not None:
+            self.__save(path, array)
+        return array
+
+    @staticmethod
+    def __save(path, array):
+        """ Save an array, atomically so that concurrent processes never
+        load a partial file
+
+        Args:
+            path (str): .npy path
+
+            array (numpy.array): array to save
+
+        """
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        handle, tmp_path = tempfile.mkstemp(suffix=CACHE_EXT, dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as npy_file:
+                numpy.save(npy_file, array)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def clear(self, use_disk=False):
+        """ Remove cached arrays
+
+        Kwargs:
+            use_disk (bool): also remove on-disk cached arrays
+
+        """
+        with self._lock:
+            self._arrays.clear()
+        cache_dir = self.get_cache_dir()
+        if use_disk and cache_dir is not None and os.path.isdir(cache_dir):
+            for filename in os.listdir(cache_dir):
+                if filename.endswith(CACHE_EXT):
+                    os.remove(os.path.join(cache_dir, filename))
+
+    def __len__(self):
+        return len(self._arrays)
+
+
+ARRAY_CACHE = ArrayCache()
+
+
+# file signature -> content digest
+_FILE_DIGESTS = {}
+_FILE_DIGESTS_LOCK = threading.Lock()
+
+
+class LRUCache(object):
+    """Thread safe in-memory LRU cache of Python objects, with hit / miss
+    counters. Subclasses define how their items are keyed.
+
+    """
+    def __init__(self, capacity):
+        """ Ctor
+
+        Args:
+            capacity (int): max number of cached items. 0 disables the cache
+
+        """
+        self._capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return cached item or None and update hit / miss counters
+
+        Args:
+            key (tuple): item key
+
+        Returns:
+            .object or None
+
+        """
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                self.misses += 1
+                return None
+            # most recently used goes last
+            self._items[key] = item
+            self.hits += 1
+            return item
+
+    def put(self, key, item):
+        """Add an item, least recently used ones are dropped when capacity is
+        exceeded
+
+        Args:
+            key (tuple): item key
+
+            item (object): item to cache
+
+        """
+        with self._lock:
+            self._items.pop(key, None)
+            if self._capacity <= 0:
+                return
+            self._items[key] = item
+            self._trim()
+
+    def _trim(self):
+        """Drop least recently used items over capacity.
+        Lock must be held by caller.
+
+        """
+        while len(self._items) > max(self._capacity, 0):
+            self._items.popitem(last=False)
+
+    def get_capacity(self):
+        """Return max number of cached items
+
+        Returns:
+            .int
+
+        """
+        return self._capacity
+
+    def set_capacity(self, capacity):
+        """Set max number of cached items. 0 disables the cache
+
+        Args:
+            capacity (int): max number of cached items
+
+        """
+        with self._lock:
+            self._capacity = capacity
+            self._trim()
+
+    def discard(self, predicate):
+        """Drop every item whose key matches predicate
+
+        Args:
+            predicate (func): function returning True for keys to drop
+
+        Returns:
+            .int number of dropped items
+
+        """
+        with self._lock:
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                del self._items[key]
+            return len(keys)
+
+    def clear(self):
+        """Drop every item and reset counters
+
+        """
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """Return cache statistics
+
+        Returns:
+            .dict with size, capacity, hits and misses
+
+        """
+        with self._lock:
+            return {'size': len(self._items),
+                    'capacity': self._capacity,
+                    'hits': self.hits,
+                    'misses': self.misses}
+
+    def __len__(self):
+        return len(self._items)
+
+
+def get_file_digest(file_path):
+    """ Return a digest of a file content. Digests are remembered as long as
+    file isn't modified
+
+    Args:
+        file_path (str): path to a file
+
+    Returns:
+        .str
+
+    """
+    signature = get_file_signature(file_path)
+    with _FILE_DIGESTS_LOCK:
+        digest = _FILE_DIGESTS.get(signature)
+    if digest is not None:
+        return digest
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as afile:
+        for chunk in iter(lambda: afile.read(1 << 20), ''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _FILE_DIGESTS_LOCK:
+        _FILE_DIGESTS[signature] = digest
+    return digest
+
+
+def get_output_key(*items):
+    """ Return output cache key of an export
+
+    Args:
+        items: everything output depends on: tool and version, input
+        digests, options, preset... Must be JSON serializable
+
+    Returns:
+        .str
+
+    """
+    return hashlib.sha1(json.dumps(items, sort_keys=True,
+                                   default=repr)).hexdigest()
+
+
+def _copy_file(src, dst, read_only=False):
+    """ Copy src to dst. dst is replaced atomically.
+
+    Args:
+        src (str): source file
+
+        dst (str): destination file
+
+    Kwargs:
+        read_only (bool): make dst read-only
+
+    """
+    handle, tmp_path = tempfile.mkstemp(prefix=TMP_PREFIX,
+                                        dir=os.path.dirname(dst) or '.')
+    os.close(handle)
+    # copy gets default permissions, not mkstemp private ones
+    os.remove(tmp_path)
+    try:
+        shutil.copyfile(src, tmp_path)
+        if read_only:
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(tmp_path, dst)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _remove_entry(entry):
+    """ Remove an output cache entry and its read-only files
+
+    Args:
+        entry (str): entry directory
+
+    """
+    def make_writable(function, path, _):
+        """ Read-only files can't be removed on Windows """
+        os.chmod(path, stat.S_IWRITE)
+        function(path)
+    try:
+        shutil.rmtree(entry, onerror=make_writable)
+    except OSError:
+        # removed by another process meanwhile
+        pass
+
+
+class OutputCache(object):
+    """Content addressed on-disk cache of written LUTs, shared by processes.
+    An entry is a directory named after an output key, holding the files
+    of one export. Least recently used entries are removed when cache
+    exceeds its max size.
+    Files are copied in and out of the cache and stored files are
+    read-only: a cached LUT never shares its content with a user-owned
+    output, that may be modified in place.
+
+    """
+    def __init__(self, cache_dir=None, max_size=None):
+        """ Ctor
+
+        Kwargs:
+            cache_dir (str): cache directory. Default is
+            COLORPIPE_OUTPUT_CACHE_DIR environment variable
+
+            max_size (int): max size in MB. Default is
+            COLORPIPE_OUTPUT_CACHE_SIZE environment variable or 1024
+
+        """
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_dir(self):
+        """ Return cache directory
+
+        Returns:
+            .str or None if cache is disabled
+
+        """
+        return self._cache_dir or os.environ.get(OUTPUT_CACHE_DIR_ENV) or None
+
+    def get_max_size(self):
+        """ Return max cache size
+
+        Returns:
+            .int size in bytes
+
+        """
+        max_size = self._max_size
+        if max_size is None:
+            try:
+                max_size = float(os.environ.get(OUTPUT_CACHE_SIZE_ENV,
+                                                DEFAULT_OUTPUT_CACHE_SIZE))
+            except ValueError:
+                raise CacheHelperException(("{0} must be a size in MB: {1}"
+                                            ).format(
+                                                OUTPUT_CACHE_SIZE_ENV,
+                                                os.environ[
+                                                    OUTPUT_CACHE_SIZE_ENV]))
+        return int(max_size * (1 << 20))
+
+    def is_enabled(self):
+        """ Return True if a cache directory is set
+
+        Returns:
+            .bool
+
+        """
+        return self.get_cache_dir() is not None
+
+    def fetch(self, key, file_paths):
+        """ Write copies of the cached files of an export
+
+        Args:
+            key (str): output key. See get_output_key
+
+            file_paths ([str]): files written by the export
+
+        Returns:
+            .bool True if export was cached
+
+        """
+        cache_dir = self.get_cache_dir()
+        if cache_dir is None:
+            return False
+        entry = os.path.join(cache_dir, key)
+        cached_files = [os.path.join(entry, str(index))
+                        for index in range(len(file_paths))]
+        if not all(os.path.isfile(path) for path in cached_files):
+            self.misses += 1
+            return False
+        try:
+            for cached_file, file_path in zip(cached_files, file_paths):
+                _copy_file(cached_file, file_path)
+            # most recently used
+            os.utime(entry, None)
+        except (IOError, OSError):
+            # entry evicted meanwhile
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, file_paths):
+        """ Add files of an export to the cache and evict least recently
+        used entries
+
+        Args:
+            key (str): output key. See get_output_key
+
+            file_paths ([str]): files written by the export
+
+        """
+        cache_dir = self.get_cache_dir()
+        if cache_dir is None:
+            return
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not os.path.isdir(cache_dir):
+                    raise
+        entry = os.path.join(cache_dir, key)
+        if os.path.isdir(entry):
+            return
+        # entry is complete or missing, never partial
+        tmp_entry = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=cache_dir)
+        try:
+            for index, file_path in enumerate(file_paths):
+                _copy_file(file_path, os.path.join(tmp_entry, str(index)),
+                           read_only=True)
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # stored by another process meanwhile
+            if not os.path.isdir(entry):
+                raise
+        finally:
+            if os.path.isdir(tmp_entry):
+                _remove_entry(tmp_entry)
+        self.evict()
+
+    def _get_entries(self):
+        """ Return cache entries, least recently used first
+
+        Returns:
+            .[(float, int, str)] access time, size and path of entries
+
+        """
+        cache_dir = self.get_cache_dir()
+        if cache_dir is None or not os.path.isdir(cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(cache_dir):
+            entry = os.path.join(cache_dir, name)
+            if name.startswith(TMP_PREFIX) or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, filename))
+                           for filename in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                # evicted by another process
+                pass
+        return sorted(entries)
+
+    def evict(self):
+        """ Remove least recently used entries until cache size is under
+        max size
+
+        """
+        entries = self._get_entries()
+        size = sum(entry[1] for entry in entries)
+        max_size = self.get_max_size()
+        for _, entry_size, entry in entries:
+            if size <= max_size:
+                break
+            _remove_entry(entry)
+            size -= entry_size
+
+    def get_stats(self):
+        """ Return cache statistics
+
+        Returns:
+            .dict with entries, size and max_size in bytes, hits and misses
+            of this process
+
+        """
+        entries = self._get_entries()
+        return {'entries': len(entries),
+                'size': sum(entry[1] for entry in entries),
+                'max_size': self.get_max_size(),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def clear(self):
+        """ Remove every entry
+
+        """
+        for _, _, entry in self._get_entries():
+            _remove_entry(entry)
+
+
+OUTPUT_CACHE = OutputCache()
@@ -7,6 +7,8 @@ __version__ = "0.1"
 import datetime
 from utils.abstract_lut_helper import AbstractLUTHelper
 import utils.lut_presets as presets
+from utils.serialization_helper import atomic_write
+from utils.lut_model import DEFAULT_DTYPE, Lut3D, parse_values
 
 
 class CLCCHelperException(Exception):
@@ -84,17 +86,41 @@ class CLCCHelper(AbstractLUTHelper):
         return "{0:.6f},{1:.6f},{2:.6f}\n"
 
     def write_3d_lut(self, process_function, file_path, preset):
-        data = self._get_3d_data(process_function, preset)[1]
+        planes = self._iter_3d_data(process_function, preset)
         # Test output range
         self._check_output_range(preset)
-        lutfile = open(file_path, 'w+')
-        lutfile.write(self.get_header(preset))
-        # data
-        for rgb in data:
-            lutfile.write(self._get_rgb_value_line(preset, rgb))
-        lutfile.close()
+        with atomic_write(file_path) as lutfile:
+            lutfile.write(self.get_header(preset))
+            # data
+            for _, data in planes:
+                self._write_3d_values(lutfile, preset, data)
         return self.get_export_message(file_path)
 
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        text = self._read_text(file_path)
+        position = text.find('\nData\n')
+        if position == -1:
+            raise CLCCHelperException(("Data block is missing in "
+                                       "{0}").format(file_path))
+        header = text[:position].splitlines()
+        data = parse_values(text[position + len('\nData\n'):], 3,
+                            separator=',')
+        title = None
+        comment = None
+        cube_size = None
+        for index, line in enumerate(header[:-1]):
+            if line == 'Name':
+                title = header[index + 1]
+            elif line == 'Description':
+                comment = header[index + 1]
+            elif line.startswith('Size'):
+                cube_size = int(header[index + 1].split(',')[0])
+        if cube_size is None:
+            raise CLCCHelperException(("Cube size is missing in "
+                                       "{0}").format(file_path))
+        return Lut3D.from_flat(data, cube_size, title=title, comment=comment,
+                               dtype=dtype)
+
     @staticmethod
     def _get_range_message(output_range):
         """ Get range warning/error message
@@ -3,24 +3,35 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.4"
+__version__ = "0.5"
 import math
 import numpy
+from utils.cache_helper import ArrayCache
+
+
+# Colorspace matrices, cached per primaries and white point values, so that
+# colorspaces registered or modified at runtime get their own matrices
+MATRIX_CACHE = ArrayCache()
 
 
 def xy_to_XYZ(xy, Y=1):
     """Convert xyY into XYZ
 
     Args:
-        xy ([float, float]): x, y input values
+        xy ([float, float] or numpy.array): x, y input values, or a (N, 2)
+        array of x, y values
 
     Kwargs:
-        Y (float): Y input value
+        Y (float or numpy.array): Y input value, or a (N,) array
 
     Returns:
-        .[float, float, float]
+        .[float, float, float] or numpy.array (N, 3)
 
     """
+    if isinstance(xy, numpy.ndarray):
+        x, y = xy[..., 0], xy[..., 1]
+        Y = numpy.broadcast_to(numpy.asarray(Y, dtype=float), x.shape)
+        return numpy.stack(((x * Y) / y, Y, ((1 - x - y) * Y) / y), axis=-1)
     x, y = xy
     X = (x * Y) / y
     Z = ((1 - x - y) * Y) / y
@@ -31,12 +42,15 @@ def XYZ_to_xy(XYZ):
     """Convert XYZ to xy
 
     Args:
-        XYZ ([float, float, float]: X, Y, Z input values
+        XYZ ([float, float, float] or numpy.array): X, Y, Z input values, or
+        a (N, 3) array of X, Y, Z values
 
     Returns:
-        .[float, float]
+        .[float, float] or numpy.array (N, 2)
 
     """
+    if isinstance(XYZ, numpy.ndarray):
+        return XYZ[..., :2] / XYZ.sum(axis=-1)[..., numpy.newaxis]
     X, Y, Z = XYZ
     divider = (X + Y + Z)
     x = X / divider
@@ -48,12 +62,17 @@ def xy_to_upvp(xy):
     """Convert xy to u'v'
 
     Args:
-        xy ([float, float]): x, y input values
+        xy ([float, float] or numpy.array): x, y input values, or a (N, 2)
+        array of x, y values
 
     Returns:
-        .[float, float]
+        .[float, float] or numpy.array (N, 2)
 
     """
+    if isinstance(xy, numpy.ndarray):
+        x, y = xy[..., 0], xy[..., 1]
+        divider = (-2 * x + 12 * y + 3)[..., numpy.newaxis]
+        return xy * [4, 9] / divider
     x, y = xy
     up = 4 * x / (-2 * x + 12 * y + 3)
     vp = 9 * y / (-2 * x + 12 * y + 3)
@@ -64,7 +83,8 @@ def xy_to_RGB(xy, colorspace, clamp=False):
     """Convert xy to RGB values
 
     Args:
-        xy ([float, float]): x, y input values
+        xy ([float, float] or numpy.array): x, y input values, or a (N, 2)
+        array of x, y values
 
         colorspace (utils.colorspaces): reference RGB colorspace
 
@@ -72,7 +92,7 @@ def xy_to_RGB(xy, colorspace, clamp=False):
         clamp (bool): clamp resulting values between 0 and 1
 
     Returns:
-        .[float, float, float]
+        .[float, float, float] or numpy.array (N, 3)
 
     """
     XYZ = xy_to_XYZ(xy)
@@ -83,7 +103,8 @@ def XYZ_to_RGB(XYZ, colorspace, clamp=False):
     """Convert XYZ to RGB values
 
     Args:
-        XYZ ([float, float, float]): X, Y, Z input values
+        XYZ ([float, float, float] or numpy.array): X, Y, Z input values, or
+        a (N, 3) array of X, Y, Z values
 
         colorspace (utils.colorspaces): reference RGB colorspace
 
@@ -91,16 +112,17 @@ def XYZ_to_RGB(XYZ, colorspace, clamp=False):
         clamp (bool): clamp resulting values between 0 and 1
 
     Returns:
-        .[float, float, float]
+        .[float, float, float] or numpy.array (N, 3)
 
     """
-    matrix = get_XYZ_to_RGB_matrix(colorspace.get_red_primaries(),
-                                   colorspace.get_green_primaries(),
-                                   colorspace.get_blue_primaries(),
-                                   colorspace.get_white_point()
-                                   )
+    matrix = get_colorspace_obj_matrix(colorspace, inv=True)
     # apply matrix
     RGB = apply_matrix(matrix, XYZ)
+    if isinstance(RGB, numpy.ndarray):
+        RGB = colorspace.encode_gradation(RGB)
+        if clamp:
+            numpy.clip(RGB, 0.0, 1.0, out=RGB)
+        return RGB
     # apply gradation
     RGB = [colorspace.encode_gradation(value) for value in RGB]
     # clamp
@@ -113,23 +135,25 @@ def apply_matrix(matrix, triplet):
     """Apply a matrix on a value triplet
 
     Args:
-        matrix (3x3 numpy.matrix): matrix to apply (ex : RGB to XYZ matrix)
+        matrix (3x3 numpy.array): matrix to apply (ex : RGB to XYZ matrix)
 
-        triplet ([float, float, float]: ex. RGB or XYZ values
+        triplet ([float, float, float] or numpy.array): ex. RGB or XYZ
+        values, or a (N, 3) array of triplets
 
     Returns:
-        .[float, float, float]
+        .[float, float, float] or numpy.array (N, 3)
 
     """
-    values = numpy.matrix(triplet)
-    return numpy.dot(matrix, values.T).T.tolist()[0]
+    if isinstance(triplet, numpy.ndarray):
+        return numpy.dot(triplet, numpy.asarray(matrix).T)
+    return numpy.dot(numpy.asarray(matrix), triplet).tolist()
 
 
 def clamp_value(value, max_value=1.0, min_value=0.0):
     """Clamp a value between max and min
 
     Args:
-        value (float): value to clamp
+        value (float or numpy.array): value to clamp
 
     Kwargs:
         max (float): max value
@@ -137,9 +161,11 @@ def clamp_value(value, max_value=1.0, min_value=0.0):
         min (float): min value
 
     Returns:
-        .float
+        .float or numpy.array
 
     """
+    if isinstance(value, numpy.ndarray):
+        return numpy.clip(value, min_value, max_value)
     return max(min(value, max_value), min_value)
 
 
@@ -162,14 +188,16 @@ def lin_to_gamma(value, gamma):
     """Simple lin to Gamma function
 
     Args:
-        value (float or [float]): input value
+        value (float, [float] or numpy.array): input value
 
         gamma (float): gamma value
 
     Returns:
-        .float
+        .float, [float] or numpy.array
 
     """
+    if isinstance(value, numpy.ndarray):
+        return numpy.power(value, 1 / gamma)
     if not isinstance(value, (list, tuple)):
         return _lin_to_gamma(value, gamma)
     return [_lin_to_gamma(val, gamma) for val in value]
@@ -194,14 +222,16 @@ def gamma_to_lin(value, gamma):
     """Simple gamma to lin function
 
     Args:
-        value (float or [float]): input value
+        value (float, [float] or numpy.array): input value
 
         gamma (float): gamma value
 
     Returns:
-        .float
+        .float, [float] or numpy.array
 
     """
+    if isinstance(value, numpy.ndarray):
+        return numpy.power(value, gamma)
     if not isinstance(value, (list, tuple)):
         return _gamma_to_lin(value, gamma)
     return [_gamma_to_lin(val, gamma) for val in value]
@@ -218,13 +248,13 @@ def get_primaries_matrix(xy_red, xy_green, xy_blue):
         xy_blue (float, float): blue primary coords
 
     Returns:
-        .numpy.matrix (3x3)
+        .numpy.array (3x3)
 
     """
     XYZ_red = xy_to_XYZ(xy_red)
     XYZ_green = xy_to_XYZ(xy_green)
     XYZ_blue = xy_to_XYZ(xy_blue)
-    primaries_matrix = numpy.matrix(
+    primaries_matrix = numpy.array(
         [
             [XYZ_red[0], XYZ_green[0], XYZ_blue[0]],
             [XYZ_red[1], XYZ_green[1], XYZ_blue[1]],
@@ -240,11 +270,11 @@ def get_white_matrix(xy_white):
         xy_white (float, float): white point coords
 
     Returns:
-        .numpy.matrix (3x1)
+        .numpy.array (3x1)
 
     """
     XYZ_white = xy_to_XYZ(xy_white)
-    white_matrix = numpy.matrix(
+    white_matrix = numpy.array(
         [
             [XYZ_white[0]],
             [XYZ_white[1]],
@@ -268,21 +298,14 @@ def get_RGB_to_XYZ_matrix(xy_red, xy_green, xy_blue, xy_white):
         xy_white (float, float): white point coords
 
     Returns:
-        .numpy.matrix (3x3)
+        .numpy.array (3x3)
 
     """
     primaries_matrix = get_primaries_matrix(xy_red, xy_green, xy_blue)
     white_matrix = get_white_matrix(xy_white)
-    s = primaries_matrix ** -1 * white_matrix
-    s_r, s_g, s_b = s.item(0, 0), s.item(1, 0), s.item(2, 0)
-    RGB_to_XYZ = numpy.matrix([
-        [s_r * primaries_matrix.item(0, 0), s_g * primaries_matrix.item(0, 1),
-         s_b * primaries_matrix.item(0, 2)],
-        [s_r * primaries_matrix.item(1, 0), s_g * primaries_matrix.item(1, 1),
-         s_b * primaries_matrix.item(1, 2)],
-        [s_r * primaries_matrix.item(2, 0), s_g * primaries_matrix.item(2, 1),
-         s_b * primaries_matrix.item(2, 2)]])
-    return RGB_to_XYZ
+    s = numpy.dot(numpy.linalg.inv(primaries_matrix), white_matrix)
+    # scale each primary column
+    return primaries_matrix * s.T
 
 
 def get_XYZ_to_RGB_matrix(xy_red, xy_green, xy_blue, xy_white):
@@ -300,24 +323,78 @@ def get_XYZ_to_RGB_matrix(xy_red, xy_green, xy_blue, xy_white):
         xy_white (float, float): white point coords
 
     Returns:
-        .numpy.matrix (3x3)
+        .numpy.array (3x3)
 
     """
-    return get_RGB_to_XYZ_matrix(xy_red, xy_green, xy_blue, xy_white).I
+    return numpy.linalg.inv(get_RGB_to_XYZ_matrix(xy_red, xy_green, xy_blue,
+                                                  xy_white))
 
 
-def get_colorspace_matrix(colorspace, primaries_only=False, inv=False):
-    """Return a colorspace RGB to XYZ matrix.
+def _get_colorspace_key(colorspace_obj, primaries_only):
+    """Return matrix cache key of a colorspace
 
     Args:
-        colorspace (str): input colorspace.
+        colorspace_obj (utils.colorspaces.AbstractColorspace): colorspace
+
+        primaries_only (bool): primaries matrix only
+
+    Returns:
+        .tuple
+
+    """
+    coords = [colorspace_obj.get_red_primaries(),
+              colorspace_obj.get_green_primaries(),
+              colorspace_obj.get_blue_primaries()]
+    if not primaries_only:
+        coords.append(colorspace_obj.get_white_point())
+    return tuple(tuple(float(value) for value in numpy.ravel(coord))
+                 for coord in coords)
+
+
+def get_colorspace_obj_matrix(colorspace_obj, primaries_only=False,
+                              inv=False):
+    """Return a colorspace RGB to XYZ matrix. Matrices are computed once per
+    primaries / white point values.
+
+    Args:
+        colorspace_obj (utils.colorspaces.AbstractColorspace): colorspace
 
     Kwargs:
-        primaries_only (bool): primaries matrix only, doesn't include white point.
+        primaries_only (bool): primaries matrix only, doesn't include white
+        point.
+
         inv (bool): return XYZ to RGB matrix.
 
     Returns:
-        .numpy.matrix (3x3)
+        .numpy.array (3x3) read only
+
+    """
+    key = ('RGB_to_XYZ', _get_colorspace_key(colorspace_obj, primaries_only))
+    if inv:
+        key = ('XYZ_to_RGB', key[1])
+    matrix = MATRIX_CACHE.get(key, use_disk=False)
+    if matrix is not None:
+        return matrix
+    if inv:
+        matrix = numpy.linalg.inv(get_colorspace_obj_matrix(colorspace_obj,
+                                                            primaries_only))
+    elif primaries_only:
+        matrix = get_primaries_matrix(*key[1])
+    else:
+        matrix = get_RGB_to_XYZ_matrix(*key[1])
+    return MATRIX_CACHE.put(key, matrix, use_disk=False)
+
+
+def get_colorspace(colorspace):
+    """Return a registered colorspace, public or private.
+    Registries are read at each call, so that colorspaces registered at
+    runtime are found.
+
+    Args:
+        colorspace (str): colorspace name.
+
+    Returns:
+        .utils.colorspaces.AbstractColorspace
 
     """
     from utils.colorspaces import COLORSPACES
@@ -326,19 +403,25 @@ def get_colorspace_matrix(colorspace, primaries_only=False, inv=False):
 
     if not colorspace_obj:
         raise NotImplementedError("Could not find {0} colorspace".format(colorspace))
+    return colorspace_obj
 
-    if primaries_only:
-        matrix = get_primaries_matrix(colorspace_obj.get_red_primaries(),
-                                      colorspace_obj.get_green_primaries(),
-                                      colorspace_obj.get_blue_primaries())
-    else:
-        matrix = get_RGB_to_XYZ_matrix(colorspace_obj.get_red_primaries(),
-                                       colorspace_obj.get_green_primaries(),
-                                       colorspace_obj.get_blue_primaries(),
-                                       colorspace_obj.get_white_point())
-    if inv:
-        return matrix.I
-    return matrix
+
+def get_colorspace_matrix(colorspace, primaries_only=False, inv=False):
+    """Return a colorspace RGB to XYZ matrix.
+
+    Args:
+        colorspace (str): input colorspace.
+
+    Kwargs:
+        primaries_only (bool): primaries matrix only, doesn't include white point.
+        inv (bool): return XYZ to RGB matrix.
+
+    Returns:
+        .numpy.array (3x3) read only
+
+    """
+    return get_colorspace_obj_matrix(get_colorspace(colorspace),
+                                     primaries_only, inv)
 
 
 def get_RGB_to_RGB_matrix(in_colorspace, out_colorspace, primaries_only=False):
@@ -352,12 +435,22 @@ def get_RGB_to_RGB_matrix(in_colorspace, out_colorspace, primaries_only=False):
         primaries_only (bool): primaries matrix only, doesn't include white point.
 
     Returns:
-        .numpy.matrix (3x3)
+        .numpy.array (3x3) read only
 
     """
+    in_colorspace_obj = get_colorspace(in_colorspace)
+    out_colorspace_obj = get_colorspace(out_colorspace)
+    key = ('RGB_to_RGB',
+           _get_colorspace_key(in_colorspace_obj, primaries_only),
+           _get_colorspace_key(out_colorspace_obj, primaries_only))
+    matrix = MATRIX_CACHE.get(key, use_disk=False)
+    if matrix is not None:
+        return matrix
     # Get colorspace in to XYZ matrix
-    in_matrix = get_colorspace_matrix(in_colorspace, primaries_only)
+    in_matrix = get_colorspace_obj_matrix(in_colorspace_obj, primaries_only)
     # Get XYZ to colorspace out matrix
-    out_matrix = get_colorspace_matrix(out_colorspace, primaries_only, inv=True)
+    out_matrix = get_colorspace_obj_matrix(out_colorspace_obj, primaries_only,
+                                           inv=True)
     # Return scalar product of the 2 matrices
-    return numpy.dot(out_matrix, in_matrix)
+    return MATRIX_CACHE.put(key, numpy.dot(out_matrix, in_matrix),
+                            use_disk=False)
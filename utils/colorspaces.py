@@ -3,11 +3,107 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.3"
+__version__ = "0.5"
 from utils import colors_helper
+from utils.lut_utils import array_capable
+from utils.cache_helper import ARRAY_CACHE
+from utils.color_log_helper import print_warning_message
 from abc import ABCMeta, abstractmethod
 import math
 import collections
+import os
+import numpy
+
+LOG_2 = math.log(2.0)
+
+# Gradation directions
+ENCODE = 'encode'
+DECODE = 'decode'
+
+# Compiled gradations: number of table samples and max error, relative to
+# the output span of the function
+DEFAULT_GRADATION_DENSITY = 4096
+DEFAULT_GRADATION_TOLERANCE = 1e-5
+# Set to 1 to compile gradations of the colorspaces whose compiled mode
+# isn't set (see AbstractColorspace.set_compiled_gradation)
+COMPILED_GRADATION_ENV = 'COLORPIPE_COMPILED_GRADATION'
+
+
+def is_compiled_gradation_enabled():
+    """ Return True if compiled gradation mode is enabled by environment
+
+    Returns:
+        .bool
+
+    """
+    return os.environ.get(COMPILED_GRADATION_ENV, '0') not in ['', '0']
+
+
+class ColorspaceException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+@array_capable
+class CompiledGradation(object):
+    """Gradation function sampled once, then evaluated by linear
+    interpolation in its table. Values outside the table are processed by
+    the analytic function.
+
+    """
+    def __init__(self, positions, table, function):
+        """ Ctor
+
+        Args:
+            positions (numpy.array): increasing input values of the samples
+
+            table (numpy.array): output values of the samples
+
+            function (func): analytic function, applied on numpy arrays
+
+        """
+        self.positions = positions
+        self.table = table
+        self.function = function
+        steps = numpy.diff(positions)
+        # uniform tables are indexed directly instead of being searched
+        self.scale = None
+        if numpy.allclose(steps, steps[0], rtol=1e-9, atol=0):
+            self.scale = (len(positions) - 1) / (positions[-1] - positions[0])
+            self.slopes = numpy.diff(table)
+
+    def __call__(self, values):
+        """ Process values
+
+        Args:
+            values (numpy.array): values to transform. Any shape
+
+        Returns:
+            .numpy.array
+
+        """
+        values = numpy.asarray(values, dtype=float)
+        if self.scale is None:
+            res = numpy.interp(values, self.positions, self.table)
+        else:
+            res = values - self.positions[0]
+            res *= self.scale
+            numpy.clip(res, 0, len(self.table) - 1, out=res)
+            indexes = numpy.minimum(res.astype(numpy.intp),
+                                    len(self.table) - 2)
+            res -= indexes
+            res *= self.slopes[indexes]
+            res += self.table[indexes]
+        outside = (values < self.positions[0]) | (values > self.positions[-1])
+        if outside.any():
+            res = numpy.array(res)
+            res[outside] = self.function(values[outside])
+        return res
 
 
 class AbstractColorspace(object):
@@ -82,30 +178,246 @@ class AbstractColorspace(object):
         """
         pass
 
+    def _encode_gradation_array(self, values):
+        """Gradation encoding function on a numpy array.
+        Default implementation applies _encode_gradation on each value.
+        Colorspaces should override it with a vectorized version.
+
+        Args:
+            values (numpy.array): float values to transform
+
+        Returns:
+            .numpy.array
+
+        """
+        return numpy.vectorize(self._encode_gradation, otypes=[float])(values)
+
+    def _decode_gradation_array(self, values):
+        """Gradation decoding function on a numpy array.
+        Default implementation applies _decode_gradation on each value.
+        Colorspaces should override it with a vectorized version.
+
+        Args:
+            values (numpy.array): float values to transform
+
+        Returns:
+            .numpy.array
+
+        """
+        return numpy.vectorize(self._decode_gradation, otypes=[float])(values)
+
+    @staticmethod
+    def _as_float_array(values):
+        """Return values as a float numpy array
+
+        Args:
+            values (numpy.array): values to convert
+
+        Returns:
+            .numpy.array
+
+        """
+        if values.dtype.kind != 'f':
+            return values.astype(float)
+        return values
+
+    def get_gradation_params(self):
+        """ Return parameters of the gradation functions: every attribute
+        but compiled mode state
+
+        Returns:
+            .tuple of (name, value) sorted by name
+
+        """
+        return tuple(sorted((name, value)
+                            for name, value in vars(self).items()
+                            if not name.startswith('_compiled_')))
+
+    def _get_gradation_key(self, direction, density):
+        """ Return cache key of a compiled gradation
+
+        Args:
+            direction (str): encode or decode
+
+            density (int): number of table samples
+
+        Returns:
+            .tuple
+
+        """
+        return ('gradation', __version__, self.__class__.__name__,
+                self.get_gradation_params(), direction, density)
+
+    def compile_gradation(self, direction, density=DEFAULT_GRADATION_DENSITY,
+                          tolerance=DEFAULT_GRADATION_TOLERANCE,
+                          use_cache=True):
+        """ Sample a gradation function in a table.
+        Decoding is sampled uniformly over encoded values [0, 1], encoding
+        is sampled at the decoded values of the same samples, so that log
+        curves are dense where they are steep.
+        Tables are cached per colorspace, direction and density, in memory
+        and on disk (see utils.cache_helper).
+
+        Args:
+            direction (str): encode or decode
+
+        Kwargs:
+            density (int): number of table samples
+
+            tolerance (float): max error of the table between samples,
+            relative to the output span of the function
+
+            use_cache (bool): if False, always build a new table
+
+        Returns:
+            .CompiledGradation
+
+        """
+        if direction == ENCODE:
+            function = self._encode_gradation_array
+        elif direction == DECODE:
+            function = self._decode_gradation_array
+        else:
+            raise ColorspaceException(("Unknown gradation direction: {0}"
+                                       ).format(direction))
+
+        def analytic_function(values):
+            # both branches of piecewise functions are processed
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                return function(self._as_float_array(values))
+        key = self._get_gradation_key(direction, density)
+        samples = None
+        if use_cache:
+            samples = ARRAY_CACHE.get(key)
+        if samples is not None:
+            return CompiledGradation(samples[0], samples[1], analytic_function)
+        encoded = numpy.linspace(0.0, 1.0, density)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            decoded = self._decode_gradation_array(encoded)
+        if direction == ENCODE:
+            samples = numpy.vstack((decoded, encoded))
+        else:
+            samples = numpy.vstack((encoded, decoded))
+        if not (numpy.diff(samples[0]) > 0).all():
+            raise ColorspaceException(("{0} {1} gradation can't be compiled:"
+                                       " decoding isn't strictly increasing"
+                                       ).format(self.__class__.__name__,
+                                                direction))
+        compiled = CompiledGradation(samples[0], samples[1],
+                                     analytic_function)
+        # error bound, checked between samples
+        middles = (samples[0][:-1] + samples[0][1:]) / 2
+        span = numpy.ptp(samples[1]) or 1.0
+        error = (numpy.abs(compiled(middles) - analytic_function(middles))
+                 .max() / span)
+        if error > tolerance:
+            raise ColorspaceException(("{0} {1} gradation table error "
+                                       "({2:.3g}) exceeds tolerance ({3:.3g})."
+                                       " Increase density"
+                                       ).format(self.__class__.__name__,
+                                                direction, error, tolerance))
+        if use_cache:
+            ARRAY_CACHE.put(key, samples)
+        return compiled
+
+    def set_compiled_gradation(self, enabled=True,
+                               density=DEFAULT_GRADATION_DENSITY,
+                               tolerance=DEFAULT_GRADATION_TOLERANCE):
+        """ Enable / disable compiled gradation mode: numpy arrays are then
+        encoded / decoded by interpolation in tables built at first use
+        (see compile_gradation). A direction whose table exceeds tolerance
+        keeps its analytic function.
+        Until it is set, mode is enabled by COLORPIPE_COMPILED_GRADATION
+        environment variable.
+
+        Kwargs:
+            enabled (bool): enable compiled mode
+
+            density (int): number of table samples
+
+            tolerance (float): max error, relative to output span
+
+        """
+        self._compiled_settings = None
+        if enabled:
+            self._compiled_settings = (density, tolerance)
+        self._compiled_gradations = {}
+
+    def _get_compiled_gradation(self, direction):
+        """ Return compiled gradation used in compiled mode
+
+        Args:
+            direction (str): encode or decode
+
+        Returns:
+            .CompiledGradation or None if compiled mode is disabled or
+            table isn't accurate enough
+
+        """
+        if '_compiled_settings' in vars(self):
+            settings = self._compiled_settings
+        elif is_compiled_gradation_enabled():
+            settings = (DEFAULT_GRADATION_DENSITY, DEFAULT_GRADATION_TOLERANCE)
+        else:
+            settings = None
+        if settings is None:
+            return None
+        compiled_gradations = vars(self).setdefault('_compiled_gradations',
+                                                    {})
+        if direction not in compiled_gradations:
+            try:
+                compiled = self.compile_gradation(direction, *settings)
+            except ColorspaceException as error:
+                print_warning_message(("{0}. Analytic function is used."
+                                       ).format(error))
+                compiled = None
+            compiled_gradations[direction] = compiled
+        return compiled_gradations[direction]
+
+    @array_capable
     def encode_gradation(self, values):
         """Gradation encoding function
 
         Args:
-            values (float): values to transform
+            values (float, [float] or numpy.array): values to transform.
+            Numpy arrays can have any shape.
 
         Returns:
-            .float
+            .float, [float] or numpy.array
 
         """
+        if isinstance(values, numpy.ndarray):
+            compiled = self._get_compiled_gradation(ENCODE)
+            if compiled is not None:
+                return compiled(values)
+            # both branches of piecewise functions are processed
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                return self._encode_gradation_array(
+                    self._as_float_array(values))
         if not isinstance(values, (list, tuple)):
             return self._encode_gradation(values)
         return [self._encode_gradation(value) for value in values]
 
+    @array_capable
     def decode_gradation(self, values):
         """Gradation decoding function
 
         Args:
-            value (float): value to transform
+            values (float, [float] or numpy.array): values to transform.
+            Numpy arrays can have any shape.
 
         Returns:
-            .float
+            .float, [float] or numpy.array
 
         """
+        if isinstance(values, numpy.ndarray):
+            compiled = self._get_compiled_gradation(DECODE)
+            if compiled is not None:
+                return compiled(values)
+            # both branches of piecewise functions are processed
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                return self._decode_gradation_array(
+                    self._as_float_array(values))
         if not isinstance(values, (list, tuple)):
             return self._decode_gradation(values)
         return [self._decode_gradation(value) for value in values]
@@ -139,6 +451,16 @@ class sRGB(AbstractColorspace):
         else:
             return value / 12.92
 
+    def _encode_gradation_array(self, values):
+        return numpy.where(values > 0.0031308,
+                           1.055 * numpy.power(values, 1.0 / 2.4) - 0.055,
+                           12.92 * values)
+
+    def _decode_gradation_array(self, values):
+        return numpy.where(values > 0.04045,
+                           numpy.power((values + 0.055) / 1.055, 2.4),
+                           values / 12.92)
+
 
 class Rec709(sRGB):
     """rec709 colorspace
@@ -163,6 +485,19 @@ class Rec709(sRGB):
             return pow((value + (self._alpha - 1)) * (1 / self._alpha),
                        1 / 0.45)
 
+    def _encode_gradation_array(self, values):
+        return numpy.where(values < self._beta,
+                           values * 4.5,
+                           (numpy.power(values, 0.45) * self._alpha
+                            - (self._alpha - 1)))
+
+    def _decode_gradation_array(self, values):
+        inv_beta = round(self.encode_gradation(self._beta), self._round_depth)
+        return numpy.where(values < inv_beta,
+                           values * 1 / 4.5,
+                           numpy.power((values + (self._alpha - 1))
+                                       * (1 / self._alpha), 1 / 0.45))
+
 
 class Rec2020(Rec709):
     """Rec2020 colorspace (10 and 12 bits)
@@ -227,6 +562,21 @@ class AlexaLogCV3(AbstractColorspace):
             value = (value / 0.9661776 - 0.04378604) * 0.18 - 0.00937677
         return value
 
+    def _encode_gradation_array(self, values):
+        return numpy.where(values > 0.0106232378792,
+                           (0.2471896
+                            * numpy.log10((values + 0.00937677) / 0.18)
+                            + 0.385537),
+                           0.9661776 * ((values + 0.00937677) / 0.18
+                                        + 0.04378604))
+
+    def _decode_gradation_array(self, values):
+        return numpy.where(values > 0.1496582,
+                           (numpy.power(10.0, (values - 0.385537) / 0.2471896)
+                            * 0.18 - 0.00937677),
+                           ((values / 0.9661776 - 0.04378604) * 0.18
+                            - 0.00937677))
+
 
 class WideGamut(AbstractColorspace):
     """WideGamut colorspace
@@ -253,6 +603,12 @@ class WideGamut(AbstractColorspace):
     def _decode_gradation(self, value):
         return colors_helper.gamma_to_lin(value, self._gamma)
 
+    def _encode_gradation_array(self, values):
+        return colors_helper.lin_to_gamma(values, self._gamma)
+
+    def _decode_gradation_array(self, values):
+        return colors_helper.gamma_to_lin(values, self._gamma)
+
 
 class ACES(AbstractColorspace):
     """ACES Colorspace (P0 primaries and linear encoding)
@@ -276,6 +632,12 @@ class ACES(AbstractColorspace):
     def _decode_gradation(self, value):
         return value
 
+    def _encode_gradation_array(self, values):
+        return numpy.array(values)
+
+    def _decode_gradation_array(self, values):
+        return numpy.array(values)
+
 
 class ACEScg(ACES):
     """ACES cg Colorspace (P1 primaries and linear encoding)
@@ -329,6 +691,25 @@ class ACEScc(ACEScg):
         else:
             return math.pow(2.0, value * self.factor - self.offset)
 
+    def _encode_gradation_array(self, values):
+        return numpy.where(
+            values <= 0,
+            self.enc_threshold_cst,
+            numpy.where(values < self.enc_threshold,
+                        ((numpy.log(self.denorm_fake0 + values * 0.5) / LOG_2
+                          + self.offset) / self.factor),
+                        (numpy.log(values) / LOG_2 + self.offset)
+                        / self.factor))
+
+    def _decode_gradation_array(self, values):
+        return numpy.where(
+            values < self.dec_low_threshold,
+            (numpy.power(2.0, values * self.factor - self.offset)
+             - self.denorm_fake0) * 2,
+            numpy.where(values >= self.dec_up_threshold,
+                        self.dec_white_threshold,
+                        numpy.power(2.0, values * self.factor - self.offset)))
+
 
 class ACESlog(ACES):
     """ACES LOG colorspace (deprecated by ACEScc)
@@ -365,6 +746,26 @@ class ACESlog(ACES):
             # 2^((ACESlog - 32768) / 2048)
             return math.pow(2, (value - self.unity) / self.xperstop)
 
+    def _encode_gradation_array(self, values):
+        res = numpy.where(
+            values < 0,
+            0.0,
+            numpy.where(values < self.denorm_trans,
+                        (numpy.log(self.denorm_fake0 + values * 0.5) / LOG_2
+                         * self.xperstop + self.unity),
+                        numpy.log(values) / LOG_2 * self.xperstop + self.unity))
+        if self.is_integer:
+            return numpy.minimum(numpy.floor(res) + 0.5, 65535)
+        else:
+            return res
+
+    def _decode_gradation_array(self, values):
+        return numpy.where(
+            values < self.xperstop,
+            ((numpy.power(2.0, (values - self.unity) / self.xperstop)
+              - self.denorm_fake0) * 2.0),
+            numpy.power(2.0, (values - self.unity) / self.xperstop))
+
 
 class ACESproxy(ACEScg):
     """ACESproxy colorspace
@@ -418,6 +819,28 @@ class ACESproxy(ACEScg):
         return math.pow(2.0, (value - self.mid_cv_offset) / self.steps_per_stop
                         + self.mid_log_offset)
 
+    def float_to_cv_array(self, values):
+        """Vectorized float_to_cv. Rounding is half away from zero, like
+        python round
+        """
+        abs_values = numpy.abs(values)
+        rounded = numpy.floor(abs_values)
+        rounded += (abs_values - rounded) >= 0.5
+        rounded = numpy.copysign(rounded, values)
+        return numpy.maximum(self.cv_min, numpy.minimum(self.cv_max, rounded))
+
+    def _encode_gradation_array(self, values):
+        return numpy.where(values <= self.threshold,
+                           self.cv_min,
+                           self.float_to_cv_array(
+                               (numpy.log(values) / LOG_2
+                                - self.mid_log_offset)
+                               * self.steps_per_stop + self.mid_cv_offset))
+
+    def _decode_gradation_array(self, values):
+        return numpy.power(2.0, (values - self.mid_cv_offset)
+                           / self.steps_per_stop + self.mid_log_offset)
+
 
 class ACESproxy10(ACESproxy):
     """10 bit int implementation of ACESproxy
@@ -460,6 +883,13 @@ class SGamutSLog(AbstractColorspace):
         return (math.pow(10.0, ((value - 0.616596 - 0.03) / 0.432699))
                 - 0.037584)
 
+    def _encode_gradation_array(self, values):
+        return (0.432699 * numpy.log10(values + 0.037584) + 0.616596) + 0.03
+
+    def _decode_gradation_array(self, values):
+        return (numpy.power(10.0, ((values - 0.616596 - 0.03) / 0.432699))
+                - 0.037584)
+
 
 class SGamutSLog2(SGamutSLog):
     """Sony SGamut and SLog2
@@ -491,6 +921,25 @@ class SGamutSLog2(SGamutSLog):
                       - 0.037584) / 155.0)
         return value * 0.9
 
+    def _encode_gradation_array(self, values):
+        values = values / 0.9
+        values = numpy.where(
+            values < self.decode_gradation(self.decode_threshold),
+            values / 0.28258064516129 + self.decode_threshold,
+            (0.432699 * numpy.log10(155.0 * values / 219.0 + 0.037584)
+             + 0.616596 + 0.03))
+        return values * (self.max - self.min) + self.min
+
+    def _decode_gradation_array(self, values):
+        values = (values - self.min) / (self.max - self.min)
+        values = numpy.where(
+            values < self.decode_threshold,
+            (values - self.decode_threshold) * 0.28258064516129,
+            (219.0 *
+             (numpy.power(10.0, (values - 0.616596 - 0.03) / 0.432699)
+              - 0.037584) / 155.0))
+        return values * 0.9
+
 
 class SGamutSLog3(SGamutSLog):
     """Sony SGamut/SGamut3 and SLog3
@@ -513,6 +962,22 @@ class SGamutSLog3(SGamutSLog):
             return ((value * 1023.0 - 95.0) * 0.01125000
                     / (171.2102946929 - 95.0))
 
+    def _encode_gradation_array(self, values):
+        return numpy.where(
+            values >= 0.01125000,
+            ((420.0 + numpy.log10((values + 0.01) / (0.18 + 0.01))
+              * 261.5) / 1023.0),
+            ((values * (171.2102946929 - 95.0) / 0.01125000 + 95.0)
+             / 1023.0))
+
+    def _decode_gradation_array(self, values):
+        return numpy.where(
+            values >= 171.2102946929 / 1023.0,
+            ((numpy.power(10.0, (values * 1023 - 420) / 261.5))
+             * (0.18 + 0.01) - 0.01),
+            ((values * 1023.0 - 95.0) * 0.01125000
+             / (171.2102946929 - 95.0)))
+
 
 class SGamut3CineSLog3(SGamutSLog3):
     """Sony SGamut3Cine and SLog3
@@ -7,6 +7,12 @@ __version__ = "0.3"
 from utils.abstract_lut_helper import AbstractLUTHelper
 from utils import lut_presets as presets
 from utils.color_log_helper import print_warning_message
+from utils.serialization_helper import atomic_write
+from utils.lut_model import (DEFAULT_DTYPE, TextCursor, Lut1D, Lut3D,
+                             parse_values, domain_to_range)
+from utils.shaper_helper import (get_shaper, get_shaper_size, get_prelut,
+                                 get_lattice_positions)
+import numpy
 
 
 class CSPHelperException(Exception):
@@ -58,22 +64,23 @@ class CSPLutHelper(AbstractLUTHelper):
 
             header_function (func): get_1d_csp_header or get_3d_csp_header
 
-            data_function (func): _get_1d_data and _get_3d_data
+            data_function (func): _get_1d_data or _iter_3d_data
 
         """
         # Test output range
         self._check_range(preset)
         # Get data
         data = data_function(process_function, preset)
-        if data_function == self._get_3d_data:
-            # 3D function return both input and output values
-            data = data[1]
-        lutfile = open(file_path, 'w+')
-        lutfile.write(header_function(preset))
-        # data
-        for rgb in data:
-            lutfile.write(line_function(preset, rgb))
-        lutfile.close()
+        with atomic_write(file_path) as lutfile:
+            lutfile.write(header_function(preset))
+            # data
+            if data_function == self._iter_3d_data:
+                # 3D function return planes of input and output values
+                for _, plane_data in data:
+                    self._write_3d_values(lutfile, preset, plane_data)
+            else:
+                # 1D function return per channel values
+                self._write_1d_2d_values(lutfile, preset, data, line_function)
         return self.get_export_message(file_path)
 
     def _write_1d_2d_lut(self, process_function, file_path, preset,
@@ -92,7 +99,70 @@ class CSPLutHelper(AbstractLUTHelper):
         return self.__generic_write_lut(process_function, file_path, preset,
                                         self._get_rgb_value_line,
                                         CSPLutHelper.get_3d_csp_header,
-                                        self._get_3d_data)
+                                        self._iter_3d_data)
+
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        cursor = TextCursor(self._read_text(file_path), comment=None)
+        if cursor.next_line() != 'CSPLUTV100':
+            raise CSPHelperException(("Not a CSP LUT (CSPLUTV100 header is "
+                                      "missing): {0}").format(file_path))
+        mode = cursor.next_line()
+        if mode not in ['1D', '3D']:
+            raise CSPHelperException(("Unexpected CSP type: {0} in "
+                                      "{1}").format(mode, file_path))
+        title = None
+        if cursor.peek_line() == 'BEGIN METADATA':
+            metadata = []
+            line = cursor.next_line()
+            while line != 'END METADATA':
+                line = cursor.next_line()
+                metadata.append(line)
+            title = " ".join(metadata[:-1]) or None
+        # pre LUTs
+        prelut_inputs = []
+        prelut_outputs = []
+        for _ in range(3):
+            count = int(cursor.next_line())
+            inputs = [float(value) for value in cursor.next_line().split()]
+            outputs = [float(value) for value in cursor.next_line().split()]
+            if len(inputs) != count or len(outputs) != count:
+                raise CSPHelperException(("Invalid pre LUT in "
+                                          "{0}").format(file_path))
+            prelut_inputs.append(inputs)
+            prelut_outputs.append(outputs)
+        domain = None
+        shaper = None
+        if all(outputs == [0.0, 1.0] for outputs in prelut_outputs):
+            # linear pre LUT: just a domain
+            domain = numpy.array(prelut_inputs).T
+        elif len(set(len(inputs) for inputs in prelut_inputs)) == 1:
+            shaper = Lut1D(numpy.array(prelut_outputs).T,
+                           positions=numpy.array(prelut_inputs).T,
+                           dtype=dtype)
+        else:
+            raise CSPHelperException(("Pre LUTs of different sizes aren't "
+                                      "supported: {0}").format(file_path))
+        input_range = None
+        if domain is not None:
+            input_range = domain_to_range(domain)
+        # data
+        count = [int(value) for value in cursor.next_line().split()]
+        data = parse_values(cursor.remaining(), 3)
+        if mode == '3D':
+            # like OpenColorIO, non linear pre LUT outputs are lattice
+            # coordinates in [0, 1]
+            return Lut3D.from_flat(data, count[0], domain=domain,
+                                   shaper=shaper, input_range=input_range,
+                                   title=title, dtype=dtype)
+        if shaper is not None:
+            raise CSPHelperException(("Non linear pre LUT of a 1D CSP isn't "
+                                      "supported: {0}").format(file_path))
+        if len(data) != count[0]:
+            raise CSPHelperException(("Expected {0} values, found {1} in "
+                                      "{2}").format(count[0], len(data),
+                                                    file_path))
+        return Lut1D(data, domain=domain, input_range=input_range,
+                     title=title, dtype=dtype)
 
     @staticmethod
     def __get_csp_header(preset, mode, count_header):
@@ -112,7 +182,7 @@ class CSPLutHelper(AbstractLUTHelper):
         """
         input_range = preset[presets.IN_RANGE]
         output_range = preset[presets.OUT_RANGE]
-        # TODO real shaper LUT management
+        # linear pre-LUT. See presets.SHAPER_CURVE for a real shaper
         default_header = (
             "CSPLUTV100\n{4}\n\n"
             "2\n{0} {1}\n{2} {3}\n\n"
@@ -123,6 +193,31 @@ class CSPLutHelper(AbstractLUTHelper):
         )
         return "{0}{1}\n".format(default_header, count_header)
 
+    @staticmethod
+    def __get_csp_shaper_header(preset, shaper, count_header):
+        """Return CSP 3D header with a shaper pre-LUT
+
+        Args:
+            preset (dict): lut generic and sampling informations
+
+            shaper (utils.shaper_helper.Log2Shaper or GradationShaper):
+            shaper curve
+
+            count_header (str): axes segment count. Ex: "33 33 33"
+
+        Returns:
+            .str
+
+        """
+        positions, shaped = get_prelut(shaper, preset[presets.CUBE_SIZE],
+                                       get_shaper_size(preset))
+        prelut = "{0}\n{1}\n{2}\n\n".format(
+            len(positions),
+            " ".join("{0:.10g}".format(value) for value in positions),
+            " ".join("{0:.10g}".format(value) for value in shaped))
+        return "CSPLUTV100\n3D\n\n{0}{0}{0}{1}\n".format(prelut,
+                                                         count_header)
+
     @staticmethod
     def get_1d_csp_header(preset):
         """Return CSP 1D pre-LUT header
@@ -149,8 +244,16 @@ class CSPLutHelper(AbstractLUTHelper):
 
         """
         header = "{0} {0} {0}".format(preset[presets.CUBE_SIZE])
+        shaper = get_shaper(preset)
+        if shaper is not None:
+            return CSPLutHelper.__get_csp_shaper_header(preset, shaper,
+                                                        header)
         return CSPLutHelper.__get_csp_header(preset, '3D', header)
 
+    def _get_shaped_sampling(self, shaper, preset):
+        # lattice samples are pre-LUT samples
+        return get_lattice_positions(shaper, preset[presets.CUBE_SIZE])
+
     @staticmethod
     def _get_range_message(range_name, arange):
         """ Get range warning/error message
@@ -7,6 +7,9 @@ __version__ = "0.3"
 from utils.abstract_lut_helper import AbstractLUTHelper
 from utils.color_log_helper import print_warning_message
 from utils import lut_presets as presets
+from utils.serialization_helper import atomic_write
+from utils.lut_model import (DEFAULT_DTYPE, TextCursor, Lut1D, Lut3D,
+                             parse_values, is_number, domain_to_range)
 
 
 class CubeHelperException(Exception):
@@ -48,7 +51,7 @@ class CubeLutHelper(AbstractLUTHelper):
         # Get data
         data = self._get_1d_data(process_function, preset)
         title = preset['title']
-        with open(file_path, 'w+') as lutfile:
+        with atomic_write(file_path) as lutfile:
             # TODO add metadata
             # skip comment because not supported by every soft
             # title
@@ -68,10 +71,9 @@ class CubeLutHelper(AbstractLUTHelper):
                 lutfile.write("\n")
 
             # lut size
-            lutfile.write("{0} {1}\n\n".format(CUBE_1D, len(data)))
+            lutfile.write("{0} {1}\n\n".format(CUBE_1D, len(data.r)))
             # data
-            for rgb in data:
-                lutfile.write(line_function(preset, rgb))
+            self._write_1d_2d_values(lutfile, preset, data, line_function)
         return self.get_export_message(file_path)
 
     def write_1d_lut(self, process_function, file_path, preset):
@@ -80,12 +82,12 @@ class CubeLutHelper(AbstractLUTHelper):
         return self.write_2d_lut(process_function, file_path, preset)
 
     def write_3d_lut(self, process_function, file_path, preset):
-        data = self._get_3d_data(process_function, preset)[1]
+        # Test output range
+        self._check_output_range(preset)
+        planes = self._iter_3d_data(process_function, preset)
         title = preset['title']
         cube_size = preset['cube_size']
-        with open(file_path, 'w+') as lutfile:
-            # Test output range
-            self._check_output_range(preset)
+        with atomic_write(file_path) as lutfile:
             # skip comment because not supported by every soft
             # title
             if title is None:
@@ -94,10 +96,50 @@ class CubeLutHelper(AbstractLUTHelper):
             # lut size
             lutfile.write("{0} {1}\n\n".format(CUBE_3D, cube_size))
             # data
-            for rgb in data:
-                lutfile.write(self._get_rgb_value_line(preset, rgb))
+            for _, data in planes:
+                self._write_3d_values(lutfile, preset, data)
         return self.get_export_message(file_path)
 
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        cursor = TextCursor(self._read_text(file_path))
+        title = None
+        size = None
+        is_3d = False
+        domain = [[0.0, 0.0, 0.0], [1.0, 1.0, 1.0]]
+        # header
+        line = cursor.peek_line()
+        while line is not None and not is_number(line.split()[0]):
+            tokens = cursor.next_line().split()
+            keyword = tokens[0]
+            if keyword == 'TITLE':
+                title = line[len(keyword):].strip().strip('"')
+            elif keyword in [CUBE_1D, CUBE_3D]:
+                size = int(tokens[1])
+                is_3d = keyword == CUBE_3D
+            elif keyword == 'DOMAIN_MIN':
+                domain[0] = [float(value) for value in tokens[1:4]]
+            elif keyword == 'DOMAIN_MAX':
+                domain[1] = [float(value) for value in tokens[1:4]]
+            elif keyword in ['LUT_1D_INPUT_RANGE', 'LUT_3D_INPUT_RANGE']:
+                domain = [float(value) for value in tokens[1:3]]
+            line = cursor.peek_line()
+        if size is None:
+            raise CubeHelperException(("{0} or {1} is missing in "
+                                       "{2}").format(CUBE_1D, CUBE_3D,
+                                                     file_path))
+        # data
+        data = parse_values(cursor.remaining(), 3)
+        if is_3d:
+            return Lut3D.from_flat(data, size, domain=domain,
+                                   input_range=domain_to_range(domain),
+                                   title=title, dtype=dtype)
+        if len(data) != size:
+            raise CubeHelperException(("Expected {0} values, found {1} in "
+                                       "{2}").format(size, len(data),
+                                                     file_path))
+        return Lut1D(data, domain=domain, input_range=domain_to_range(domain),
+                     title=title, dtype=dtype)
+
     @staticmethod
     def _get_range_message(output_range):
         """ Get range warning/error message
@@ -3,9 +3,10 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.1"
+__version__ = "0.2"
 import os
 import argparse
+import importlib
 import sys
 
 
@@ -47,11 +48,39 @@ def get_imported_modules_versions(modules, glob):
     return res
 
 
+def get_lazy_modules_versions(glob, module_names=None):
+    """Return a function returning imported modules versions (see
+    get_imported_modules_versions), so that sys.modules is only walked if
+    versions are printed. Modules that tools import lazily are imported
+    first, to be listed too.
+
+    Args:
+        glob: globals()
+
+    Kwargs:
+        module_names ([str]): lazily imported modules. Ex: 'PyOpenColorIO'
+
+    Returns:
+        .func
+
+    """
+    def get_versions():
+        glob_modules = dict(glob)
+        for name in module_names or []:
+            try:
+                glob_modules[name] = importlib.import_module(name)
+            except ImportError:
+                pass
+        return get_imported_modules_versions(sys.modules, glob_modules)
+    return get_versions
+
+
 def make_full_version_action(version_text):
     """Return a multi-lines version action for argparse
 
     Args:
-        version_text (str): version text to print
+        version_text (str or func): version text to print, or a function
+        returning it, called only if the action is triggered
 
     Returns:
         .argparse.Action
@@ -71,6 +100,9 @@ def make_full_version_action(version_text):
                 metavar=metavar, type=typ, help=help_str)
 
         def __call__(self, parser, namespace, values, option_string=None):
-            print version_text
+            if callable(version_text):
+                print version_text()
+            else:
+                print version_text
             sys.exit()
     return FullVersionAction
@@ -3,17 +3,14 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.1"
+__version__ = "0.6"
+import os
+import sys
 import utils.lut_presets as presets
-from utils.ocio_helper import OCIO_LUTS_FORMATS
+from utils.lut_utils import OCIO_LUTS_FORMATS
 from utils.debug_helper import make_full_version_action
-from utils.threedl_helper import THREEDL_HELPER
-from utils.csp_helper import CSP_HELPER
-from utils.cube_helper import CUBE_HELPER
-from utils.ascii_helper import ASCII_HELPER
-from utils.clcc_helper import CLCC_HELPER
-from utils.spi_helper import SPI_HELPER
-from utils.json_helper import JSON_HELPER
+from utils.cache_helper import (OUTPUT_CACHE, OUTPUT_CACHE_DIR_ENV,
+                                get_output_key)
 from utils.color_log_helper import print_warning_message
 
 import warnings
@@ -34,6 +31,13 @@ class ExportLutException(Exception):
     pass
 
 
+# Modules imported only when needed, listed by --full-versions
+LAZY_MODULES = ['PyOpenColorIO', 'scipy', 'utils.ocio_helper',
+                'utils.threedl_helper', 'utils.csp_helper',
+                'utils.cube_helper', 'utils.ascii_helper',
+                'utils.clcc_helper', 'utils.spi_helper', 'utils.json_helper']
+
+
 # Argparse options
 
 
@@ -96,20 +100,29 @@ def add_out_type_option(parser):
                         default=None)
 
 
-def add_out_format_option(parser):
+def add_out_format_option(parser, multiple=False):
     """ Add out format argument
 
     Args:
         parser (argparse.ArgumentParser): parser on which option will be add
 
+    Kwargs:
+        multiple (bool): if true, several formats can be specified
+
     """
+    help_msg = ("Output LUT format.\nBeware: 3dl, clcc, json are"
+                " 3D only and lut is 1D/2D only.")
+    kwargs = {}
+    if multiple:
+        help_msg += " Several formats can be specified."
+        kwargs['nargs'] = '+'
     parser.add_argument("--out_format",
-                        help=("Output LUT format.\nBeware: 3dl, clcc, json are"
-                              " 3D only and lut is 1D/2D only."),
+                        help=help_msg,
                         type=str,
                         choices=['3dl', 'csp', 'cube', 'lut', 'spi', 'clcc',
                                  'json'],
-                        default=None)
+                        default=None,
+                        **kwargs)
 
 
 def add_range_option(parser):
@@ -183,8 +196,9 @@ def add_version_option(parser, description, version, full_version):
 
         version (str): version of the module
 
-        full_version (str): versions of dependencies.
-        See debug_helper.get_imported_modules_versions
+        full_version (str or func): versions of dependencies, or a function
+        returning them, called only if -V is used.
+        See debug_helper.get_lazy_modules_versions
 
     """
     # version
@@ -194,9 +208,12 @@ def add_version_option(parser, description, version, full_version):
                         version='{0} - version {1}'.format(description,
                                                            version))
     # full version
-    versions = '{0} - version {1}\n\n{2}'.format(description,
-                                                 version,
-                                                 full_version)
+    def versions():
+        dependencies = full_version
+        if callable(dependencies):
+            dependencies = dependencies()
+        return '{0} - version {1}\n\n{2}'.format(description, version,
+                                                 dependencies)
     parser.add_argument('-V',
                         "--full-versions",
                         action=make_full_version_action(versions))
@@ -226,21 +243,60 @@ def add_trace_option(parser):
                         help='In case of error, print stack trace')
 
 
-def add_preset_option(parser):
+def add_cache_option(parser):
+    """ Add no cache argument
+
+    Args:
+        parser (argparse.ArgumentParser): parser on which option will be add
+
+    """
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        help=("Always write LUTs, don't reuse LUTs of the "
+                              "output cache ({0})").format(
+                                  OUTPUT_CACHE_DIR_ENV))
+
+
+def add_profile_option(parser):
+    """ Add profile arguments
+
+    Args:
+        parser (argparse.ArgumentParser): parser on which option will be add
+
+    """
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help=("Print time spent per stage (OpenColorIO, "
+                              "sampling, formatting, I/O...) and samples/s"))
+    parser.add_argument('--profile-trace',
+                        help=("Write profile as a JSON trace. "
+                              "Implies --profile"),
+                        default=None, type=str)
+
+
+def add_preset_option(parser, multiple=False):
     """ Add preset argument
 
     Args:
         parser (argparse.ArgumentParser): parser on which option will be add
 
+    Kwargs:
+        multiple (bool): if true, several presets can be specified
+
     """
-    loaded_presets = presets.get_presets_from_env()
-    if len(loaded_presets) > 0:
+    preset_names = presets.get_preset_names()
+    if len(preset_names) > 0:
+        help_msg = 'Use a LUT export preset to set output LUT arguments'
+        kwargs = {}
+        if multiple:
+            help_msg += ". Several presets can be specified."
+            kwargs['nargs'] = '+'
         parser.add_argument('--preset',
                             type=str,
-                            choices=loaded_presets.keys(),
-                            help=('Use a LUT export preset to set output LUT '
-                                  'arguments'),
-                            default=None)
+                            choices=preset_names,
+                            help=help_msg,
+                            default=None,
+                            **kwargs)
         parser.add_argument('--overwrite-preset',
                             action='store_true',
                             help=("If a preset + other options are "
@@ -251,23 +307,26 @@ def add_preset_option(parser):
                                   ))
 
 
-def add_export_lut_options(parser):
+def add_export_lut_options(parser, multiple=False):
     """ Add export LUT arguments : out lut file, type, format, ranges,
     out bit depth and out cube size.
 
     Args:
         parser (argparse.ArgumentParser): parser on which option will be add
 
+    Kwargs:
+        multiple (bool): if true, several formats / presets can be specified
+
     """
     add_out_type_option(parser)
-    add_out_format_option(parser)
+    add_out_format_option(parser, multiple)
     add_range_option(parser)
     # 1D arg
     add_out_bitdepth_option(parser)
     # 3D arg
     add_out_cube_size_option(parser)
     # presets
-    add_preset_option(parser)
+    add_preset_option(parser, multiple)
 
 
 def _get_ext_and_helper(key, typ):
@@ -288,25 +347,26 @@ def _get_ext_and_helper(key, typ):
         ext = ".{0}".format(key)
     else:
         ext = key
+    # helpers are imported only when their format is used
     if key.endswith('3dl'):
-        helper = THREEDL_HELPER
+        from utils.threedl_helper import THREEDL_HELPER as helper
     elif key.endswith('cube'):
-        helper = CUBE_HELPER
+        from utils.cube_helper import CUBE_HELPER as helper
     elif key.endswith('csp'):
-        helper = CSP_HELPER
+        from utils.csp_helper import CSP_HELPER as helper
     elif key.endswith('lut'):
-        helper = ASCII_HELPER
+        from utils.ascii_helper import ASCII_HELPER as helper
     elif key.endswith('spi') or key.endswith('spi1d') or key.endswith('spi3d'):
         if typ == '3D':
             ext = '.spi3d'
         else:
             ext = '.spi1d'
-        helper = SPI_HELPER
+        from utils.spi_helper import SPI_HELPER as helper
     elif key.endswith('clcc') or key.endswith('.cc'):
         ext = ".cc"
-        helper = CLCC_HELPER
+        from utils.clcc_helper import CLCC_HELPER as helper
     elif key.endswith('json'):
-        helper = JSON_HELPER
+        from utils.json_helper import JSON_HELPER as helper
     else:
         raise ExportLutException("Unsupported export format: {0}".format(key))
     return ext, helper
@@ -427,3 +487,202 @@ def get_preset_and_write_function(out_type, out_format,
     # fill missing args if necessary
     preset = helper.complete_preset(preset)
     return preset, _get_write_function(helper, out_type)
+
+
+def get_presets_and_write_functions(out_type=None, out_formats=None,
+                                    input_range=None, output_range=None,
+                                    out_bit_depth=None, out_cube_size=None,
+                                    preset_list=None, overwrite_preset=False,
+                                    verbose=False):
+    """ Get preset and write function of one or several exports.
+    Exports are defined by presets or, if there's no preset, by out formats.
+
+    Kwargs:
+        out_type (str): 1D, 2D or 3D
+
+        out_formats (str or [str]): '3dl', 'csp', 'cube', 'lut', 'spi',
+        'clcc', 'json'...
+
+        input_range ([int/float, int/float]): input range.
+        Ex: [0.0, 1.0] or [0, 4095]
+
+        output_range ([int/float, int/float]): output range.
+        Ex: [0.0, 1.0] or [0, 4095]
+
+        out_bit_depth (int): output lut bit precision (1D only).
+        Ex : 10, 16, 32.
+
+        out_cube_size (int): output cube size (3D only). Ex : 17, 32.
+
+        preset_list (dict or [dict]): lut generic and sampling informations
+
+        overwrite_preset (bool): overwrite preset values with other args
+
+        verbose (bool): print log if true
+
+    Returns:
+        .[(preset, write function)]
+
+    """
+    if preset_list is not None and not isinstance(preset_list, (list, tuple)):
+        preset_list = [preset_list]
+    if out_formats is not None and not isinstance(out_formats, (list, tuple)):
+        out_formats = [out_formats]
+    if preset_list:
+        out_format = None
+        if out_formats:
+            if len(out_formats) > 1:
+                raise ExportLutException(("Several out formats can't be "
+                                          "combined with presets"))
+            out_format = out_formats[0]
+        return [(preset, get_write_function(preset, overwrite_preset,
+                                            out_type, out_format,
+                                            input_range, output_range,
+                                            out_bit_depth, out_cube_size,
+                                            verbose))
+                for preset in preset_list]
+    if out_type is None or not out_formats:
+        raise ExportLutException("Specify out_type/out_format or a preset.")
+    return [get_preset_and_write_function(out_type, out_format, input_range,
+                                          output_range, out_bit_depth,
+                                          out_cube_size)
+            for out_format in out_formats]
+
+
+def resolve_path_options(args, names, cwd=None):
+    """ Make relative path arguments relative to cwd instead of the
+    current directory (ex: a tool run by lut_server for a client)
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+
+        names ([str]): names of path arguments (str or [str])
+
+    Kwargs:
+        cwd (str): directory of relative paths. Default is current directory
+
+    """
+    if cwd is None:
+        return
+    for name in names:
+        value = getattr(args, name, None)
+        if isinstance(value, list):
+            setattr(args, name, [os.path.join(cwd, path) for path in value])
+        elif value is not None:
+            setattr(args, name, os.path.join(cwd, value))
+
+
+# Output cache
+
+
+def get_output_files(write_function, outlutfile, preset):
+    """ Return files written by an export
+
+    Args:
+        write_function (func): helper write function. See get_write_function
+
+        outlutfile (str): path to output LUT
+
+        preset (dict): lut generic and sampling informations
+
+    Returns:
+        .[str]
+
+    """
+    return write_function.__self__.get_output_files(outlutfile, preset)
+
+
+def get_writer_versions(write_function):
+    """ Return versions of the helper modules writing LUTs with
+    write_function: its helper class module and the modules of the classes
+    it inherits from
+
+    Args:
+        write_function (func): helper write function. See get_write_function
+
+    Returns:
+        .[[str, str]] module names and versions
+
+    """
+    versions = []
+    for helper_class in type(write_function.__self__).__mro__:
+        if helper_class is object:
+            continue
+        module = sys.modules[helper_class.__module__]
+        versions.append([module.__name__,
+                         getattr(module, '__version__', None)])
+    return versions
+
+
+def get_export_key(key_items, write_function, outlutfile, preset,
+                   use_cache=True):
+    """ Return output cache key of an export (see utils.cache_helper)
+
+    Args:
+        key_items (list): everything but preset the export depends on: tool
+        name and version, input digests, options...
+
+        write_function (func): helper write function. Its helper version is
+        part of the key
+
+        outlutfile (str): path to output LUT. Its name may be written in
+        the LUT
+
+        preset (dict): lut generic and sampling informations
+
+    Kwargs:
+        use_cache (bool): if false, no key is returned
+
+    Returns:
+        .str or None if output cache is disabled
+
+    """
+    if not use_cache or not OUTPUT_CACHE.is_enabled():
+        return None
+    return get_output_key(key_items, get_writer_versions(write_function),
+                          preset, os.path.basename(outlutfile))
+
+
+def fetch_export(key, write_function, outlutfile, preset, verbose=False):
+    """ Write an export from the output cache
+
+    Args:
+        key (str): export key. See get_export_key
+
+        write_function (func): helper write function
+
+        outlutfile (str): path to output LUT
+
+        preset (dict): lut generic and sampling informations
+
+    Kwargs:
+        verbose (bool): print log if true
+
+    Returns:
+        .bool True if export was found in the cache
+
+    """
+    if key is None or not OUTPUT_CACHE.fetch(
+            key, get_output_files(write_function, outlutfile, preset)):
+        return False
+    if verbose:
+        print "{0}: reused from output cache.".format(outlutfile)
+    return True
+
+
+def store_export(key, write_function, outlutfile, preset):
+    """ Add a written export to the output cache
+
+    Args:
+        key (str): export key. See get_export_key
+
+        write_function (func): helper write function
+
+        outlutfile (str): path to output LUT
+
+        preset (dict): lut generic and sampling informations
+
+    """
+    if key is not None:
+        OUTPUT_CACHE.store(key, get_output_files(write_function, outlutfile,
+                                                 preset))
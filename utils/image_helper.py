@@ -0,0 +1,203 @@
+""" Color transforms of image buffers
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.1"
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy
+from utils.lut_utils import array_capable, is_array_capable
+from utils.colors_helper import get_colorspace, get_colorspace_obj_matrix
+
+
+class ImageHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Max number of pixels processed in one tile. Bounds temporary memory to a
+# few float64 copies of a tile per thread
+DEFAULT_TILE_SIZE = 1 << 18
+
+
+@array_capable
+class ColorspaceConversion(object):
+    """ RGB to RGB conversion between two colorspaces: decode input
+    gradation, apply conversion matrix, encode output gradation.
+
+    """
+    def __init__(self, in_colorspace, out_colorspace, primaries_only=False):
+        """ Ctor
+
+        Args:
+            in_colorspace (str or utils.colorspaces.AbstractColorspace):
+            input colorspace
+
+            out_colorspace (str or utils.colorspaces.AbstractColorspace):
+            output colorspace
+
+        Kwargs:
+            primaries_only (bool): primaries matrix only, doesn't include
+            white point.
+
+        """
+        if isinstance(in_colorspace, basestring):
+            in_colorspace = get_colorspace(in_colorspace)
+        if isinstance(out_colorspace, basestring):
+            out_colorspace = get_colorspace(out_colorspace)
+        self.in_colorspace = in_colorspace
+        self.out_colorspace = out_colorspace
+        self.matrix = numpy.dot(
+            get_colorspace_obj_matrix(out_colorspace, primaries_only,
+                                      inv=True),
+            get_colorspace_obj_matrix(in_colorspace, primaries_only))
+        # same primaries: matrix is skipped
+        if numpy.allclose(self.matrix, numpy.identity(3), rtol=0,
+                          atol=1e-12):
+            self.matrix = None
+
+    def __call__(self, values):
+        """ Process RGB values
+
+        Args:
+            values (numpy.array): (N, 3) array of RGB triplets
+
+        Returns:
+            .numpy.array (N, 3)
+
+        """
+        values = self.in_colorspace.decode_gradation(
+            numpy.asarray(values, dtype=numpy.float64))
+        if self.matrix is not None:
+            values = numpy.dot(values, self.matrix.T)
+        return self.out_colorspace.encode_gradation(values)
+
+
+def get_tiles(pixel_count, tile_size=DEFAULT_TILE_SIZE):
+    """ Return tiles of a flat pixel buffer
+
+    Args:
+        pixel_count (int): number of pixels
+
+    Kwargs:
+        tile_size (int): max number of pixels of a tile
+
+    Returns:
+        .[(int, int)] start and stop pixel indexes
+
+    """
+    if tile_size < 1:
+        raise ImageHelperException(("Tile size must be positive: {0}"
+                                    ).format(tile_size))
+    return [(start, min(start + tile_size, pixel_count))
+            for start in range(0, pixel_count, tile_size)]
+
+
+def _get_pixels(image):
+    """ Return a (N, 3) view of an image buffer
+
+    Args:
+        image (numpy.array): (H, W, 3) or (N, 3) float buffer
+
+    Returns:
+        .numpy.array (N, 3) sharing image memory
+
+    """
+    if not isinstance(image, numpy.ndarray):
+        raise ImageHelperException("Image must be a numpy array (or memmap)")
+    if image.ndim < 2 or image.shape[-1] != 3:
+        raise ImageHelperException(("Image must be a (H, W, 3) RGB buffer, "
+                                    "got shape {0}").format(image.shape))
+    if not numpy.issubdtype(image.dtype, numpy.floating):
+        raise ImageHelperException(("Image must be a float buffer, got {0}"
+                                    ).format(image.dtype))
+    if not image.flags.c_contiguous:
+        raise ImageHelperException("Image buffer must be C contiguous")
+    if not image.flags.writeable:
+        raise ImageHelperException("Image buffer is read only")
+    pixels = image.reshape(-1, 3)
+    if not numpy.may_share_memory(pixels, image):
+        raise ImageHelperException("Image buffer can't be processed in place")
+    return pixels
+
+
+def apply_to_image(process_function, image, tile_size=DEFAULT_TILE_SIZE,
+                   threads=None):
+    """ Apply a process function to an image buffer, in place.
+    Buffer is processed by tiles, on a thread pool: numpy releases the GIL
+    in its loops, so tiles are processed concurrently.
+
+    Args:
+        process_function (func): array capable process function.
+        Ex: ColorspaceConversion, utils.lut_model.Lut3D,
+        utils.bake_helper.ChainFunction
+
+        image (numpy.array): (H, W, 3) C contiguous float buffer, or memmap
+
+    Kwargs:
+        tile_size (int): max number of pixels processed at once by a thread
+
+        threads (int): number of threads. Default is number of CPUs
+
+    Returns:
+        .numpy.array image
+
+    """
+    if not is_array_capable(process_function):
+        raise ImageHelperException(("Process function must be array capable:"
+                                    " {0}").format(process_function))
+    pixels = _get_pixels(image)
+    tiles = get_tiles(len(pixels), tile_size)
+
+    def process_tile(tile):
+        start, stop = tile
+        pixels[start:stop] = process_function(pixels[start:stop])
+    if threads is None:
+        threads = multiprocessing.cpu_count()
+    threads = min(threads, len(tiles))
+    if threads <= 1:
+        for tile in tiles:
+            process_tile(tile)
+    else:
+        pool = ThreadPool(threads)
+        try:
+            pool.map(process_tile, tiles)
+        finally:
+            pool.close()
+            pool.join()
+    return image
+
+
+def convert_image(image, in_colorspace, out_colorspace, primaries_only=False,
+                  tile_size=DEFAULT_TILE_SIZE, threads=None):
+    """ Convert an image buffer from a colorspace to another, in place.
+    See apply_to_image.
+
+    Args:
+        image (numpy.array): (H, W, 3) C contiguous float buffer, or memmap
+
+        in_colorspace (str): input colorspace, public or private
+
+        out_colorspace (str): output colorspace, public or private
+
+    Kwargs:
+        primaries_only (bool): primaries matrix only, doesn't include white
+        point.
+
+        tile_size (int): max number of pixels processed at once by a thread
+
+        threads (int): number of threads. Default is number of CPUs
+
+    Returns:
+        .numpy.array image
+
+    """
+    conversion = ColorspaceConversion(in_colorspace, out_colorspace,
+                                      primaries_only)
+    return apply_to_image(conversion, image, tile_size, threads)
@@ -6,7 +6,11 @@
 __version__ = "0.1"
 from utils.abstract_lut_helper import AbstractLUTHelper
 import utils.lut_presets as presets
+from utils.serialization_helper import atomic_write
+from utils.profile_helper import PROFILER
+from utils.lut_model import DEFAULT_DTYPE, Lut3D
 import json
+import numpy
 
 
 class JsonHelperException(Exception):
@@ -45,34 +49,30 @@ class JsonLutHelper(AbstractLUTHelper):
     def write_3d_lut(self, process_function, file_path, preset):
         in_data, data = self._get_3d_data(process_function, preset)
         cube_size = preset[presets.CUBE_SIZE]
-        input_colors = []
         # get input color values
-        for rgb in in_data:
-            input_colors.append([rgb.r / float(cube_size),
-                                 rgb.g / float(cube_size),
-                                 rgb.b / float(cube_size)])
-        # remap processed values
-        red_values = []
-        green_values = []
-        blue_values = []
-        for rgb in data:
-            red_values.append(rgb.r)
-            green_values.append(rgb.g)
-            blue_values.append(rgb.b)
+        input_colors = (in_data / float(cube_size)).tolist()
         # create json dict
         json_data = {
             'cubesize': cube_size,
-            'red_values': red_values,
-            'green_values': green_values,
-            'blue_values': blue_values,
+            'red_values': data[:, 0].tolist(),
+            'green_values': data[:, 1].tolist(),
+            'blue_values': data[:, 2].tolist(),
             'input_colors': input_colors
             }
         # write data
-        lutfile = open(file_path, 'w+')
-        json.dump(json_data, lutfile)
-        lutfile.close()
+        with atomic_write(file_path) as lutfile:
+            with PROFILER.stage('format', len(data)):
+                json.dump(json_data, lutfile)
         return self.get_export_message(file_path)
 
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        with open(file_path) as lutfile:
+            json_data = json.load(lutfile)
+        data = numpy.column_stack((json_data['red_values'],
+                                   json_data['green_values'],
+                                   json_data['blue_values']))
+        return Lut3D.from_flat(data, json_data['cubesize'], dtype=dtype)
+
     def _validate_preset(self, preset, mode=presets.RAISE_MODE,
                          default_preset=None):
         default_preset = self.get_default_preset()
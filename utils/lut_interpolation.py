@@ -0,0 +1,197 @@
+""" NumPy 1D / 3D LUT interpolation, independent of OpenColorIO
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.1"
+import numpy
+
+
+class LutInterpolationException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# 3D interpolations
+TRILINEAR = 'trilinear'
+TETRAHEDRAL = 'tetrahedral'
+INTERPOLATIONS = [TRILINEAR, TETRAHEDRAL]
+
+# Number of RGB triplets interpolated at once
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# Max expected gap with OpenColorIO interpolation of the same LUT.
+# OpenColorIO computes in float32, this module in float64.
+OCIO_TOLERANCE = 1e-5
+
+
+def _get_lattice_coordinates(values, cube_size, domain):
+    """ Return base lattice indexes and fractional parts of RGB triplets.
+    Values are clamped to domain, like OpenColorIO does.
+
+    Args:
+        values (numpy.array): (N, 3) RGB triplets
+
+        cube_size (int): cube size
+
+        domain (numpy.array): (2, 3) input values of the first and last
+        samples
+
+    Returns:
+        .numpy.array (N, 3) int base indexes, numpy.array (N, 3) fractional
+        parts in [0, 1]
+
+    """
+    positions = ((values - domain[0]) / (domain[1] - domain[0])
+                 * (cube_size - 1))
+    positions = numpy.clip(positions, 0, cube_size - 1)
+    # last sample is the upper corner of the last cell
+    base = numpy.minimum(numpy.floor(positions), cube_size - 2).astype(int)
+    return base, positions - base
+
+
+def _trilinear(flat_table, strides, base_offsets, fractions):
+    """ Trilinear interpolation of a chunk
+
+    Args:
+        flat_table (numpy.array): (S^3, 3) lattice values
+
+        strides (numpy.array): (3,) red, green, blue strides in flat_table
+
+        base_offsets (numpy.array): (N,) offsets of cell lower corners
+
+        fractions (numpy.array): (N, 3) fractional parts
+
+    Returns:
+        .numpy.array (N, 3)
+
+    """
+    res = numpy.zeros(fractions.shape)
+    for corner in range(8):
+        # corner bits: red, green, blue
+        bits = numpy.array([(corner >> 2) & 1, (corner >> 1) & 1, corner & 1])
+        weights = numpy.prod(numpy.where(bits, fractions, 1 - fractions),
+                             axis=1)
+        res += (weights[:, numpy.newaxis]
+                * flat_table[base_offsets + numpy.dot(strides, bits)])
+    return res
+
+
+def _tetrahedral(flat_table, strides, base_offsets, fractions):
+    """ Tetrahedral interpolation of a chunk.
+    A cell is split into 6 tetrahedra sharing its main diagonal. Going from
+    the lower corner to the upper one along the axes sorted by decreasing
+    fractional part, the tetrahedron vertices are walked through.
+
+    Args:
+        See _trilinear
+
+    Returns:
+        .numpy.array (N, 3)
+
+    """
+    order = numpy.argsort(-fractions, axis=1)
+    rows = numpy.arange(len(fractions))[:, numpy.newaxis]
+    sorted_fractions = fractions[rows, order]
+    sorted_strides = strides[order]
+    first = base_offsets + sorted_strides[:, 0]
+    second = first + sorted_strides[:, 1]
+    last = base_offsets + strides.sum()
+    weights = numpy.column_stack((1 - sorted_fractions[:, 0],
+                                  sorted_fractions[:, 0]
+                                  - sorted_fractions[:, 1],
+                                  sorted_fractions[:, 1]
+                                  - sorted_fractions[:, 2],
+                                  sorted_fractions[:, 2]))
+    return (weights[:, 0:1] * flat_table[base_offsets]
+            + weights[:, 1:2] * flat_table[first]
+            + weights[:, 2:3] * flat_table[second]
+            + weights[:, 3:4] * flat_table[last])
+
+
+def interpolate_3d(table, values, interpolation=TETRAHEDRAL, domain=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Interpolate RGB triplets through a 3D lattice
+
+    Args:
+        table (numpy.array): (S, S, S, 3) lattice values indexed
+        [red, green, blue]
+
+        values (numpy.array): (N, 3) RGB triplets
+
+    Kwargs:
+        interpolation (str): trilinear or tetrahedral
+
+        domain ([float, float] or (2, 3) array): input values of the first
+        and last samples. Default is [0.0, 1.0]
+
+        chunk_size (int): number of triplets interpolated at once. Memory
+        used is proportional to it. None interpolates everything at once
+
+    Returns:
+        .numpy.array (N, 3) float64
+
+    """
+    if interpolation == TETRAHEDRAL:
+        interpolate_chunk = _tetrahedral
+    elif interpolation == TRILINEAR:
+        interpolate_chunk = _trilinear
+    else:
+        raise LutInterpolationException(("Unsupported interpolation: {0}. "
+                                         "Expected {1}"
+                                         ).format(interpolation,
+                                                  INTERPOLATIONS))
+    table = numpy.asarray(table, dtype=numpy.float64)
+    cube_size = table.shape[0]
+    if table.shape != (cube_size, cube_size, cube_size, 3) or cube_size < 2:
+        raise LutInterpolationException(("Invalid 3D LUT table shape: "
+                                         "{0}").format(table.shape))
+    if domain is None:
+        domain = [0.0, 1.0]
+    domain = numpy.asarray(domain, dtype=numpy.float64).reshape(2, -1)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    shape = values.shape
+    values = values.reshape(-1, 3)
+    flat_table = table.reshape(-1, 3)
+    # flat index of [r, g, b] is r * S^2 + g * S + b
+    strides = numpy.array([cube_size * cube_size, cube_size, 1])
+    res = numpy.empty(values.shape)
+    chunk_size = chunk_size or max(len(values), 1)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        base, fractions = _get_lattice_coordinates(chunk, cube_size, domain)
+        res[start:start + chunk_size] = interpolate_chunk(
+            flat_table, strides, numpy.dot(base, strides), fractions)
+    return res.reshape(shape)
+
+
+def interpolate_1d(table, positions, values):
+    """ Linearly interpolate RGB triplets through a 1D LUT, channel by
+    channel. Values are clamped to the positions range.
+
+    Args:
+        table (numpy.array): (N, 3) LUT values
+
+        positions (numpy.array): (N, 3) increasing input values of the
+        samples
+
+        values (numpy.array): (M, 3) RGB triplets
+
+    Returns:
+        .numpy.array (M, 3) float64
+
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    shape = values.shape
+    values = values.reshape(-1, 3)
+    res = numpy.empty(values.shape)
+    for channel in range(3):
+        res[:, channel] = numpy.interp(values[:, channel],
+                                       positions[:, channel],
+                                       table[:, channel])
+    return res.reshape(shape)
@@ -0,0 +1,662 @@
+""" In-memory LUT model, independent of OpenColorIO
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.5"
+import os
+import numpy
+from utils import lut_presets as presets
+from utils.cache_helper import LRUCache
+from utils.lut_utils import array_capable, get_file_signature
+from utils.lut_interpolation import (interpolate_1d, interpolate_3d,
+                                     TETRAHEDRAL)
+
+
+class LutModelException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Default type of LUT tables
+DEFAULT_DTYPE = numpy.float32
+
+# Candidate bit depths of int LUT values
+LIKELY_BITDEPTHS = [8, 10, 12, 14, 16, 24, 32]
+
+# Max gap between a preset sample and a LUT sample (normalized values)
+SAMPLE_POSITION_TOLERANCE = 1e-9
+
+# Fraction of a code value added to int outputs. Writers truncate scaled
+# values: without it, float round-off could turn 3000 into 2999.
+INT_OUTPUT_MARGIN = 1e-6
+
+
+def get_likely_bitdepth(max_value):
+    """ Return the smallest likely bit depth that can hold an int value
+
+    Args:
+        max_value (int): max value found in a LUT. Ex: 1023, 4000...
+
+    Returns:
+        .int
+
+    """
+    for bitdepth in LIKELY_BITDEPTHS:
+        if max_value <= pow(2, bitdepth) - 1:
+            return bitdepth
+    raise LutModelException("Unexpected LUT value: {0}".format(max_value))
+
+
+def _get_domain(domain):
+    """ Return a (2, 3) domain array
+
+    Args:
+        domain ([float, float] or [[float x3], [float x3]]): min / max input
+        values, shared by every channel or per channel
+
+    Returns:
+        .numpy.array (2, 3): min row and max row
+
+    """
+    if domain is None:
+        domain = [0.0, 1.0]
+    domain = numpy.asarray(domain, dtype=numpy.float64)
+    if domain.shape == (2,):
+        domain = numpy.column_stack((domain, domain, domain))
+    if domain.shape != (2, 3):
+        raise LutModelException("Invalid domain: {0}".format(domain))
+    return domain
+
+
+def domain_to_range(domain):
+    """ Return the input range matching a domain (shared by every channel).
+    A per channel domain gives its first channel range.
+
+    Args:
+        domain ([float, float] or (2, 3) array): see AbstractLut
+
+    Returns:
+        .[float, float]
+
+    """
+    domain = _get_domain(domain)
+    return [float(domain[0][0]), float(domain[1][0])]
+
+
+def parse_values(text, columns, separator=None):
+    """ Parse a block of numbers at once
+
+    Args:
+        text (str): data block. Ex: "0.0 0.1 0.2\n0.3 0.4 0.5\n"
+
+        columns (int): number of values per row
+
+    Kwargs:
+        separator (str): value separator if it's not a whitespace. Ex: ','
+
+    Returns:
+        .numpy.array (N, columns) float64
+
+    """
+    if separator:
+        text = text.replace(separator, ' ')
+    values = numpy.fromstring(text, dtype=numpy.float64, sep=' ')
+    # fromstring stops at the first unexpected token
+    if values.size != len(text.split()):
+        raise LutModelException("Unexpected token in LUT data block")
+    if values.size % columns:
+        raise LutModelException(("LUT data block size ({0}) isn't a multiple"
+                                 " of {1}").format(values.size, columns))
+    return values.reshape(-1, columns)
+
+
+def is_number(token):
+    """ Return True if token is a number
+
+    Args:
+        token (str): a text token
+
+    Returns:
+        .bool
+
+    """
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+class TextCursor(object):
+    """ Walk through a LUT text line by line. Header lines are read one by
+    one and data block is then parsed at once (see parse_values)
+
+    """
+    def __init__(self, text, comment='#'):
+        """ Ctor
+
+        Args:
+            text (str): LUT text
+
+        Kwargs:
+            comment (str): comment line prefix. None if format has no comment
+
+        """
+        self.text = text
+        self.comment = comment
+        self.position = 0
+
+    def peek_line(self):
+        """ Return next non empty, non comment line, without consuming it.
+
+        Returns:
+            .str stripped line or None at end of text
+
+        """
+        while self.position < len(self.text):
+            end = self.text.find('\n', self.position)
+            if end == -1:
+                end = len(self.text)
+            line = self.text[self.position:end].strip()
+            if line and not (self.comment and line.startswith(self.comment)):
+                return line
+            self.position = end + 1
+        return None
+
+    def next_line(self):
+        """ Consume and return next non empty, non comment line
+
+        Returns:
+            .str stripped line
+
+        """
+        line = self.peek_line()
+        if line is None:
+            raise LutModelException("Unexpected end of LUT")
+        end = self.text.find('\n', self.position)
+        if end == -1:
+            end = len(self.text)
+        self.position = end + 1
+        return line
+
+    def remaining(self):
+        """ Consume and return the rest of the text, without its comment
+        lines
+
+        Returns:
+            .str
+
+        """
+        text = self.text[self.position:]
+        self.position = len(self.text)
+        if self.comment and self.comment in text:
+            # comments in or after the data block (ex: appended notes)
+            text = "\n".join(line for line in text.split('\n')
+                             if not line.lstrip().startswith(self.comment))
+        return text
+
+
+class AbstractLut(object):
+    """ Common LUT attributes
+
+    """
+    def __init__(self, table, domain=None, input_range=None,
+                 output_range=None, title=None, comment=None,
+                 dtype=DEFAULT_DTYPE):
+        """ Ctor
+
+        Args:
+            table (numpy.array): LUT values. Values are normalized: writing
+            them with an output range [a, b] gives value * b + a (see
+            AbstractLUTHelper)
+
+        Kwargs:
+            domain ([float, float] or (2, 3) array): normalized input values
+            of the first and last samples. Default is [0.0, 1.0]
+
+            input_range ([int/float, int/float]): input range of the LUT
+            file. Ex: [0, 1023] for a 10 bits 3dl
+
+            output_range ([int/float, int/float]): output range of the LUT
+            file. Ex: [0, 4095] for a 12 bits 3dl
+
+            title (str): LUT title
+
+            comment (str): LUT comment
+
+            dtype (numpy.dtype): table type
+
+        """
+        self.table = numpy.asarray(table, dtype=dtype)
+        self.domain = _get_domain(domain)
+        if input_range is None:
+            input_range = [0.0, 1.0]
+        if output_range is None:
+            output_range = [0.0, 1.0]
+        self.input_range = list(input_range)
+        self.output_range = list(output_range)
+        self.title = title
+        self.comment = comment
+
+    @property
+    def dtype(self):
+        """ Table type
+
+        """
+        return self.table.dtype
+
+
+@array_capable
+class Lut1D(AbstractLut):
+    """ 1D LUT: (N, 3) table, one column per channel.
+    Samples are uniformly distributed over domain, unless positions are
+    defined (ex: CSP pre-LUTs).
+    A Lut1D is a process function (see utils.lut_utils.array_capable).
+
+    """
+    def __init__(self, table, domain=None, positions=None, **kwargs):
+        """ Ctor
+
+        Args:
+            table (numpy.array): (N, 3) or (N,) values. A (N,) table is
+            shared by the 3 channels
+
+        Kwargs:
+            positions (numpy.array): (N, 3) or (N,) normalized input values
+            of the samples. Default is uniform over domain
+
+            See AbstractLut
+
+        """
+        AbstractLut.__init__(self, table, domain, **kwargs)
+        if self.table.ndim == 1:
+            self.table = numpy.column_stack((self.table, self.table,
+                                             self.table))
+        if self.table.ndim != 2 or self.table.shape[1] != 3:
+            raise LutModelException(("Invalid 1D LUT table shape: "
+                                     "{0}").format(self.table.shape))
+        if positions is not None:
+            positions = numpy.asarray(positions, dtype=numpy.float64)
+            if positions.ndim == 1:
+                positions = numpy.column_stack((positions, positions,
+                                                positions))
+            if positions.shape != self.table.shape:
+                raise LutModelException(("1D LUT positions and table shapes "
+                                         "differ: {0} / {1}"
+                                         ).format(positions.shape,
+                                                  self.table.shape))
+            self.domain = _get_domain([positions[0], positions[-1]])
+        self.positions = positions
+
+    @property
+    def size(self):
+        """ Number of samples
+
+        """
+        return len(self.table)
+
+    def get_positions(self):
+        """ Return normalized input values of the samples
+
+        Returns:
+            .numpy.array (N, 3)
+
+        """
+        if self.positions is not None:
+            return self.positions
+        ramp = numpy.linspace(0.0, 1.0, self.size)[:, numpy.newaxis]
+        return self.domain[0] + ramp * (self.domain[1] - self.domain[0])
+
+    def __call__(self, values):
+        """ Linearly interpolate RGB values
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a (N, 3) array of RGB triplets
+
+        Returns:
+            .numpy.array (3,) or (N, 3)
+
+        """
+        return interpolate_1d(self.table, self.get_positions(), values)
+
+    def __repr__(self):
+        return "Lut1D(size={0}, domain={1})".format(self.size,
+                                                    self.domain.tolist())
+
+
+@array_capable
+class Lut3D(AbstractLut):
+    """ 3D LUT: (S, S, S, 3) table indexed [red, green, blue], with an
+    optional 1D shaper LUT applied before the lattice.
+    A Lut3D is a process function (see utils.lut_utils.array_capable).
+
+    """
+    def __init__(self, table, domain=None, shaper=None, **kwargs):
+        """ Ctor
+
+        Args:
+            table (numpy.array): (S, S, S, 3) values indexed [r, g, b]
+
+        Kwargs:
+            shaper (Lut1D): pre LUT mapping inputs to lattice domain
+
+            See AbstractLut
+
+        """
+        AbstractLut.__init__(self, table, domain, **kwargs)
+        shape = self.table.shape
+        if (len(shape) != 4 or shape[3] != 3
+                or not shape[0] == shape[1] == shape[2]):
+            raise LutModelException(("Invalid 3D LUT table shape: "
+                                     "{0}").format(shape))
+        self.shaper = shaper
+
+    @classmethod
+    def from_flat(cls, values, cube_size, red_fastest=True, **kwargs):
+        """ Create a 3D LUT from a list of RGB triplets
+
+        Args:
+            values (numpy.array): (S^3, 3) values
+
+            cube_size (int): cube size
+
+        Kwargs:
+            red_fastest (bool): if true, red is the fastest axis (cube, csp,
+            spi3d...), else blue is (3dl)
+
+            See Lut3D.__init__
+
+        Returns:
+            .Lut3D
+
+        """
+        values = numpy.asarray(values)
+        if values.shape != (cube_size ** 3, 3):
+            raise LutModelException(("Expected {0} RGB values for a {1} cube,"
+                                     " found {2}").format(cube_size ** 3,
+                                                          cube_size,
+                                                          len(values)))
+        table = values.reshape(cube_size, cube_size, cube_size, 3)
+        if red_fastest:
+            # [b, g, r] to [r, g, b]
+            table = table.transpose(2, 1, 0, 3)
+        return cls(numpy.ascontiguousarray(table), **kwargs)
+
+    @property
+    def cube_size(self):
+        """ Number of samples per axis
+
+        """
+        return self.table.shape[0]
+
+    def get_positions(self):
+        """ Return normalized input values of the samples on each axis
+
+        Returns:
+            .numpy.array (S, 3)
+
+        """
+        ramp = numpy.linspace(0.0, 1.0, self.cube_size)[:, numpy.newaxis]
+        return self.domain[0] + ramp * (self.domain[1] - self.domain[0])
+
+    def get_flat_table(self, red_fastest=True):
+        """ Return table as a list of RGB triplets
+
+        Kwargs:
+            red_fastest (bool): if true, red is the fastest axis (cube, csp,
+            spi3d...), else blue is (3dl)
+
+        Returns:
+            .numpy.array (S^3, 3)
+
+        """
+        table = self.table
+        if red_fastest:
+            table = table.transpose(2, 1, 0, 3)
+        return table.reshape(-1, 3)
+
+    def __call__(self, values, interpolation=TETRAHEDRAL):
+        """ Interpolate RGB values through shaper and lattice
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a (N, 3) array of RGB triplets
+
+        Kwargs:
+            interpolation (str): trilinear or tetrahedral.
+            See utils.lut_interpolation
+
+        Returns:
+            .numpy.array (3,) or (N, 3)
+
+        """
+        if self.shaper is not None:
+            values = self.shaper(values)
+        return interpolate_3d(self.table, values, interpolation, self.domain)
+
+    def __repr__(self):
+        return "Lut3D(cube_size={0}, domain={1}, shaper={2})".format(
+            self.cube_size, self.domain.tolist(), self.shaper)
+
+
+def get_preset_samples(preset):
+    """ Return normalized input values a preset samples on each axis.
+    See AbstractLUTHelper._get_1d_data and _get_3d_sampling
+
+    Args:
+        preset (dict): lut generic and sampling informations
+
+    Returns:
+        .numpy.array
+
+    """
+    if presets.is_3d_preset(preset):
+        samples_count = preset[presets.CUBE_SIZE]
+    else:
+        samples_count = pow(2, preset[presets.OUT_BITDEPTH])
+    input_range = preset[presets.IN_RANGE]
+    samples = numpy.linspace(input_range[0], input_range[1], samples_count)
+    if presets.is_int(preset[presets.OUT_RANGE]):
+        samples = (samples - input_range[0]) / input_range[1]
+    return samples
+
+
+def samples_match(lut, preset):
+    """ Return True if a preset samples a LUT exactly where its samples
+    are: the LUT can then be exported without being resampled.
+
+    Args:
+        lut (Lut1D or Lut3D): a LUT
+
+        preset (dict): lut generic and sampling informations
+
+    Returns:
+        .bool
+
+    """
+    if isinstance(lut, Lut3D):
+        if (lut.shaper is not None or not presets.is_3d_preset(preset)
+                or preset.get(presets.SHAPER_CURVE)):
+            return False
+    elif (lut.positions is not None
+          or not presets.is_1d_or_2d_preset(preset)
+          or preset.get(presets.SMOOTH)):
+        return False
+    samples = get_preset_samples(preset)
+    positions = lut.get_positions()
+    if len(samples) != len(positions):
+        return False
+    return numpy.allclose(positions, samples[:, numpy.newaxis], rtol=0,
+                          atol=SAMPLE_POSITION_TOLERANCE)
+
+
+@array_capable
+class LatticeFunction(object):
+    """ Process function returning LUT samples as they are: nothing is
+    interpolated. Input values must be sample positions (see samples_match).
+
+    """
+    def __init__(self, lut, output_range=None):
+        """ Ctor
+
+        Args:
+            lut (Lut1D or Lut3D): a LUT with uniformly distributed samples
+
+        Kwargs:
+            output_range ([int/float, int/float]): output range the values
+            will be scaled to. Ex: [0, 4095]
+
+        """
+        if isinstance(lut, Lut3D) and lut.shaper is not None:
+            raise LutModelException("3D LUT with a shaper must be resampled")
+        if isinstance(lut, Lut1D) and lut.positions is not None:
+            raise LutModelException(("1D LUT with non uniform samples must "
+                                     "be resampled"))
+        self.lut = lut
+        self.table = numpy.asarray(lut.table, dtype=numpy.float64)
+        if output_range is not None and presets.is_int(output_range):
+            self.table = self.table + INT_OUTPUT_MARGIN / output_range[1]
+        positions = lut.get_positions()
+        self.origin = positions[0]
+        self.step = (positions[-1] - positions[0]) / (len(positions) - 1)
+
+    def __call__(self, values):
+        """ Return LUT samples
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a (N, 3) array of RGB triplets
+
+        Returns:
+            .numpy.array (3,) or (N, 3)
+
+        """
+        values = numpy.asarray(values, dtype=numpy.float64)
+        indexes = (values.reshape(-1, 3) - self.origin) / self.step
+        rounded = numpy.rint(indexes)
+        if (not numpy.allclose(indexes, rounded, rtol=0, atol=1e-6)
+                or rounded.min() < 0 or rounded.max() >= len(self.table)):
+            raise LutModelException("Values aren't LUT sample positions, "
+                                    "LUT must be resampled")
+        indexes = rounded.astype(int)
+        if isinstance(self.lut, Lut3D):
+            res = self.table[indexes[:, 0], indexes[:, 1], indexes[:, 2]]
+        else:
+            res = self.table[indexes, numpy.arange(3)]
+        return res.reshape(values.shape)
+
+
+def get_lut_helper(file_path):
+    """ Return the helper reading a LUT file
+
+    Args:
+        file_path (str): path to a LUT
+
+    Returns:
+        .AbstractLUTHelper
+
+    """
+    # imported here, helpers depend on this module
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.cube':
+        from utils.cube_helper import CUBE_HELPER as helper
+    elif ext == '.3dl':
+        from utils.threedl_helper import THREEDL_HELPER as helper
+    elif ext == '.csp':
+        from utils.csp_helper import CSP_HELPER as helper
+    elif ext in ['.spi1d', '.spi3d']:
+        from utils.spi_helper import SPI_HELPER as helper
+    elif ext == '.cc':
+        from utils.clcc_helper import CLCC_HELPER as helper
+    elif ext == '.lut':
+        from utils.ascii_helper import ASCII_HELPER as helper
+    elif ext == '.json':
+        from utils.json_helper import JSON_HELPER as helper
+    else:
+        raise LutModelException("Unsupported LUT format: {0}".format(ext))
+    return helper
+
+
+def is_readable(file_path):
+    """ Return True if a LUT can be read natively
+
+    Args:
+        file_path (str): path to a LUT
+
+    Returns:
+        .bool
+
+    """
+    try:
+        get_lut_helper(file_path)
+    except LutModelException:
+        return False
+    return True
+
+
+class LutCache(LRUCache):
+    """Thread safe LRU cache of read LUTs, keyed by file path, modification
+    time, size and table type. Disabled by default (capacity 0): long-lived
+    processes (see lutLab.lut_server) enable it so that the same LUTs aren't
+    parsed for every request.
+    Cached LUTs are shared, they must not be modified.
+
+    """
+    def __init__(self, capacity=0):
+        """ Ctor
+
+        Kwargs:
+            capacity (int): max number of cached LUTs. 0 disables the cache
+
+        """
+        super(LutCache, self).__init__(capacity)
+
+    @staticmethod
+    def get_key(file_path, dtype):
+        """Return cache key of a LUT file
+
+        Args:
+            file_path (str): path to a LUT
+
+            dtype (numpy.dtype): table type
+
+        Returns:
+            .tuple
+
+        """
+        return (get_file_signature(file_path), numpy.dtype(dtype).str)
+
+
+LUT_CACHE = LutCache()
+
+
+def read_lut(file_path, dtype=DEFAULT_DTYPE):
+    """ Read a LUT file.
+    If LUT_CACHE is enabled, an unchanged LUT is read once.
+
+    Args:
+        file_path (str): path to a LUT
+
+    Kwargs:
+        dtype (numpy.dtype): table type
+
+    Returns:
+        .Lut1D or Lut3D
+
+    """
+    helper = get_lut_helper(file_path)
+    if LUT_CACHE.get_capacity() <= 0:
+        return helper.read_lut(file_path, dtype)
+    key = LUT_CACHE.get_key(file_path, dtype)
+    lut = LUT_CACHE.get(key)
+    if lut is None:
+        lut = helper.read_lut(file_path, dtype)
+        LUT_CACHE.put(key, lut)
+    return lut
@@ -26,12 +26,16 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.3"
+__version__ = "0.4"
 import collections
+import copy
 from utils.color_log_helper import print_warning_message
+from utils.cache_helper import get_cache_dir
 import json
 import os
 import ntpath
+import tempfile
+import threading
 
 
 class PresetException(Exception):
@@ -64,6 +68,12 @@ SMOOTH = 'smooth'
 
 # 3D specific attribute
 CUBE_SIZE = 'cube_size'
+# Shaper curve: 'log2' or a colorspace name. Lattice is sampled in the
+# shaped domain and the shaper is written as a pre-LUT (csp, 3dl, spi only).
+# See utils.shaper_helper
+SHAPER_CURVE = 'shaper_curve'
+# Number of pre-LUT samples (csp, spi)
+SHAPER_SIZE = 'shaper_size'
 
 # ascii specific attributes
 WRITE_INDEX = 'write_index'
@@ -158,6 +168,19 @@ def is_1d_or_2d_preset(preset):
     return False
 
 
+def get_samples_count(preset):
+    """ Return number of samples of a LUT (per channel for 1D / 2D LUTs)
+        Should be used after a check or complete
+
+    Returns:
+        .int
+
+    """
+    if is_3d_preset(preset):
+        return preset[CUBE_SIZE] ** 3
+    return 1 << preset[OUT_BITDEPTH]
+
+
 def is_int(arange):
     """ Check if a range is int
 
@@ -304,26 +327,261 @@ def get_env_items():
     return get_default_preset_path()
 
 
-def _check_and_load_preset(file_path, presets):
-    """ Check if the file is a json file and try to load a preset dict.
-    On success, resulting preset is added to presets.
-    On failure, presets remains untouched
+# Name of the on-disk preset index, in utils.cache_helper cache directory
+PRESET_INDEX_FILE = 'lut_presets_index.json'
+PRESET_EXT = '.json'
+
+
+def _get_stat(path):
+    """ Return modification time and size of a path
 
     Returns:
-        .dict {str, preset}
+        .[float, int] or None if path can't be accessed
 
     """
-    if not file_path.lower().endswith(".json"):
-        return presets
     try:
-        preset = read_preset(file_path)
-    except ValueError:
-        return presets
-    if preset is None or not isinstance(preset, dict):
-        return presets
-    file_name = os.path.splitext(ntpath.basename(file_path))[0]
-    presets[file_name] = preset
-    return presets
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+class PresetIndex(object):
+    """Index of the presets found in environment.
+    Directories are listed again only when their modification time changes,
+    and preset files are parsed again only when their modification time or
+    size changes. Preset names are known from the index, preset bodies are
+    read at first access.
+    Index is kept in process and, if a cache directory is set (see
+    utils.cache_helper), on disk for next processes.
+
+    """
+    def __init__(self, cache_dir=None):
+        """ Ctor
+
+        Kwargs:
+            cache_dir (str): on-disk index directory. Default is
+            utils.cache_helper cache directory
+
+        """
+        self._cache_dir = cache_dir
+        # directory -> [mtime, [json file names]]
+        self._dirs = {}
+        # file -> [mtime, size, is a preset]
+        self._files = {}
+        # file -> ([mtime, size], preset)
+        self._presets = {}
+        self._loaded = False
+        self._modified = False
+        self._lock = threading.Lock()
+
+    def _get_index_path(self):
+        """ Return on-disk index path
+
+        Returns:
+            .str or None if on-disk index is disabled
+
+        """
+        cache_dir = self._cache_dir or get_cache_dir()
+        if cache_dir is None:
+            return None
+        return os.path.join(cache_dir, PRESET_INDEX_FILE)
+
+    def _load(self):
+        """ Load on-disk index, once
+
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        index_path = self._get_index_path()
+        if index_path is None or not os.path.isfile(index_path):
+            return
+        try:
+            with open(index_path) as index_file:
+                index = json.load(index_file)
+        except (IOError, ValueError):
+            # corrupted index, built again
+            return
+        if not isinstance(index, dict) or index.get(VERSION) != __version__:
+            return
+        self._dirs.update(index.get('dirs', {}))
+        self._files.update(index.get('files', {}))
+
+    def _save(self):
+        """ Save on-disk index, atomically so that concurrent processes
+        never read a partial file
+
+        """
+        index_path = self._get_index_path()
+        if index_path is None:
+            return
+        directory = os.path.dirname(index_path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            handle, tmp_path = tempfile.mkstemp(suffix=PRESET_EXT,
+                                                dir=directory)
+            with os.fdopen(handle, 'w') as index_file:
+                json.dump({VERSION: __version__, 'dirs': self._dirs,
+                           'files': self._files}, index_file)
+            if os.name == 'nt' and os.path.exists(index_path):
+                os.remove(index_path)
+            os.rename(tmp_path, index_path)
+        except (IOError, OSError) as error:
+            # index is only an optimization
+            print_warning_message(("Preset index can't be saved: {0}"
+                                   ).format(error))
+
+    def _list_dir(self, directory):
+        """ Return json file names of a directory
+
+        Returns:
+            .[str]
+
+        """
+        stat = _get_stat(directory)
+        cached = self._dirs.get(directory)
+        if stat is not None and cached is not None and cached[0] == stat[0]:
+            return cached[1]
+        file_names = [file_name for file_name in os.listdir(directory)
+                      if file_name.lower().endswith(PRESET_EXT)]
+        self._dirs[directory] = [stat and stat[0], file_names]
+        self._modified = True
+        return file_names
+
+    def _is_preset(self, file_path):
+        """ Return True if a file is a json file containing a preset dict.
+        File is parsed only if it isn't indexed yet or if it changed.
+
+        Returns:
+            .bool
+
+        """
+        if not file_path.lower().endswith(PRESET_EXT):
+            return False
+        stat = _get_stat(file_path)
+        if stat is None or not os.path.isfile(file_path):
+            return False
+        cached = self._files.get(file_path)
+        if cached is not None and cached[:2] == stat:
+            return cached[2]
+        try:
+            preset = read_preset(file_path)
+        except ValueError:
+            preset = None
+        is_preset = preset is not None and isinstance(preset, dict)
+        if is_preset:
+            self._presets[file_path] = (stat, preset)
+        self._files[file_path] = stat + [is_preset]
+        self._modified = True
+        return is_preset
+
+    def get_paths(self):
+        """ Return preset file paths by preset name.
+        When several files have the same name, last one in environment
+        wins.
+
+        Returns:
+            .collections.OrderedDict {str, str}
+
+        """
+        with self._lock:
+            self._load()
+            paths = collections.OrderedDict()
+            for item in get_env_items().split(os.pathsep):
+                if os.path.isfile(item):
+                    file_paths = [item]
+                elif os.path.isdir(item):
+                    file_paths = [os.path.join(item, file_name)
+                                  for file_name in self._list_dir(item)]
+                else:
+                    continue
+                for file_path in file_paths:
+                    if self._is_preset(file_path):
+                        file_name = os.path.splitext(
+                            ntpath.basename(file_path))[0]
+                        paths[file_name] = file_path
+            if self._modified:
+                self._save()
+                self._modified = False
+            return paths
+
+    def get_names(self):
+        """ Return names of the presets found in environment, without
+        reading their content if the index is up to date
+
+        Returns:
+            .[str]
+
+        """
+        return self.get_paths().keys()
+
+    def get_preset(self, name, file_path=None):
+        """ Return a preset found in environment
+
+        Args:
+            name (str): preset name
+
+        Kwargs:
+            file_path (str): preset path, if already known
+
+        Returns:
+            .dict
+
+        """
+        if file_path is None:
+            paths = self.get_paths()
+            if name not in paths:
+                raise PresetException(("Unknown preset: {0}. Available: {1}"
+                                       ).format(name, sorted(paths)))
+            file_path = paths[name]
+        stat = _get_stat(file_path)
+        with self._lock:
+            cached = self._presets.get(file_path)
+        if cached is None or cached[0] != stat:
+            cached = (stat, read_preset(file_path))
+            with self._lock:
+                self._presets[file_path] = cached
+        # callers can modify their preset
+        return copy.deepcopy(cached[1])
+
+    def clear(self):
+        """ Forget in-process index. On-disk index is kept
+
+        """
+        with self._lock:
+            self._dirs.clear()
+            self._files.clear()
+            self._presets.clear()
+            self._loaded = False
+
+
+PRESET_INDEX = PresetIndex()
+
+
+def get_preset_names():
+    """ Return names of the presets found in environment.
+    See PresetIndex.
+
+    Returns:
+        .[str]
+
+    """
+    return PRESET_INDEX.get_names()
+
+
+def get_preset(name):
+    """ Return a preset found in environment
+
+    Args:
+        name (str): preset name
+
+    Returns:
+        .dict
+
+    """
+    return PRESET_INDEX.get_preset(name)
 
 
 def get_presets_from_env():
@@ -333,14 +591,5 @@ def get_presets_from_env():
         .dict {str, preset}
 
     """
-    items = get_env_items().split(os.pathsep)
-    presets = {}
-    for item in items:
-        if os.path.isfile(item):
-            presets = _check_and_load_preset(item, presets)
-        elif os.path.isdir(item):
-            for file_name in os.listdir(item):
-                file_path = os.path.join(item, file_name)
-                if os.path.isfile(file_path):
-                    presets = _check_and_load_preset(file_path, presets)
-    return presets
+    return dict((name, PRESET_INDEX.get_preset(name, file_path))
+                for name, file_path in PRESET_INDEX.get_paths().items())
@@ -7,6 +7,7 @@ __version__ = "0.4"
 import os
 import ntpath
 import math
+import numpy
 
 
 class LUTException(Exception):
@@ -19,6 +20,89 @@ class LUTException(Exception):
     pass
 
 
+# LUT formats read by OpenColorIO. Defined here so that they can be listed
+# without importing PyOpenColorIO (see utils.ocio_helper)
+OCIO_1D_LUTS_FORMATS = ['.csp', '.cub', '.cube', '.hdl', '.spi1d']
+
+OCIO_3D_LUTS_FORMATS = ['.3dl', '.csp', '.cub', '.cube', '.hdl', '.look',
+                        '.mga/m3d', '.spi3d', '.spimtx', '.vf']
+
+OCIO_LUTS_FORMATS = sorted(OCIO_1D_LUTS_FORMATS +
+                           list(set(OCIO_3D_LUTS_FORMATS) -
+                                set(OCIO_1D_LUTS_FORMATS)))
+
+
+def get_file_signature(filepath):
+    """Return a signature identifying a LUT file and its current content
+
+    Args:
+        filepath (str): path to a file
+
+    Returns:
+        .(str, float, int) absolute path, modification time and size.
+        Time and size are None if file can't be accessed.
+
+    """
+    abspath = os.path.abspath(filepath)
+    try:
+        stat = os.stat(abspath)
+    except OSError:
+        return (abspath, None, None)
+    return (abspath, stat.st_mtime, stat.st_size)
+
+
+# Attribute set on process functions that can process a whole numpy array of
+# RGB triplets in one call
+ARRAY_CAPABLE_ATTR = 'is_array_capable'
+
+
+def get_lut_list(lutfiles):
+    """Return LUT paths as a list
+
+    Args:
+        lutfiles (str, [str] or None): path to a LUT or list of LUT paths
+
+    Returns:
+        .[str]
+
+    """
+    if not lutfiles:
+        return []
+    if not isinstance(lutfiles, (list, tuple)):
+        return [lutfiles]
+    return list(lutfiles)
+
+
+def array_capable(function):
+    """ Flag a process function as able to process a (N, 3) numpy array of
+    RGB triplets at once and return a (N, 3) array.
+    Can be used as a decorator.
+
+    Args:
+        function (func): process function
+
+    Returns:
+        .func
+
+    """
+    setattr(function, ARRAY_CAPABLE_ATTR, True)
+    return function
+
+
+def is_array_capable(function):
+    """ Return True if function was flagged with array_capable.
+    Bound methods forward the lookup to their function.
+
+    Args:
+        function (func): process function
+
+    Returns:
+        .bool
+
+    """
+    return getattr(function, ARRAY_CAPABLE_ATTR, False)
+
+
 def check_arrays_length(array1, array2, array3):
     """ Check if the 3 arrays have the same length
 
@@ -86,37 +170,25 @@ def get_3d_list_values(cubesize, processor, hexa_values=False):
     TODO Use by plot_that_lut, to remove someday
 
     """
-    input_range = range(0, cubesize)
+    from utils.ocio_helper import get_process_function
     max_value = cubesize - 1.0
-    red_values = []
-    green_values = []
-    blue_values = []
-    input_colors = []
+    # lattice values between [0..1], blue is the slowest axis
+    blue, green, red = numpy.indices((cubesize, cubesize, cubesize))
+    in_values = numpy.column_stack((red.ravel(),
+                                    green.ravel(),
+                                    blue.ravel())) / max_value
+    # apply correction via OCIO
+    res = get_process_function(processor)(in_values)
+    # corresponding input colors
     if hexa_values:
         from matplotlib.colors import rgb2hex
-    # process color values
-    for blue in input_range:
-        for green in input_range:
-            for red in input_range:
-                # get a value between [0..1]
-                norm_r = red / max_value
-                norm_g = green / max_value
-                norm_b = blue / max_value
-                # apply correction via OCIO
-                res = processor.applyRGB([norm_r, norm_g, norm_b])
-                red_values.append(res[0])
-                green_values.append(res[1])
-                blue_values.append(res[2])
-                # append corresponding input color
-                if hexa_values:
-                    color = rgb2hex([norm_r, norm_g, norm_b])
-                else:
-                    color = [norm_r, norm_g, norm_b]
-                input_colors.append(color)
+        input_colors = [rgb2hex(color) for color in in_values.tolist()]
+    else:
+        input_colors = in_values.tolist()
     return {'cubesize': cubesize,
-            'red_values': red_values,
-            'green_values': green_values,
-            'blue_values': blue_values,
+            'red_values': res[:, 0].tolist(),
+            'green_values': res[:, 1].tolist(),
+            'blue_values': res[:, 2].tolist(),
             'input_colors': input_colors
             }
 
@@ -4,7 +4,7 @@
                   `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.2"
+__version__ = "0.3"
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
@@ -32,8 +32,20 @@ def set_matplotlib_backend():
         matplotlib.use('Qt4Agg')
 
 
+def set_compiled_gradation(enabled=True):
+    """Enable / disable compiled gradation of the colorspace of point colors.
+    See utils.colorspaces.AbstractColorspace.set_compiled_gradation
+
+    kwargs:
+        enabled (bool): enable compiled mode
+
+    """
+    sRGB.set_compiled_gradation(enabled)
+
+
 def get_matplotlib_color(x, y):
-    R, G, B = coh.xy_to_RGB([x, y], sRGB, clamp=True)
+    # numpy values go through compiled gradation if enabled
+    R, G, B = coh.xy_to_RGB(np.array([x, y], dtype=float), sRGB, clamp=True)
     return (R, G, B)
 
 
@@ -142,17 +154,10 @@ def plot_spectrum_locus_76():
     """
     # Load CIE 1931 data
     x_list, y_list = load_xy_from_file(SPECTRUM_LOCUS_31)
-    up_list = []
-    vp_list = []
     # Convert data from xy to u'v"
-    for x, y in zip(x_list, y_list):
-        up, vp = coh.xy_to_upvp([x, y])
-        up_list.append(up)
-        vp_list.append(vp)
-    up_list = np.array(up_list)
-    vp_list = np.array(vp_list)
+    upvp = coh.xy_to_upvp(np.column_stack((x_list, y_list)))
     # Plot resulting data
-    plot_spectrum_locus(up_list, vp_list, "spectrum locus CIE1976")
+    plot_spectrum_locus(upvp[:, 0], upvp[:, 1], "spectrum locus CIE1976")
 
 
 def plot_colorspace_gamut(colorspace, color=None, draw_lines=True,
@@ -3,7 +3,22 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.1"
+__version__ = "0.2"
+import numpy
+
+
+class MatrixHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# spimtx offsets are 16 bits int values
+SPIMTX_OFFSET_SCALE = 65535.0
 
 
 def matrix_to_string(matrix, red_offset=None, green_offset=None, blue_offset=None):
@@ -51,3 +66,24 @@ def write_spimtx(matrix, file_path, red_offset=0, green_offset=0, blue_offset=0)
     f = open(file_path, 'w+')
     f.write(matrix_to_spimtx_string(matrix, red_offset, green_offset, blue_offset))
     f.close()
+
+
+def read_spimtx(file_path):
+    """Read a spimtx file
+
+    Args:
+        file_path (str): path to a spimtx file
+
+    Returns:
+        .numpy.array (3x3) matrix, numpy.array (3,) offsets normalized
+        between 0 and 1
+
+    """
+    with open(file_path) as spimtx:
+        values = numpy.array(spimtx.read().split(), dtype=float)
+    if values.size != 12:
+        raise MatrixHelperException(("A spimtx must contain 12 values, "
+                                     "found {0}: {1}").format(values.size,
+                                                              file_path))
+    values = values.reshape(3, 4)
+    return values[:, :3], values[:, 3] / SPIMTX_OFFSET_SCALE
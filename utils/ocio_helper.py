@@ -3,31 +3,144 @@
 .. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
 
 """
-__version__ = "0.1"
+__version__ = "0.7"
 import os
+import threading
+import numpy
 # import OpenColorIO
 from PyOpenColorIO import (
-    Config, ColorSpace, FileTransform, GroupTransform,
+    ClearAllCaches, Config, ColorSpace, FileTransform, GroupTransform,
 )
 from PyOpenColorIO.Constants import (
     INTERP_LINEAR,
     COLORSPACE_DIR_TO_REFERENCE,
     TRANSFORM_DIR_FORWARD, TRANSFORM_DIR_INVERSE,
 )
+from utils.cache_helper import LRUCache
+from utils.lut_utils import (array_capable, get_file_signature,
+                             get_lut_list, OCIO_1D_LUTS_FORMATS,
+                             OCIO_3D_LUTS_FORMATS, OCIO_LUTS_FORMATS)
+from utils.profile_helper import PROFILER
 
-OCIO_1D_LUTS_FORMATS = ['.csp', '.cub', '.cube', '.hdl', '.spi1d']
 
-OCIO_3D_LUTS_FORMATS = ['.3dl', '.csp', '.cub', '.cube', '.hdl', '.look',
-                        '.mga/m3d', '.spi3d', '.spimtx', '.vf']
+class OCIOHelperException(Exception):
+    """Module custom exception
 
-OCIO_LUTS_FORMATS = sorted(OCIO_1D_LUTS_FORMATS +
-                           list(set(OCIO_3D_LUTS_FORMATS) -
-                                set(OCIO_1D_LUTS_FORMATS)))
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Max number of RGB triplets processed in one native call
+DEFAULT_CHUNK_SIZE = 65536
+
+# Max number of processors kept by the processor cache
+DEFAULT_PROCESSOR_CACHE_CAPACITY = 32
+
+
+class ProcessorCache(LRUCache):
+    """Thread safe LRU cache of OpenColorIO processors.
+    Processors are keyed by their LUT chain: file paths, modification times
+    and sizes, interpolation, direction and pre / post LUTs. A modified LUT
+    file gets a new key, so its previous processor is never returned.
+
+    """
+    def __init__(self, capacity=DEFAULT_PROCESSOR_CACHE_CAPACITY):
+        """ Ctor
+
+        Kwargs:
+            capacity (int): max number of cached processors. 0 disables the
+            cache
+
+        """
+        super(ProcessorCache, self).__init__(capacity)
+
+    @staticmethod
+    def get_key(lutfiles, interpolation, inverse, prelutfile=None,
+                postlutfile=None):
+        """Return cache key of a LUT chain
+
+        Args:
+            lutfiles ([str]): list of LUT paths
+
+            interpolation (int): OpenColorIO interpolation
+
+            inverse (bool): inverse direction
+
+        Kwargs:
+            prelutfile (str or [str]): path to a pre LUT or list of pre LUT
+            paths
+
+            postlutfile (str or [str]): path to a post LUT or list of post
+            LUT paths
+
+        Returns:
+            .tuple
+
+        """
+        return (tuple(get_file_signature(lutfile) for lutfile in lutfiles),
+                interpolation, bool(inverse),
+                tuple(get_file_signature(lutfile)
+                      for lutfile in get_lut_list(prelutfile)),
+                tuple(get_file_signature(lutfile)
+                      for lutfile in get_lut_list(postlutfile)))
+
+    def invalidate(self, filepath):
+        """Drop every processor using a LUT file
+
+        Args:
+            filepath (str): path to a LUT, a pre LUT or a post LUT
+
+        Returns:
+            .int number of dropped processors
+
+        """
+        abspath = os.path.abspath(filepath)
+        return self.discard(
+            lambda key: abspath in [signature[0] for signature in
+                                    key[0] + key[3] + key[4]])
+
+
+PROCESSOR_CACHE = ProcessorCache()
+
+# Signatures of LUT files when OpenColorIO last parsed them, by absolute path
+_PARSED_SIGNATURES = {}
+_PARSED_SIGNATURES_LOCK = threading.Lock()
+
+
+def _clear_changed_ocio_caches(filepaths):
+    """Clear OpenColorIO caches if one of filepaths changed since OpenColorIO
+    parsed it. OpenColorIO 1.x keeps parsed LUT files keyed by path only: a
+    modified LUT would else be read from its stale parsed content.
+
+    Args:
+        filepaths ([str]): LUT paths about to be parsed
+
+    Returns:
+        .bool True if caches were cleared
+
+    """
+    changed = False
+    with _PARSED_SIGNATURES_LOCK:
+        for filepath in filepaths:
+            signature = get_file_signature(filepath)
+            previous = _PARSED_SIGNATURES.get(signature[0])
+            if previous is not None and previous != signature:
+                changed = True
+            _PARSED_SIGNATURES[signature[0]] = signature
+        if changed:
+            PROFILER.count('ocio.clear_caches')
+            ClearAllCaches()
+    return changed
 
 
 def create_ocio_processor(lutfiles, interpolation=INTERP_LINEAR, inverse=False,
-                          prelutfile=None, postlutfile=None):
-    """Create an OpenColorIO processor for lutfile
+                          prelutfile=None, postlutfile=None, use_cache=True):
+    """Create an OpenColorIO processor for lutfile.
+    Processors are shared through PROCESSOR_CACHE: the same LUT chain isn't
+    parsed twice unless one of its files changed.
 
     Args:
         lutfiles (str or [str]): path to a LUT or list of LUT paths
@@ -38,14 +151,62 @@ def create_ocio_processor(lutfiles, interpolation=INTERP_LINEAR, inverse=False,
         inverse (bool): get an inverse direction processor
 
     Kwargs:
-        prelutfile (str): path to a pre LUT
+        prelutfile (str or [str]): path to a pre LUT or list of pre LUT
+        paths. Pre LUTs are never inverted
 
-        postlutfile (str): path to a post LUT
+        postlutfile (str or [str]): path to a post LUT or list of post LUT
+        paths. Post LUTs are never inverted
+
+        use_cache (bool): if False, always build a new processor
 
     Returns:
         PyOpenColorIO.config.Processor.
 
     """
+    if not isinstance(lutfiles, (list, tuple)):
+        lutfiles = [lutfiles]
+    if not use_cache:
+        with PROFILER.stage('ocio.create_processor'):
+            return _build_ocio_processor(lutfiles, interpolation, inverse,
+                                         prelutfile, postlutfile)
+    key = PROCESSOR_CACHE.get_key(lutfiles, interpolation, inverse,
+                                  prelutfile, postlutfile)
+    processor = PROCESSOR_CACHE.get(key)
+    if processor is None:
+        PROFILER.count('ocio.processor_cache_miss')
+        with PROFILER.stage('ocio.create_processor'):
+            processor = _build_ocio_processor(lutfiles, interpolation,
+                                              inverse, prelutfile,
+                                              postlutfile)
+        PROCESSOR_CACHE.put(key, processor)
+    else:
+        PROFILER.count('ocio.processor_cache_hit')
+    return processor
+
+
+def _build_ocio_processor(lutfiles, interpolation, inverse, prelutfile,
+                          postlutfile):
+    """Build an OpenColorIO processor for lutfile. See create_ocio_processor
+
+    Args:
+        lutfiles ([str]): list of LUT paths
+
+        interpolation (int): can be INTERP_NEAREST, INTERP_LINEAR or
+        INTERP_TETRAHEDRAL (only for 3D LUT)
+
+        inverse (bool): get an inverse direction processor
+
+        prelutfile (str or [str]): pre LUT(s)
+
+        postlutfile (str or [str]): post LUT(s)
+
+    Returns:
+        PyOpenColorIO.config.Processor.
+
+    """
+    prelutfiles = get_lut_list(prelutfile)
+    postlutfiles = get_lut_list(postlutfile)
+    _clear_changed_ocio_caches(prelutfiles + list(lutfiles) + postlutfiles)
     if inverse:
         direction = TRANSFORM_DIR_INVERSE
     else:
@@ -54,19 +215,17 @@ def create_ocio_processor(lutfiles, interpolation=INTERP_LINEAR, inverse=False,
     # In colorspace (LUT)
     colorspace = ColorSpace(name='RawInput')
     group = GroupTransform()
-    # Prelut
-    if prelutfile:
+    # Preluts
+    for prelutfile in prelutfiles:
         prelut = FileTransform(prelutfile, interpolation=interpolation)
         group.push_back(prelut)
     # Mainlut
-    if not isinstance(lutfiles, (list, tuple)):
-        lutfiles = [lutfiles]
     for lutfile in lutfiles:
         main_lut = FileTransform(lutfile, interpolation=interpolation,
                                  direction=direction)
         group.push_back(main_lut)
-    # Postlut
-    if postlutfile:
+    # Postluts
+    for postlutfile in postlutfiles:
         postlut = FileTransform(postlutfile, interpolation=interpolation)
         group.push_back(postlut)
     colorspace.setTransform(group, COLORSPACE_DIR_TO_REFERENCE)
@@ -80,11 +239,13 @@ def create_ocio_processor(lutfiles, interpolation=INTERP_LINEAR, inverse=False,
     except Exception, e:
         # tetrahedral interpolation is only allowed with 3D LUT
         # TODO set interpo mode by LUT
+        # Linear processor goes through the cache too: it's the one already
+        # built to probe LUT type
         if "tetrahedral interpolation is not allowed" in str(e):
             return create_ocio_processor(lutfiles, interpolation=INTERP_LINEAR,
                                          inverse=inverse,
-                                         prelutfile=prelutfile,
-                                         postlutfile=postlutfile)
+                                         prelutfile=prelutfiles,
+                                         postlutfile=postlutfiles)
         raise
 
 
@@ -102,3 +263,76 @@ def is_3d_lut(processor, lutfile):
     """
     fileext = os.path.splitext(lutfile)[1]
     return processor.hasChannelCrosstalk() or fileext == '.spimtx'
+
+
+@array_capable
+class OCIOBatchProcessor(object):
+    """Array capable process function wrapping an OpenColorIO processor.
+    RGB triplets are packed in a flat float buffer and processed by chunks,
+    each chunk in one native call (applyRGB accepts a packed RGB buffer of
+    any length and processes it as a packed image).
+    Chunking keeps the temporary buffers memory bounded.
+
+    """
+    def __init__(self, processor, chunk_size=DEFAULT_CHUNK_SIZE):
+        """ Ctor
+
+        Args:
+            processor (PyOpenColorIO.config.Processor): OpenColorIO processor
+
+        Kwargs:
+            chunk_size (int): max number of RGB triplets processed in one
+            native call
+
+        """
+        self.processor = processor
+        self.chunk_size = chunk_size
+
+    def __call__(self, values):
+        """Process RGB values
+
+        Args:
+            values ([float, float, float] or numpy.array): a RGB triplet or
+            a float32 / float64 array of RGB triplets. Ex: a flat buffer
+            [r, g, b, r, g, b...] or a (N, 3) array.
+
+        Returns:
+            .[float, float, float] or numpy.array of the same shape than
+            values (float32 array stays float32, float64 otherwise)
+
+        """
+        if not isinstance(values, numpy.ndarray):
+            return self.processor.applyRGB(values)
+        if values.dtype == numpy.float32:
+            dtype = numpy.float32
+        else:
+            dtype = numpy.float64
+        flat_values = values.reshape(-1)
+        if flat_values.size % 3:
+            raise OCIOHelperException(("RGB buffer size must be a multiple "
+                                       "of 3: {0}").format(flat_values.size))
+        res = numpy.empty(flat_values.shape, dtype=dtype)
+        chunk_size = self.chunk_size * 3
+        for start in range(0, flat_values.size, chunk_size):
+            chunk = flat_values[start:start + chunk_size]
+            res[start:start + chunk_size] = self.processor.applyRGB(
+                chunk.tolist())
+        return res.reshape(values.shape)
+
+
+def get_process_function(processor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return an array capable process function for an OpenColorIO processor.
+    To be used instead of processor.applyRGB.
+
+    Args:
+        processor (PyOpenColorIO.config.Processor): OpenColorIO processor
+
+    Kwargs:
+        chunk_size (int): max number of RGB triplets processed in one native
+        call
+
+    Returns:
+        .OCIOBatchProcessor
+
+    """
+    return OCIOBatchProcessor(processor, chunk_size)
@@ -0,0 +1,297 @@
+""" Timing of LUT export stages
+
+Hot paths (OpenColorIO processor creation, sampling, smoothing, formatting,
+disk I/O) are wrapped in PROFILER stages. Disabled PROFILER costs an
+attribute test per stage.
+
+    with PROFILER.stage('sample.3d', samples=len(values)):
+        data = process_function(values)
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.1"
+import json
+import os
+import threading
+import timeit
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class ProfileHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Separator of nested stage names. Ex: export/sample.3d
+STAGE_SEPARATOR = '/'
+
+
+class _NullStage(object):
+    """ Stage of a disabled profiler: does nothing
+
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    """ Timed stage of an enabled profiler
+
+    """
+    def __init__(self, profiler, name, samples):
+        self.profiler = profiler
+        self.name = name
+        self.samples = samples
+        self.path = None
+        self.start = None
+
+    def __enter__(self):
+        self.path = self.profiler._push(self.name)
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *args):
+        duration = timeit.default_timer() - self.start
+        self.profiler._pop(self.path, self.start, duration, self.samples)
+        return False
+
+
+class Profiler(object):
+    """ Stage timings and counters.
+    Stages can be nested: a stage is reported with its parent ones.
+    Times of a stage include its nested stages.
+
+    """
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = None
+        self._stages = OrderedDict()
+        self._counters = OrderedDict()
+        self._events = []
+
+    def enable(self):
+        """ Clear previous timings and start recording
+
+        """
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        """ Stop recording. Timings are kept
+
+        """
+        self.enabled = False
+
+    def is_enabled(self):
+        """ Return True if timings are recorded
+
+        Returns:
+            .bool
+
+        """
+        return self.enabled
+
+    def reset(self):
+        """ Clear timings, counters and trace events
+
+        """
+        with self._lock:
+            self._origin = timeit.default_timer()
+            self._stages.clear()
+            self._counters.clear()
+            del self._events[:]
+
+    def stage(self, name, samples=None):
+        """ Return a context manager timing a stage
+
+        Args:
+            name (str): stage name. Ex: 'sample.3d'
+
+        Kwargs:
+            samples (int): number of samples processed by the stage
+
+        Returns:
+            .context manager
+
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, samples)
+
+    def count(self, name, value=1):
+        """ Increment a counter
+
+        Args:
+            name (str): counter name. Ex: 'ocio.processor_cache_hit'
+
+        Kwargs:
+            value (int): increment
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _get_stack(self):
+        """ Return stage names of the current thread
+
+        Returns:
+            .[str]
+
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, name):
+        """ Enter a stage
+
+        Args:
+            name (str): stage name
+
+        Returns:
+            .str stage path
+
+        """
+        stack = self._get_stack()
+        stack.append(name)
+        path = STAGE_SEPARATOR.join(stack)
+        with self._lock:
+            # stages are reported in first entry order: parents first
+            if path not in self._stages:
+                self._stages[path] = {'calls': 0, 'duration': 0.0,
+                                      'samples': 0}
+        return path
+
+    def _pop(self, path, start, duration, samples):
+        """ Exit a stage and record its timing
+
+        Args:
+            path (str): stage path
+
+            start (float): start time
+
+            duration (float): seconds
+
+            samples (int): processed samples or None
+
+        """
+        self._get_stack().pop()
+        with self._lock:
+            stats = self._stages[path]
+            stats['calls'] += 1
+            stats['duration'] += duration
+            stats['samples'] += samples or 0
+            self._events.append({'stage': path,
+                                 'start': start - self._origin,
+                                 'duration': duration,
+                                 'samples': samples})
+
+    def get_stats(self):
+        """ Return timings per stage, in first call order, and counters
+
+        Returns:
+            .dict {'stages': {path: {'calls', 'duration' (s), 'samples',
+            'throughput' (samples/s or None)}}, 'counters': {name: int}}
+
+        """
+        with self._lock:
+            stages = OrderedDict()
+            for path, stats in self._stages.items():
+                stats = dict(stats)
+                stats['throughput'] = None
+                if stats['samples'] and stats['duration'] > 0:
+                    stats['throughput'] = stats['samples'] / stats['duration']
+                stages[path] = stats
+            return {'stages': stages, 'counters': OrderedDict(self._counters)}
+
+    def format_report(self):
+        """ Return a per-stage breakdown. Nested stages are indented
+
+        Returns:
+            .str
+
+        """
+        stats = self.get_stats()
+        lines = ["{0:<36} {1:>6} {2:>10} {3:>12}".format(
+            "Stage", "Calls", "Time (s)", "Samples/s")]
+        for path, stage in stats['stages'].items():
+            names = path.split(STAGE_SEPARATOR)
+            name = "  " * (len(names) - 1) + names[-1]
+            throughput = ""
+            if stage['throughput']:
+                throughput = "{0:.4g}".format(stage['throughput'])
+            lines.append("{0:<36} {1:>6} {2:>10.4f} {3:>12}".format(
+                name, stage['calls'], stage['duration'], throughput))
+        for name, value in stats['counters'].items():
+            lines.append("{0:<36} {1:>6}".format(name, value))
+        return "\n".join(lines)
+
+    def write_trace(self, file_path, **info):
+        """ Write timings, counters and every stage event as JSON
+
+        Args:
+            file_path (str): path to a .json file
+
+        Kwargs:
+            info: extra items of the trace. Ex: tool name, arguments
+
+        """
+        trace = dict(info)
+        trace.update(self.get_stats())
+        with self._lock:
+            trace['events'] = list(self._events)
+        try:
+            with open(file_path, 'w') as trace_file:
+                json.dump(trace, trace_file, indent=2)
+        except IOError as error:
+            raise ProfileHelperException(("Can't write profile trace {0}: {1}"
+                                          ).format(file_path, error))
+
+
+PROFILER = Profiler()
+
+
+@contextmanager
+def profile_run(enabled=True, trace_file=None, **info):
+    """ Profile a block, then print its breakdown and write its trace.
+    Does nothing if disabled.
+
+    Kwargs:
+        enabled (bool): profile the block
+
+        trace_file (str): path to a JSON trace, or None
+
+        info: extra items of the trace. See Profiler.write_trace
+
+    """
+    if not enabled:
+        yield PROFILER
+        return
+    PROFILER.enable()
+    try:
+        with PROFILER.stage('total'):
+            yield PROFILER
+    finally:
+        PROFILER.disable()
+        print PROFILER.format_report()
+        if trace_file:
+            info.setdefault('pid', os.getpid())
+            PROFILER.write_trace(trace_file, **info)
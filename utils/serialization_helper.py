@@ -0,0 +1,162 @@
+""" Bulk text serialization and atomic writing of LUTs
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.3"
+import os
+import re
+import stat
+import tempfile
+from contextlib import contextmanager
+import numpy
+from utils.profile_helper import PROFILER
+
+
+class SerializationHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+# Number of rows formatted and written at once
+DEFAULT_CHUNK_ROWS = 8192
+
+# Output file buffer size (bytes)
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Suffix of files being written. See atomic_write
+TMP_SUFFIX = '.tmp'
+
+# str.format replacement field. Ex: {0}, {1:.6f}
+FORMAT_FIELD = re.compile(r"\{(\d+)(?::([^{}]*))?\}")
+
+
+def to_percent_format(pattern):
+    """ Convert a str.format line pattern into an equivalent %-format.
+    %-format is applied to a whole chunk of rows at once.
+    Ex: "{0:.6f} {1:.6f} {2:.6f}\n" --> "%.6f %.6f %.6f\n"
+
+    Args:
+        pattern (str): pattern with ordered replacement fields
+
+    Returns:
+        .str
+
+    """
+    result = ""
+    position = 0
+    index = 0
+    for match in FORMAT_FIELD.finditer(pattern):
+        if int(match.group(1)) != index:
+            raise SerializationHelperException(("Replacement fields must "
+                                                "be ordered: {0}"
+                                                ).format(pattern))
+        result += pattern[position:match.start()].replace('%', '%%')
+        # empty spec is str.format default: str(value)
+        result += "%{0}".format(match.group(2) or 's')
+        position = match.end()
+        index += 1
+    return result + pattern[position:].replace('%', '%%')
+
+
+def _get_file_mode(file_path):
+    """ Return permissions of a written file: the ones of the file it
+    replaces or the default ones (considering umask)
+
+    Args:
+        file_path (str): final file path
+
+    Returns:
+        .int
+
+    """
+    try:
+        return stat.S_IMODE(os.stat(file_path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0666 & ~umask
+
+
+@contextmanager
+def atomic_write(file_path):
+    """ Open a temporary file in the destination directory, with a large
+    write buffer.
+    When the with block succeeds, the file is synced to disk and renamed to
+    file_path, so a reader never gets a partially written LUT. On error, the
+    temporary file is removed and file_path is left untouched.
+
+    Args:
+        file_path (str): out LUT path
+
+    Returns:
+        .file
+
+    """
+    file_path = os.path.abspath(file_path)
+    directory, basename = os.path.split(file_path)
+    handle, tmp_path = tempfile.mkstemp(prefix=".{0}.".format(basename),
+                                        suffix=TMP_SUFFIX, dir=directory)
+    try:
+        with os.fdopen(handle, 'w+', WRITE_BUFFER_SIZE) as lutfile:
+            yield lutfile
+            with PROFILER.stage('io.sync'):
+                lutfile.flush()
+                os.fsync(lutfile.fileno())
+        with PROFILER.stage('io.rename'):
+            os.chmod(tmp_path, _get_file_mode(file_path))
+            if os.name == 'nt' and os.path.exists(file_path):
+                # rename doesn't replace an existing file on Windows
+                os.remove(file_path)
+            os.rename(tmp_path, file_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def format_rows(row_format, rows):
+    """ Format rows of values
+
+    Args:
+        row_format (str): %-format of a row. See to_percent_format
+
+        rows (numpy.array): (N, k) or (N,) values. k must match the number
+        of row_format fields
+
+    Returns:
+        .str
+
+    """
+    rows = numpy.asarray(rows)
+    # python scalars are formatted exactly as str.format does
+    return (row_format * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def write_rows(lutfile, row_format, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """ Write rows of values by chunks, one write per chunk
+
+    Args:
+        lutfile (file): output file
+
+        row_format (str): %-format of a row. See to_percent_format
+
+        rows (numpy.array): (N, k) or (N,) values. k must match the number
+        of row_format fields
+
+    Kwargs:
+        chunk_rows (int): number of rows formatted and written at once
+
+    """
+    rows = numpy.asarray(rows)
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        with PROFILER.stage('format', len(chunk)):
+            text = format_rows(row_format, chunk)
+        with PROFILER.stage('io.write'):
+            lutfile.write(text)
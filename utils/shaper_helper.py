@@ -0,0 +1,315 @@
+""" Shaper (1D pre-LUT) curves of 3D LUT exports
+
+A shaper maps input values to the lattice domain before the 3D LUT. With a
+log-like shaper, a small cube sampled in the shaped domain reaches the
+accuracy of a much bigger cube sampled uniformly, for log or scene linear /
+HDR inputs.
+
+.. moduleauthor:: `Marie FETIVEAU <github.com/mfe>`_
+
+"""
+__version__ = "0.1"
+import math
+import numpy
+from utils import lut_presets as presets
+from utils.lut_model import Lut1D, Lut3D, get_preset_samples
+
+
+class ShaperHelperException(Exception):
+    """Module custom exception
+
+    Args:
+        Exception
+
+    """
+    pass
+
+
+LOG2_SHAPER = 'log2'
+# Dynamic range of log2 shaper (in stops)
+DEFAULT_LOG2_STOPS = 16
+# Default pre-LUT size (csp, spi)
+DEFAULT_SHAPER_SIZE = 1024
+# Number of test values per axis used to measure LUT accuracy
+ACCURACY_SAMPLES = 32
+
+
+class Log2Shaper(object):
+    """ Log2 curve over an input range, with an offset so that range min
+    is encoded as 0: f(x) = log2(1 + t * (2^stops - 1)) / stops, with
+    t = (x - min) / (max - min)
+
+    """
+    def __init__(self, input_range, stops=DEFAULT_LOG2_STOPS):
+        """ Ctor
+
+        Args:
+            input_range ([float, float]): values encoded as 0 and 1
+
+        Kwargs:
+            stops (int): dynamic range of the log part
+
+        """
+        self.input_range = input_range
+        self.stops = stops
+        self.scale = pow(2.0, stops) - 1
+
+    def encode_gradation(self, values):
+        """ Input values to shaped domain
+
+        Args:
+            values (numpy.array): values to transform
+
+        Returns:
+            .numpy.array
+
+        """
+        values = ((numpy.asarray(values, dtype=float) - self.input_range[0])
+                  / (self.input_range[1] - self.input_range[0]))
+        return (numpy.log2(1 + numpy.maximum(values, 0) * self.scale)
+                / self.stops)
+
+    def decode_gradation(self, values):
+        """ Shaped domain to input values
+
+        Args:
+            values (numpy.array): values to transform
+
+        Returns:
+            .numpy.array
+
+        """
+        values = ((numpy.power(2.0, numpy.asarray(values, dtype=float)
+                               * self.stops) - 1) / self.scale)
+        return (self.input_range[0]
+                + values * (self.input_range[1] - self.input_range[0]))
+
+
+class GradationShaper(object):
+    """ Colorspace gradation curve over an input range, rescaled so that
+    range min / max are encoded as 0 / 1
+
+    """
+    def __init__(self, colorspace, input_range):
+        """ Ctor
+
+        Args:
+            colorspace (utils.colorspaces.AbstractColorspace): colorspace
+            whose encode_gradation is the shaper curve
+
+            input_range ([float, float]): values encoded as 0 and 1
+
+        """
+        self.colorspace = colorspace
+        self.input_range = input_range
+        self.encoded_range = colorspace.encode_gradation(
+            numpy.array(input_range, dtype=float))
+
+    def encode_gradation(self, values):
+        """ Input values to shaped domain
+
+        Args:
+            values (numpy.array): values to transform
+
+        Returns:
+            .numpy.array
+
+        """
+        values = self.colorspace.encode_gradation(
+            numpy.asarray(values, dtype=float))
+        return ((values - self.encoded_range[0])
+                / (self.encoded_range[1] - self.encoded_range[0]))
+
+    def decode_gradation(self, values):
+        """ Shaped domain to input values
+
+        Args:
+            values (numpy.array): values to transform
+
+        Returns:
+            .numpy.array
+
+        """
+        values = (self.encoded_range[0]
+                  + numpy.asarray(values, dtype=float)
+                  * (self.encoded_range[1] - self.encoded_range[0]))
+        return self.colorspace.decode_gradation(values)
+
+
+def get_shaper(preset):
+    """ Return preset shaper. Shaper maps the input values of the first and
+    last lattice samples to 0 and 1.
+
+    Args:
+        preset (dict): lut generic and sampling informations
+
+    Returns:
+        .Log2Shaper or GradationShaper, None if preset has no shaper
+
+    """
+    name = preset.get(presets.SHAPER_CURVE)
+    if not name:
+        return None
+    if not presets.is_3d_preset(preset):
+        raise ShaperHelperException("Shaper can only be used in 3D export")
+    input_range = get_preset_samples(preset)[[0, -1]].tolist()
+    if name == LOG2_SHAPER:
+        return Log2Shaper(input_range)
+    from utils.colorspaces import COLORSPACES
+    from utils.private_colorspaces import PRIVATE_COLORSPACES
+    colorspace = COLORSPACES.get(name) or PRIVATE_COLORSPACES.get(name)
+    if colorspace is None:
+        raise ShaperHelperException(("Unknown shaper curve: {0}. Expected "
+                                     "'{1}' or a colorspace name"
+                                     ).format(name, LOG2_SHAPER))
+    return GradationShaper(colorspace, input_range)
+
+
+def get_shaper_size(preset):
+    """ Return number of pre-LUT samples
+
+    Args:
+        preset (dict): lut generic and sampling informations
+
+    Returns:
+        .int
+
+    """
+    return preset.get(presets.SHAPER_SIZE) or DEFAULT_SHAPER_SIZE
+
+
+def get_prelut(shaper, cube_size, size=DEFAULT_SHAPER_SIZE):
+    """ Return pre-LUT samples, uniformly distributed in the shaped domain.
+    Lattice points are pre-LUT samples, so the pre-LUT maps them exactly.
+
+    Args:
+        shaper (Log2Shaper or GradationShaper): shaper curve
+
+        cube_size (int): cube size
+
+    Kwargs:
+        size (int): min number of samples
+
+    Returns:
+        .numpy.array input values, numpy.array shaped values
+
+    """
+    # every step-th pre-LUT sample is a lattice sample
+    step = max(1, int(math.ceil((size - 1) / float(cube_size - 1))))
+    shaped = numpy.linspace(0.0, 1.0, step * (cube_size - 1) + 1)
+    return shaper.decode_gradation(shaped), shaped
+
+
+def get_lattice_positions(shaper, cube_size):
+    """ Return input values of the lattice samples on each axis
+
+    Args:
+        shaper (Log2Shaper or GradationShaper): shaper curve
+
+        cube_size (int): cube size
+
+    Returns:
+        .numpy.array
+
+    """
+    return shaper.decode_gradation(numpy.linspace(0.0, 1.0, cube_size))
+
+
+def __get_lattice_errors(process_function, positions, shaper_lut, values,
+                         ref):
+    """ Return max error of a lattice sampled at positions
+
+    Args:
+        process_function (func): process function
+
+        positions (numpy.array): input values of lattice samples
+
+        shaper_lut (Lut1D): shaper or None
+
+        values (numpy.array): (N, 3) test values
+
+        ref (numpy.array): (N, 3) processed test values
+
+    Returns:
+        .float
+
+    """
+    # abstract_lut_helper imports this module
+    from utils.abstract_lut_helper import AbstractLUTHelper
+    cube_size = len(positions)
+    red, green, blue = numpy.meshgrid(positions, positions, positions,
+                                      indexing='ij')
+    lattice = numpy.column_stack((red.ravel(), green.ravel(), blue.ravel()))
+    table = AbstractLUTHelper._process_values(process_function, lattice)
+    table = table.reshape(cube_size, cube_size, cube_size, 3)
+    if shaper_lut is None:
+        lut = Lut3D(table, domain=[positions[0], positions[-1]],
+                    dtype=numpy.float64)
+    else:
+        lut = Lut3D(table, shaper=shaper_lut, dtype=numpy.float64)
+    return float(numpy.abs(lut(values) - ref).max())
+
+
+def get_accuracy_report(process_function, preset):
+    """ Measure max error of the shaped cube of a preset and of uniform
+    cubes, and return the uniform cube size reaching the shaped cube
+    accuracy.
+    Errors are measured on test values uniformly distributed in both input
+    and shaped domains. Pre-LUT is the csp / spi one, so 3dl errors are
+    estimates.
+
+    Args:
+        process_function (func): could be a processor.applyRGB
+        (PyOpenColorIO.config.Processor) or a function that took a range
+        of values and return the modified values. Ex: a
+        SharedProcessFunction
+
+        preset (dict): lut generic and sampling informations, with a shaper
+
+    Returns:
+        .str
+
+    """
+    # abstract_lut_helper imports this module
+    from utils.abstract_lut_helper import AbstractLUTHelper
+    shaper = get_shaper(preset)
+    if shaper is None:
+        raise ShaperHelperException("Preset has no shaper")
+    cube_size = preset[presets.CUBE_SIZE]
+    input_range = shaper.input_range
+    axis = numpy.union1d(numpy.linspace(input_range[0], input_range[1],
+                                        ACCURACY_SAMPLES),
+                         get_lattice_positions(shaper, ACCURACY_SAMPLES))
+    red, green, blue = numpy.meshgrid(axis, axis, axis, indexing='ij')
+    values = numpy.column_stack((red.ravel(), green.ravel(), blue.ravel()))
+    ref = AbstractLUTHelper._process_values(process_function, values)
+    positions, shaped = get_prelut(shaper, cube_size)
+    shaper_lut = Lut1D(shaped, positions=positions, dtype=numpy.float64)
+    shaped_error = __get_lattice_errors(process_function,
+                                        get_lattice_positions(shaper,
+                                                              cube_size),
+                                        shaper_lut, values, ref)
+    report = ["Shaped {0}^3 cube max error: {1:.3g}".format(cube_size,
+                                                            shaped_error)]
+    equivalent_size = None
+    size = cube_size
+    while size <= presets.CUBE_SIZE_MAX_VALUE and equivalent_size is None:
+        error = __get_lattice_errors(process_function,
+                                     numpy.linspace(input_range[0],
+                                                    input_range[1], size),
+                                     None, values, ref)
+        report.append("Uniform {0}^3 cube max error: {1:.3g}".format(size,
+                                                                     error))
+        if error <= shaped_error:
+            equivalent_size = size
+        size = 2 * (size - 1) + 1
+    if equivalent_size is None:
+        report.append(("Shaped {0}^3 cube is more accurate than the biggest"
+                       " uniform cube").format(cube_size))
+    else:
+        report.append(("Shaped {0}^3 cube is as accurate as a uniform {1}^3"
+                       " cube ({2:.1f}x less samples)"
+                       ).format(cube_size, equivalent_size,
+                                math.pow(float(equivalent_size) / cube_size,
+                                         3)))
+    return "\n".join(report)
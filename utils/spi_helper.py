@@ -7,7 +7,13 @@ __version__ = "0.2"
 from utils.abstract_lut_helper import AbstractLUTHelper
 from utils import lut_presets as presets
 from utils.color_log_helper import print_warning_message
-from itertools import izip
+from utils.serialization_helper import (atomic_write, write_rows,
+                                        to_percent_format)
+from utils.lut_model import (DEFAULT_DTYPE, TextCursor, Lut1D, Lut3D,
+                             parse_values)
+from utils.shaper_helper import get_shaper, get_shaper_size
+import numpy
+import os
 
 
 class SpiHelperException(Exception):
@@ -52,21 +58,20 @@ class SpiLutHelper(AbstractLUTHelper):
         self._check_range(preset)
         # Get data
         data = self._get_1d_data(process_function, preset)
-        lutfile = open(file_path, 'w+')
-        # Version
-        lutfile.write("Version {0}\n".format(preset[presets.VERSION]))
-        # Input range
-        input_range = preset[presets.IN_RANGE]
-        lutfile.write("From {0} {1}\n".format(input_range[0], input_range[1]))
-        # Length
-        lutfile.write("Length {0}\n".format(len(data)))
-        # Components
-        lutfile.write("Components 1\n{\n")
-        # data
-        for rgb in data:
-            lutfile.write(line_function(preset, rgb))
-        lutfile.write("}/n")
-        lutfile.close()
+        with atomic_write(file_path) as lutfile:
+            # Version
+            lutfile.write("Version {0}\n".format(preset[presets.VERSION]))
+            # Input range
+            input_range = preset[presets.IN_RANGE]
+            lutfile.write("From {0} {1}\n".format(input_range[0],
+                                                  input_range[1]))
+            # Length
+            lutfile.write("Length {0}\n".format(len(data.r)))
+            # Components
+            lutfile.write("Components 1\n{\n")
+            # data
+            self._write_1d_2d_values(lutfile, preset, data, line_function)
+            lutfile.write("}/n")
         return self.get_export_message(file_path)
 
     def write_2d_lut(self, process_function, file_path, preset):
@@ -78,17 +83,179 @@ class SpiLutHelper(AbstractLUTHelper):
         # Test ranges
         self._check_range(preset)
         # Get data
-        in_data, data = self._get_3d_data(process_function, preset)
-        lutfile = open(file_path, 'w+')
-        # header
-        lutfile.write("SPILUT 1.0\n3 3\n")
-        # cube size
-        lutfile.write("{0} {0} {0}\n".format(preset[presets.CUBE_SIZE]))
-        # write data
-        for in_rgb, rgb in izip(in_data, data):
-            lutfile.write(self._get_rgb_value_line(preset, rgb, in_rgb))
-        lutfile.close()
-        return self.get_export_message(file_path)
+        planes = self._iter_3d_data(process_function, preset)
+        shaper = get_shaper(preset)
+        if shaper is not None:
+            self.__write_shaper_lut(shaper, self.get_shaper_path(file_path),
+                                    preset)
+        with atomic_write(file_path) as lutfile:
+            # header
+            lutfile.write("SPILUT 1.0\n3 3\n")
+            # cube size
+            lutfile.write("{0} {0} {0}\n".format(preset[presets.CUBE_SIZE]))
+            # write data
+            for in_data, data in planes:
+                self._write_3d_values(lutfile, preset, data, in_data)
+        message = self.get_export_message(file_path)
+        if shaper is not None:
+            message = "{0} with {1} pre-LUT".format(
+                message, self.get_shaper_path(file_path))
+        return message
+
+    def get_output_files(self, file_path, preset):
+        # a shaped spi3d comes with its spi1d pre-LUT
+        if presets.is_3d_preset(preset) and get_shaper(preset) is not None:
+            return [self.get_shaper_path(file_path), file_path]
+        return [file_path]
+
+    @staticmethod
+    def get_shaper_path(file_path):
+        """ Return path of the spi1d pre-LUT written with a shaped spi3d
+
+        Args:
+            file_path (str): spi3d path
+
+        Returns:
+            .str
+
+        """
+        return "{0}_shaper.spi1d".format(os.path.splitext(file_path)[0])
+
+    @staticmethod
+    def __get_shaper_samples(shaper, preset):
+        """ Return spi1d pre-LUT samples, uniformly distributed over the
+        input range
+
+        Args:
+            shaper (utils.shaper_helper.Log2Shaper or GradationShaper):
+            shaper curve
+
+            preset (dict): lut generic and sampling informations
+
+        Returns:
+            .numpy.array input values, numpy.array shaped values
+
+        """
+        input_range = shaper.input_range
+        positions = numpy.linspace(input_range[0], input_range[1],
+                                   get_shaper_size(preset))
+        return positions, shaper.encode_gradation(positions)
+
+    def __write_shaper_lut(self, shaper, file_path, preset):
+        """ Write spi1d pre-LUT of a shaped spi3d
+
+        Args:
+            shaper (utils.shaper_helper.Log2Shaper or GradationShaper):
+            shaper curve
+
+            file_path (str): spi1d path
+
+            preset (dict): lut generic and sampling informations
+
+        """
+        positions, shaped = self.__get_shaper_samples(shaper, preset)
+        with atomic_write(file_path) as lutfile:
+            lutfile.write("Version 1\nFrom {0} {1}\nLength {2}\n"
+                          "Components 1\n{{\n".format(positions[0],
+                                                       positions[-1],
+                                                       len(positions)))
+            write_rows(lutfile, to_percent_format(self._get_pattern_1d(
+                preset)), shaped)
+            lutfile.write("}\n")
+
+    def _get_shaped_sampling(self, shaper, preset):
+        # lattice samples are inputs the linear pre-LUT maps to lattice
+        # coordinates
+        positions, shaped = self.__get_shaper_samples(shaper, preset)
+        return numpy.interp(numpy.linspace(0.0, 1.0,
+                                           preset[presets.CUBE_SIZE]),
+                            shaped, positions)
+
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        text = self._read_text(file_path)
+        if text.lstrip().startswith('SPILUT'):
+            return self.__read_3d_lut(text, file_path, dtype)
+        return self.__read_1d_lut(text, file_path, dtype)
+
+    @staticmethod
+    def __read_1d_lut(text, file_path, dtype):
+        """ Read a spi1d LUT
+
+        Args:
+            text (str): LUT content
+
+            file_path (str): path to the LUT
+
+            dtype (numpy.dtype): table type
+
+        Returns:
+            .Lut1D
+
+        """
+        cursor = TextCursor(text)
+        domain = [0.0, 1.0]
+        length = None
+        components = 1
+        line = cursor.next_line()
+        while line != '{':
+            tokens = line.split()
+            if tokens[0] == 'From':
+                domain = [float(tokens[1]), float(tokens[2])]
+            elif tokens[0] == 'Length':
+                length = int(tokens[1])
+            elif tokens[0] == 'Components':
+                components = int(tokens[1])
+            line = cursor.next_line()
+        block = cursor.remaining()
+        block = block[:block.rfind('}')]
+        if components not in [1, 3]:
+            raise SpiHelperException(("Unsupported number of components: "
+                                      "{0} in {1}").format(components,
+                                                           file_path))
+        data = parse_values(block, components)
+        if length is not None and len(data) != length:
+            raise SpiHelperException(("Expected {0} values, found {1} in "
+                                      "{2}").format(length, len(data),
+                                                    file_path))
+        if components == 1:
+            data = data[:, 0]
+        return Lut1D(data, domain=domain, input_range=domain, dtype=dtype)
+
+    @staticmethod
+    def __read_3d_lut(text, file_path, dtype):
+        """ Read a spi3d LUT
+
+        Args:
+            text (str): LUT content
+
+            file_path (str): path to the LUT
+
+            dtype (numpy.dtype): table type
+
+        Returns:
+            .Lut3D
+
+        """
+        cursor = TextCursor(text)
+        # SPILUT 1.0 and 3 3 lines
+        cursor.next_line()
+        cursor.next_line()
+        sizes = [int(value) for value in cursor.next_line().split()]
+        if len(set(sizes)) != 1:
+            raise SpiHelperException(("Only cubic LUTs are supported: {0} in "
+                                      "{1}").format(sizes, file_path))
+        cube_size = sizes[0]
+        data = parse_values(cursor.remaining(), 6)
+        if len(data) != pow(cube_size, 3):
+            raise SpiHelperException(("Expected {0} values, found {1} in "
+                                      "{2}").format(pow(cube_size, 3),
+                                                    len(data), file_path))
+        # lines are indexed, order doesn't matter
+        indexes = data[:, :3].astype(int)
+        table = numpy.zeros((cube_size, cube_size, cube_size, 3),
+                            dtype=dtype)
+        table[indexes[:, 0], indexes[:, 1], indexes[:, 2]] = data[:, 3:]
+        return Lut3D(table, dtype=dtype)
 
     @staticmethod
     def _get_range_message(range_name, arange):
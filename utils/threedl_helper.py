@@ -9,6 +9,11 @@ from utils.abstract_lut_helper import AbstractLUTHelper
 from utils import lut_presets as presets
 from utils.lut_presets import RAISE_MODE, TYPE, PresetException
 from utils.lut_utils import get_bitdepth
+from utils.serialization_helper import atomic_write
+from utils.lut_model import (DEFAULT_DTYPE, TextCursor, Lut1D, Lut3D,
+                             parse_values, is_number, get_likely_bitdepth)
+from utils.shaper_helper import get_shaper, get_lattice_positions
+import numpy
 
 
 class ThreeDLHelperException(Exception):
@@ -58,48 +63,92 @@ class ThreedlLutHelper(AbstractLUTHelper):
                                        self. _get_range_message(str_range,
                                                                 arange))
         # get data
-        data = self._get_3d_data(process_function,
-                                 preset,
-                                 inverse_loops_order=True)[1]
+        planes = self._iter_3d_data(process_function,
+                                    preset,
+                                    inverse_loops_order=True)
         # get attribute
-        lutfile = open(file_path, 'w+')
         cube_size = preset[presets.CUBE_SIZE]
         input_range = preset[presets.IN_RANGE]
         output_range = preset[presets.OUT_RANGE]
-        # title
-        lutfile.write("# {0}\n".format(preset[presets.TITLE]))
-        # comment
-        if preset[presets.COMMENT]:
-            lutfile.write("# {0}\n".format(preset[presets.COMMENT]))
-        # lut size
-        lutfile.write("# Dimension {0}x{0}x{0}\n".format(cube_size))
-        lutfile.write("# Input range {0}\n".format(input_range))
-        lutfile.write("# Output range {0}\n".format(output_range))
-        # get bit depth from ranges
-        in_bit_depth = get_bitdepth(input_range[1])
-        out_bit_depth = get_bitdepth(output_range[1])
-        if preset[MESH]:
-            # About mesh values :
-            # Mesh 5 12
-            # nb segments = 2^(5) + 1
-            # output bit depth = 2^12
-            mesh_input = int(math.log(cube_size, 2))
-            lutfile.write("3DMESH\nMesh {0} {1}\n".format(mesh_input,
-                                                          out_bit_depth))
-        # shaper lut
-        if preset[SHAPER]:
-            shaper = "{0}\n".format(self.get_string_shaper_lut(cube_size,
-                                                               in_bit_depth))
-            lutfile.write(shaper)
-        # data
-        for rgb in data:
-            lutfile.write(self._get_rgb_value_line(preset, rgb))
-        lutfile.close()
+        with atomic_write(file_path) as lutfile:
+            # title
+            lutfile.write("# {0}\n".format(preset[presets.TITLE]))
+            # comment
+            if preset[presets.COMMENT]:
+                lutfile.write("# {0}\n".format(preset[presets.COMMENT]))
+            # lut size
+            lutfile.write("# Dimension {0}x{0}x{0}\n".format(cube_size))
+            lutfile.write("# Input range {0}\n".format(input_range))
+            lutfile.write("# Output range {0}\n".format(output_range))
+            # get bit depth from ranges
+            in_bit_depth = get_bitdepth(input_range[1])
+            out_bit_depth = get_bitdepth(output_range[1])
+            if preset[MESH]:
+                # About mesh values :
+                # Mesh 5 12
+                # nb segments = 2^(5) + 1
+                # output bit depth = 2^12
+                mesh_input = int(math.log(cube_size, 2))
+                lutfile.write("3DMESH\nMesh {0} {1}\n".format(mesh_input,
+                                                              out_bit_depth))
+            # shaper lut
+            shaper = get_shaper(preset)
+            if shaper is not None:
+                lutfile.write("{0}\n".format(" ".join(
+                    str(value) for value in self.__get_shaper_codes(
+                        shaper, preset))))
+            elif preset[SHAPER]:
+                shaper = "{0}\n".format(
+                    self.get_string_shaper_lut(cube_size, in_bit_depth))
+                lutfile.write(shaper)
+            # data
+            for _, data in planes:
+                self._write_3d_values(lutfile, preset, data)
         return self.get_export_message(file_path)
 
+    def read_lut(self, file_path, dtype=DEFAULT_DTYPE):
+        cursor = TextCursor(self._read_text(file_path))
+        title = None
+        out_bit_depth = None
+        # header
+        line = cursor.peek_line()
+        while line is not None and not is_number(line.split()[0]):
+            tokens = cursor.next_line().split()
+            if tokens[0] == 'Mesh' and len(tokens) == 3:
+                out_bit_depth = int(tokens[2])
+            line = cursor.peek_line()
+        # title is the first comment (see write_3d_lut)
+        if cursor.text.startswith('# '):
+            title = cursor.text[2:cursor.text.find('\n')].strip()
+        # shaper lut: first line of values
+        shaper = numpy.array(cursor.next_line().split(), dtype=float)
+        cube_size = len(shaper)
+        data = parse_values(cursor.remaining(), 3)
+        # values are int, bit depths are deduced from max values
+        in_max_value = pow(2, get_likely_bitdepth(shaper.max())) - 1
+        if out_bit_depth is None:
+            out_bit_depth = get_likely_bitdepth(data.max())
+        out_max_value = pow(2, out_bit_depth) - 1
+        # shaper is a linear ramp between its first and last values, or a
+        # real pre LUT
+        domain = shaper[[0, -1]] / in_max_value
+        lut_shaper = None
+        if numpy.abs(shaper - numpy.linspace(shaper[0], shaper[-1],
+                                             cube_size)).max() > 1:
+            lut_shaper = Lut1D(numpy.linspace(0.0, 1.0, cube_size),
+                               positions=shaper / in_max_value,
+                               dtype=dtype)
+            domain = [0.0, 1.0]
+        return Lut3D.from_flat(data / out_max_value, cube_size,
+                               red_fastest=False, domain=domain,
+                               shaper=lut_shaper,
+                               input_range=[0, in_max_value],
+                               output_range=[0, out_max_value],
+                               title=title, dtype=dtype)
+
     def _get_rgb_value_line(self, preset, rgb, in_rgb=None, separator=" "):
         # 3dl layout is bgr
-        return self._get_pattern(preset).format(rgb.r, rgb.g, rgb.b)
+        return self._get_pattern(preset).format(rgb[0], rgb[1], rgb[2])
 
     @staticmethod
     def _get_range_message(range_name, arange):
@@ -150,6 +199,35 @@ class ThreedlLutHelper(AbstractLUTHelper):
         shaper_lut = ThreedlLutHelper.get_shaper_lut(cube_size, bit_depth)
         return " ".join(str(value) for value in shaper_lut)
 
+    @staticmethod
+    def __get_shaper_codes(shaper, preset):
+        """ Return shaper lut of a shaper curve: input code values of the
+        lattice samples, strictly increasing
+
+        Args:
+            shaper (utils.shaper_helper.Log2Shaper or GradationShaper):
+            shaper curve
+
+            preset (dict): lut generic and sampling informations
+
+        Returns:
+            .numpy.array (int)
+
+        """
+        input_range = preset[presets.IN_RANGE]
+        positions = get_lattice_positions(shaper, preset[presets.CUBE_SIZE])
+        codes = numpy.rint(input_range[0]
+                           + positions * input_range[1]).astype(int)
+        # several samples can't share a code value
+        indexes = numpy.arange(len(codes))
+        return numpy.maximum.accumulate(codes - indexes) + indexes
+
+    def _get_shaped_sampling(self, shaper, preset):
+        # lattice samples are the code values of the shaper lut
+        input_range = preset[presets.IN_RANGE]
+        codes = self.__get_shaper_codes(shaper, preset)
+        return (codes - input_range[0]) / float(input_range[1])
+
     def _validate_preset(self, preset, mode=RAISE_MODE, default_preset=None):
         if default_preset is None:
             default_preset = ThreedlLutHelper.get_default_preset()
@@ -175,6 +253,12 @@ class ThreedlLutHelper(AbstractLUTHelper):
                 if mode == RAISE_MODE:
                     raise PresetException("{0} 3dl attribute must be a boolean"
                                           ).format(attr)
+        # a shaper curve is written as shaper lut
+        if preset.get(presets.SHAPER_CURVE) and not preset[SHAPER]:
+            if mode == RAISE_MODE:
+                raise PresetException(("'{0}' 3dl attribute must be set to "
+                                       "use a shaper curve").format(SHAPER))
+            preset[SHAPER] = True
         # return updated preset
         return preset
 